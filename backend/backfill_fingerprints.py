@@ -0,0 +1,23 @@
+"""
+Calcula la huella de deduplicación de las transacciones importadas antes de que
+existiera la columna fingerprint.
+
+Uso:
+    python backfill_fingerprints.py
+"""
+import sys
+from services import TransactionService
+
+
+def main():
+    try:
+        result = TransactionService.backfill_fingerprints()
+    except Exception as e:
+        print(f"❌ Error al calcular huellas: {e}")
+        return 1
+    print(f"✅ Huellas calculadas: {result['updated']} transacciones ({result['duplicates']} duplicados sin huella)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
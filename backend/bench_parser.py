@@ -0,0 +1,253 @@
+"""
+Benchmark y prueba de regresión del parser de cartolas.
+
+Ejecuta PDFParser.parse_pdf sobre cada PDF de data-samples/cartolas y registra:
+- tiempo total (mediana de --repeat ejecuciones, con las cachés de parsing vacías)
+- tiempo por fase: open (abrir/desencriptar), tables, text, parse, dedupe y classify
+- memoria máxima (tracemalloc, en una ejecución aparte para no distorsionar los tiempos)
+- diferencias contra las salidas de referencia (data-samples/golden/<archivo>.json)
+
+El comercio y el método de pago se infieren solo con las reglas por defecto, para que
+el resultado no dependa de la base de datos ni de CLASSIFICATION_RULES_FILE.
+
+Uso:
+    python bench_parser.py [--repeat 3] [--output parser_report.json] [--baseline anterior.json]
+    python bench_parser.py --update-golden   # regenerar las salidas de referencia
+
+Retorna 1 si alguna cartola difiere de su salida de referencia.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import logging
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+
+logging.disable(logging.CRITICAL)
+
+from pdf_parser import PDFParser, clear_parse_caches
+from rules import RuleEngine, default_rules
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data-samples")
+SAMPLES_DIR = os.path.join(DATA_DIR, "cartolas")
+GOLDEN_DIR = os.path.join(DATA_DIR, "golden")
+PHASES = ("open", "tables", "text", "extract", "parse", "dedupe", "classify")
+# Diferencias de ejemplo incluidas en el reporte por archivo
+MAX_DIFF_EXAMPLES = 5
+
+
+def serialize(transactions: list) -> list:
+    """Transacciones en la forma en que se guardan en las salidas de referencia"""
+    return [
+        {
+            "transaction_date": tx["transaction_date"].isoformat(),
+            "description": tx["description"],
+            "amount": tx["amount"],
+            "merchant": tx["merchant"],
+            "payment_method": tx["payment_method"],
+        }
+        for tx in transactions
+    ]
+
+
+def parse_once(parser: PDFParser, engine: RuleEngine, path: str):
+    """(transacciones, segundos totales, segundos por fase) de una ejecución en frío"""
+    clear_parse_caches()
+    timings = {}
+    started = time.perf_counter()
+    transactions = parser.parse_pdf(path, classify=False, timings=timings)
+    classify_started = time.perf_counter()
+    engine.classify_transactions(transactions)
+    finished = time.perf_counter()
+    timings["classify"] = finished - classify_started
+    return transactions, finished - started, timings
+
+
+def peak_memory(parser: PDFParser, engine: RuleEngine, path: str) -> int:
+    """Bytes máximos asignados por Python durante un parseo"""
+    clear_parse_caches()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        engine.classify_transactions(parser.parse_pdf(path, classify=False))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def page_count(parser: PDFParser, path: str) -> int:
+    pdf, _ = parser._open_pdf(path)
+    try:
+        return len(pdf.pages)
+    finally:
+        pdf.close()
+
+
+def golden_path(golden_dir: str, path: str) -> str:
+    return os.path.join(golden_dir, os.path.splitext(os.path.basename(path))[0] + ".json")
+
+
+def compare_golden(golden_file: str, transactions: list) -> dict:
+    """Compara como multiconjuntos (el orden no cuenta) contra la salida de referencia"""
+    if not os.path.exists(golden_file):
+        return {"status": "missing"}
+    with open(golden_file, "r", encoding="utf-8") as f:
+        expected = json.load(f)["transactions"]
+
+    def counts(rows):
+        return Counter(json.dumps(row, sort_keys=True, ensure_ascii=False) for row in rows)
+
+    expected_counts, actual_counts = counts(expected), counts(transactions)
+    missing = list((expected_counts - actual_counts).elements())
+    extra = list((actual_counts - expected_counts).elements())
+    result = {
+        "status": "match" if not missing and not extra else "mismatch",
+        "expected": len(expected),
+        "missing": len(missing),
+        "extra": len(extra),
+    }
+    if missing or extra:
+        result["missing_examples"] = [json.loads(row) for row in missing[:MAX_DIFF_EXAMPLES]]
+        result["extra_examples"] = [json.loads(row) for row in extra[:MAX_DIFF_EXAMPLES]]
+    return result
+
+
+def write_golden(golden_file: str, path: str, transactions: list):
+    os.makedirs(os.path.dirname(golden_file), exist_ok=True)
+    with open(golden_file, "w", encoding="utf-8") as f:
+        json.dump({
+            "file": os.path.basename(path),
+            "parser_version": PDFParser.VERSION,
+            "transactions": transactions,
+        }, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def run_file(parser: PDFParser, engine: RuleEngine, path: str, args) -> dict:
+    runs = [parse_once(parser, engine, path) for _ in range(args.repeat)]
+    transactions = serialize(runs[-1][0])
+    phases = {
+        phase: round(statistics.median(timings.get(phase, 0.0) for _, _, timings in runs) * 1000, 2)
+        for phase in PHASES
+        if any(phase in timings for _, _, timings in runs)
+    }
+    result = {
+        "file": os.path.basename(path),
+        "pages": page_count(parser, path),
+        "transactions": len(transactions),
+        "wall_ms": round(statistics.median(seconds for _, seconds, _ in runs) * 1000, 2),
+        "phases_ms": phases,
+    }
+    if not args.no_memory:
+        result["peak_memory_mb"] = round(peak_memory(parser, engine, path) / 1024 / 1024, 2)
+
+    golden_file = golden_path(args.golden, path)
+    if args.update_golden:
+        write_golden(golden_file, path, transactions)
+        result["golden"] = {"status": "updated"}
+    else:
+        result["golden"] = compare_golden(golden_file, transactions)
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def summarize(files: list) -> dict:
+    phases = {}
+    for entry in files:
+        for phase, ms in entry["phases_ms"].items():
+            phases[phase] = round(phases.get(phase, 0.0) + ms, 2)
+    totals = {
+        "files": len(files),
+        "pages": sum(entry["pages"] for entry in files),
+        "transactions": sum(entry["transactions"] for entry in files),
+        "wall_ms": round(sum(entry["wall_ms"] for entry in files), 2),
+        "phases_ms": phases,
+        "golden": dict(Counter(entry["golden"]["status"] for entry in files)),
+    }
+    memory = [entry["peak_memory_mb"] for entry in files if "peak_memory_mb" in entry]
+    if memory:
+        totals["peak_memory_mb"] = max(memory)
+    return totals
+
+
+def print_report(report: dict, baseline: dict = None):
+    previous = {entry["file"]: entry for entry in (baseline or {}).get("files", [])}
+    print(f"{'archivo':<48} {'págs':>4} {'txs':>5} {'ms':>9} {'antes':>9} {'MB':>7}  referencia")
+    for entry in report["files"]:
+        before = previous.get(entry["file"], {}).get("wall_ms")
+        print(
+            f"{entry['file'][:48]:<48} {entry['pages']:>4} {entry['transactions']:>5} "
+            f"{entry['wall_ms']:>9.1f} {before if before is not None else '-':>9} "
+            f"{entry.get('peak_memory_mb', '-'):>7}  {entry['golden']['status']}"
+        )
+    totals = report["totals"]
+    print(f"\nTotal: {totals['files']} archivos, {totals['pages']} páginas, "
+          f"{totals['transactions']} transacciones, {totals['wall_ms']:.1f} ms")
+    if baseline:
+        print(f"Antes: {baseline['totals']['wall_ms']:.1f} ms "
+              f"(x{baseline['totals']['wall_ms'] / max(totals['wall_ms'], 0.001):.2f})")
+    print("Por fase (ms): " + ", ".join(f"{phase} {ms:.1f}" for phase, ms in totals["phases_ms"].items()))
+    print("Referencia: " + ", ".join(f"{status} {count}" for status, count in totals["golden"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=SAMPLES_DIR, help="Carpeta con las cartolas PDF")
+    parser.add_argument("--golden", default=GOLDEN_DIR, help="Carpeta con las salidas de referencia")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Procesos de extracción (con más de 1 las fases tables/text se reportan como extract)")
+    parser.add_argument("--output", default="parser_report.json", help="Archivo del reporte JSON")
+    parser.add_argument("--baseline", help="Reporte anterior contra el que comparar tiempos")
+    parser.add_argument("--update-golden", action="store_true", help="Reescribir las salidas de referencia")
+    parser.add_argument("--no-memory", action="store_true", help="No medir memoria (ahorra una ejecución por archivo)")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.samples, "*.pdf")))
+    if not paths:
+        print(f"❌ No hay PDFs en {args.samples}")
+        return 1
+
+    pdf_parser = PDFParser(workers=args.workers)
+    engine = RuleEngine(default_rules())
+    files = [run_file(pdf_parser, engine, path, args) for path in paths]
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "parser_version": PDFParser.VERSION,
+        "python": platform.python_version(),
+        "workers": args.workers,
+        "repeat": args.repeat,
+        "files": files,
+        "totals": summarize(files),
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_report(report, baseline)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nReporte guardado en {args.output}")
+    return 1 if report["totals"]["golden"].get("mismatch") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Micro-benchmark del parsing por fila de PDFParser (sin abrir ni extraer el PDF).
+
+Extrae una vez las tablas y el texto de cada cartola de data-samples/cartolas y luego
+mide solo el camino caliente: _parse_table sobre cada tabla y
+_parse_transactions_from_text sobre el texto completo. Reporta el costo por fila de
+tabla y por línea de texto.
+
+Uso:
+    python bench_parser_rows.py [--repeat 20] [--json salida.json] [--compare antes.json]
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import logging
+import statistics
+
+logging.disable(logging.CRITICAL)
+
+from pdf_parser import PDFParser, clear_parse_caches
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data-samples", "cartolas")
+
+
+def load_samples(samples_dir: str):
+    """(nombre, tablas, texto) de cada cartola"""
+    parser = PDFParser(workers=1)
+    samples = []
+    for path in sorted(glob.glob(os.path.join(samples_dir, "*.pdf"))):
+        pdf, password = parser._open_pdf(path)
+        try:
+            pages = parser._extract_pages(pdf, path, password)
+        finally:
+            pdf.close()
+        tables = [table for page_tables, _ in pages for table in page_tables]
+        text = "".join(text + "\n" for _, text in pages if text)
+        samples.append((os.path.basename(path), tables, text))
+    return samples
+
+
+def timed(fn, repeat: int) -> float:
+    """Mediana en segundos de repeat ejecuciones, cada una con las cachés de parsing vacías"""
+    samples = []
+    for _ in range(repeat):
+        clear_parse_caches()
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def run(samples, repeat: int) -> dict:
+    parser = PDFParser(workers=1)
+    tables = [table for _, sample_tables, _ in samples for table in sample_tables]
+    texts = [text for _, _, text in samples]
+    table_rows = sum(len(table) for table in tables)
+    text_lines = sum(text.count("\n") for text in texts)
+
+    table_seconds = timed(lambda: [parser._parse_table(table) for table in tables], repeat)
+    text_seconds = timed(lambda: [parser._parse_transactions_from_text(text) for text in texts], repeat)
+    return {
+        "files": len(samples),
+        "table_rows": table_rows,
+        "text_lines": text_lines,
+        "table_ms": round(table_seconds * 1000, 3),
+        "text_ms": round(text_seconds * 1000, 3),
+        "table_us_per_row": round(table_seconds * 1e6 / max(1, table_rows), 3),
+        "text_us_per_line": round(text_seconds * 1e6 / max(1, text_lines), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=SAMPLES_DIR, help="Carpeta con las cartolas PDF")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", help="Guardar resultados en este archivo")
+    parser.add_argument("--compare", help="Resultados anteriores (--json) contra los que comparar")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    result = run(samples, args.repeat)
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+
+    print(f"{result['files']} cartolas, {result['table_rows']} filas de tabla, "
+          f"{result['text_lines']} líneas de texto (mediana de {args.repeat}):")
+    for key in ("table_ms", "text_ms", "table_us_per_row", "text_us_per_line"):
+        line = f"  {key:<18} {result[key]:>10.3f}"
+        if previous and previous.get(key):
+            line += f"   antes {previous[key]:>10.3f}   x{previous[key] / result[key]:.2f}"
+        print(line)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResultados guardados en {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
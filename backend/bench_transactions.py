@@ -0,0 +1,239 @@
+"""
+Benchmark de GET /api/transactions (TransactionService.get_transactions).
+
+Compara la consulta anterior (JOIN de tags + GROUP BY + GROUP_CONCAT) con la actual
+(página por índice de fecha + tags en una consulta IN), en primera página, página
+profunda por OFFSET y página profunda por cursor. También mide la búsqueda de texto
+(TransactionService.search): palabra completa, prefijo y combinada con un rango de fechas.
+Muestra el plan (EXPLAIN) de la página profunda por cursor, sin filtros y con filtro por
+método de pago, y avisa si recorre todo el índice o la tabla en vez de un rango.
+
+Usa una base de datos desechable (BENCH_DB_NAME, por defecto bankountable_bench) que
+se crea con db_init y se vacía antes de sembrar datos sintéticos.
+
+Uso:
+    python bench_transactions.py [--sizes 100000,1000000] [--page-size 100] [--repeat 5] [--json salida.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from datetime import date, timedelta
+
+# Apuntar todas las conexiones a la base de benchmark antes de importar database/services
+os.environ["DB_NAME"] = os.getenv("BENCH_DB_NAME", "bankountable_bench")
+
+import db_init
+from database import get_db_connection
+from services import TransactionService
+
+# Consulta de get_transactions antes de separar la carga de tags
+LEGACY_SQL = """
+    SELECT
+        t.id, t.account_id, t.transaction_date, t.description,
+        t.merchant, t.amount, t.category_id, t.payment_method,
+        t.created_at, t.updated_at,
+        c.name as category_name,
+        GROUP_CONCAT(tg.name) as tags
+    FROM transactions t
+    LEFT JOIN categories c ON t.category_id = c.id
+    LEFT JOIN transaction_tags tt ON t.id = tt.transaction_id
+    LEFT JOIN tags tg ON tt.tag_id = tg.id
+    GROUP BY t.id, t.account_id, t.transaction_date, t.description,
+             t.merchant, t.amount, t.category_id, t.payment_method,
+             t.created_at, t.updated_at, c.name
+    ORDER BY t.transaction_date DESC, t.id DESC
+    LIMIT %s OFFSET %s
+"""
+
+MERCHANTS = ["Lider", "Jumbo", "Uber", "Copec", "Falabella", "Netflix", "Spotify", "Farmacia Ahumada", "Starbucks", "Entel"]
+PAYMENT_METHODS = ["credit", "debit", "transfer"]
+TAG_NAMES = [f"tag-{i}" for i in range(20)]
+CHUNK = 10000
+
+
+def reset_database():
+    """Crea el esquema en la base de benchmark y la deja vacía"""
+    db_init.init_database()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+            for table in ("transaction_tags", "transactions", "tags"):
+                cursor.execute(f"TRUNCATE TABLE {table}")
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+            cursor.executemany("INSERT INTO tags (name) VALUES (%s)", TAG_NAMES)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def seed(current: int, target: int, rng: random.Random):
+    """Agrega transacciones sintéticas hasta llegar a target (~30% con 1-3 tags)"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM categories")
+            category_ids = [row['id'] for row in cursor.fetchall()] + [None]
+            cursor.execute("SELECT id FROM tags")
+            tag_ids = [row['id'] for row in cursor.fetchall()]
+            start = date.today() - timedelta(days=3650)
+
+            while current < target:
+                count = min(CHUNK, target - current)
+                rows = []
+                for _ in range(count):
+                    merchant = rng.choice(MERCHANTS)
+                    rows.append((
+                        start + timedelta(days=rng.randrange(3650)),
+                        f"COMPRA {merchant.upper()} {rng.randrange(10000):04d}",
+                        merchant,
+                        round(rng.uniform(-200000, 50000), 2),
+                        rng.choice(category_ids),
+                        rng.choice(PAYMENT_METHODS),
+                    ))
+                cursor.executemany("""
+                    INSERT INTO transactions
+                    (transaction_date, description, merchant, amount, category_id, payment_method)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, rows)
+                first_id = cursor.lastrowid  # executemany multi-fila: id de la primera fila
+                links = [
+                    (first_id + i, tag_id)
+                    for i in range(count) if rng.random() < 0.3
+                    for tag_id in rng.sample(tag_ids, rng.randint(1, 3))
+                ]
+                cursor.executemany(
+                    "INSERT INTO transaction_tags (transaction_id, tag_id) VALUES (%s, %s)", links
+                )
+                conn.commit()
+                current += count
+                print(f"  sembradas {current:,} transacciones", end="\r", flush=True)
+            print()
+            cursor.execute("ANALYZE TABLE transactions, transaction_tags")
+    finally:
+        conn.close()
+
+
+def timed(fn, repeat: int) -> float:
+    """Mediana en ms de repeat ejecuciones (tras una de calentamiento)"""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def legacy_query(limit: int, offset: int):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(LEGACY_SQL, (limit, offset))
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def position_at(offset: int):
+    """(transaction_date, id) de la fila en la posición offset del orden de la API"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT transaction_date, id FROM transactions
+                ORDER BY transaction_date DESC, id DESC
+                LIMIT 1 OFFSET %s
+            """, (offset,))
+            row = cursor.fetchone()
+            return row['transaction_date'], row['id']
+    finally:
+        conn.close()
+
+
+def explain_page(page_size: int, after, **filters) -> dict:
+    """Plan de la consulta de get_transactions para la tabla transactions"""
+    conditions, params = TransactionService._filter_conditions(
+        filters.get("category_id"), filters.get("payment_method"), None, None, after
+    )
+    where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "EXPLAIN " + TransactionService._PAGE_SQL.format(where_clause=where_clause),
+                params + [page_size, 0]
+            )
+            row = next(row for row in cursor.fetchall() if row["table"] == "t")
+            return {"type": row["type"], "key": row["key"], "rows": row["rows"], "extra": row["Extra"]}
+    finally:
+        conn.close()
+
+
+def run_size(size: int, page_size: int, repeat: int) -> dict:
+    deep = size // 2
+    after = position_at(deep - 1)
+    cursor = TransactionService.encode_cursor(*after)
+    result = {
+        "transactions": size,
+        "page_size": page_size,
+        "first_page_legacy_ms": timed(lambda: legacy_query(page_size, 0), repeat),
+        "first_page_ms": timed(lambda: TransactionService.get_transactions(limit=page_size), repeat),
+        "deep_offset_legacy_ms": timed(lambda: legacy_query(page_size, deep), repeat),
+        "deep_offset_ms": timed(lambda: TransactionService.get_transactions(limit=page_size, offset=deep), repeat),
+        "deep_cursor_ms": timed(lambda: TransactionService.get_transactions_page(limit=page_size, cursor=cursor), repeat),
+        "search_ms": timed(lambda: TransactionService.search("farmacia ahumada", limit=page_size), repeat),
+        "search_prefix_ms": timed(lambda: TransactionService.search("spot", limit=page_size), repeat),
+        "search_filtered_ms": timed(lambda: TransactionService.search(
+            "lider", start_date=date.today() - timedelta(days=365), limit=page_size
+        ), repeat),
+        "deep_cursor_plan": explain_page(page_size, after),
+        "deep_cursor_filtered_plan": explain_page(page_size, after, payment_method="credit"),
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100000,1000000", help="Cantidades de transacciones, separadas por coma")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Guardar resultados en este archivo")
+    args = parser.parse_args()
+
+    sizes = sorted(int(s) for s in args.sizes.split(","))
+    rng = random.Random(args.seed)
+
+    print(f"Base de benchmark: {os.environ['DB_NAME']}")
+    reset_database()
+
+    results = []
+    current = 0
+    for size in sizes:
+        seed(current, size, rng)
+        current = size
+        result = run_size(size, args.page_size, args.repeat)
+        results.append(result)
+        print(f"\n{size:,} transacciones (página de {args.page_size}, mediana de {args.repeat}):")
+        for key, value in result.items():
+            if key.endswith("_ms"):
+                print(f"  {key:<24} {value:>10.2f} ms")
+            elif key.endswith("_plan"):
+                # 'ALL' o 'index' = recorrido completo: el keyset no está usando un rango
+                warning = "  ⚠️  sin rango" if value["type"] in ("ALL", "index") else ""
+                print(f"  {key:<24} {value['type']} {value['key']} ~{value['rows']} filas{warning}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResultados guardados en {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+Caché de respuestas para endpoints de lectura (estadísticas, categorías, tags).
+
+Cada endpoint usa un namespace con su propio TTL; las entradas se identifican por los
+parámetros de la consulta. Las escrituras invalidan solo lo que cambió: un namespace
+completo o, para stats, solo los rangos de fechas que contienen los días modificados.
+
+Backends:
+- memory (por defecto): LRU acotado en el proceso
+- redis: compartido entre procesos (workers de import incluidos); requiere el paquete
+  redis y CACHE_REDIS_URL
+"""
+import os
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# TTL en segundos por namespace
+CACHE_TTLS = {
+    "stats": int(os.getenv("CACHE_TTL_STATS", 300)),
+    "categories": int(os.getenv("CACHE_TTL_CATEGORIES", 3600)),
+    "tags": int(os.getenv("CACHE_TTL_TAGS", 3600)),
+    "insights": int(os.getenv("CACHE_TTL_INSIGHTS", 3600)),
+}
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 512))
+
+Scope = Optional[Tuple[Optional[date], Optional[date]]]
+
+
+def _scope_contains(scope: Scope, day: date) -> bool:
+    """Indica si un rango (inicio, fin), abierto en los extremos None, incluye el día"""
+    if scope is None:
+        return True
+    start, end = scope
+    return (start is None or start <= day) and (end is None or day <= end)
+
+
+class MemoryBackend:
+    """LRU en memoria con expiración por entrada"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()  # key -> (expira_en, scope, valor)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, value, ttl: int, scope: Scope):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, scope, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, namespace: str, days: Optional[Iterable[date]] = None) -> int:
+        prefix = f"{namespace}:"
+        days = list(days) if days is not None else None
+        with self._lock:
+            stale = [
+                key for key, (_, scope, _) in self._entries.items()
+                if key.startswith(prefix) and (days is None or any(_scope_contains(scope, d) for d in days))
+            ]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class RedisBackend:
+    """
+    Backend Redis. Cada namespace tiene un número de generación que forma parte de la
+    llave: invalidar es incrementarlo (las entradas viejas expiran por TTL).
+    Los valores se guardan como JSON.
+    """
+
+    def __init__(self, url: str):
+        import redis  # Dependencia opcional
+
+        self._client = redis.Redis.from_url(url)
+        self._client.ping()
+        self.evictions = 0
+
+    def _generation(self, namespace: str) -> int:
+        return int(self._client.get(f"bankountable:gen:{namespace}") or 0)
+
+    def _key(self, key: str) -> str:
+        namespace = key.split(":", 1)[0]
+        return f"bankountable:{namespace}:{self._generation(namespace)}:{key}"
+
+    def get(self, key: str):
+        raw = self._client.get(self._key(key))
+        if raw is None:
+            return None
+        return (None, None, json.loads(raw))
+
+    def set(self, key: str, value, ttl: int, scope: Scope):
+        self._client.set(self._key(key), json.dumps(value, default=str), ex=ttl)
+
+    def invalidate(self, namespace: str, days: Optional[Iterable[date]] = None) -> int:
+        # Redis no guarda el rango de cada entrada: se invalida el namespace completo
+        self._client.incr(f"bankountable:gen:{namespace}")
+        return 1
+
+    def size(self) -> int:
+        return int(self._client.dbsize())
+
+
+class ResponseCache:
+    """Caché de respuestas con TTL por namespace, invalidación precisa y contadores"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend(CACHE_MAX_ENTRIES)
+        self.enabled = os.getenv("CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+        self._invalidations: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        """Crea la caché con el backend indicado en CACHE_BACKEND (memory o redis)"""
+        if os.getenv("CACHE_BACKEND", "memory").lower() == "redis":
+            try:
+                return cls(RedisBackend(os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")))
+            except Exception as e:
+                logger.warning(f"No se pudo usar Redis para la caché, usando memoria: {e}")
+        return cls()
+
+    @staticmethod
+    def make_key(namespace: str, params: Optional[dict] = None) -> str:
+        """Llave estable a partir de los parámetros de la consulta"""
+        params = params or {}
+        return f"{namespace}:" + json.dumps(params, sort_keys=True, default=str)
+
+    def _count(self, counters: Dict[str, int], namespace: str):
+        with self._lock:
+            counters[namespace] = counters.get(namespace, 0) + 1
+
+    def get_or_set(
+        self,
+        namespace: str,
+        params: Optional[dict],
+        loader: Callable[[], Any],
+        scope: Scope = None
+    ):
+        """
+        Retorna la respuesta en caché o la calcula con loader() y la guarda.
+        scope: rango de fechas que cubre la respuesta (para invalidar solo lo afectado).
+        Los resultados vacíos no se guardan (p.ej. cuando la base de datos no responde).
+        """
+        if not self.enabled:
+            return loader()
+
+        key = self.make_key(namespace, params)
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Error al leer la caché: {e}")
+            entry = None
+        if entry is not None:
+            self._count(self._hits, namespace)
+            return entry[2]
+
+        self._count(self._misses, namespace)
+        value = loader()
+        if value:
+            try:
+                self.backend.set(key, value, CACHE_TTLS.get(namespace, 60), scope)
+            except Exception as e:
+                logger.warning(f"Error al escribir la caché: {e}")
+        return value
+
+    def invalidate(self, *namespaces: str, days: Optional[Iterable] = None):
+        """
+        Invalida namespaces completos o, si se indican days, solo las entradas
+        cuyo rango de fechas incluye alguno de esos días.
+        """
+        if days is not None:
+            days = {
+                d if isinstance(d, date) else date.fromisoformat(str(d)[:10])
+                for d in days if d is not None
+            }
+            if not days:
+                return
+        for namespace in namespaces:
+            try:
+                removed = self.backend.invalidate(namespace, days)
+            except Exception as e:
+                logger.warning(f"Error al invalidar la caché ({namespace}): {e}")
+                continue
+            if removed:
+                self._count(self._invalidations, namespace)
+
+    def metrics(self) -> dict:
+        """Contadores de aciertos/fallos por namespace"""
+        with self._lock:
+            hits = sum(self._hits.values())
+            misses = sum(self._misses.values())
+            namespaces = sorted(set(self._hits) | set(self._misses) | set(self._invalidations))
+            per_namespace = {
+                ns: {
+                    "hits": self._hits.get(ns, 0),
+                    "misses": self._misses.get(ns, 0),
+                    "invalidations": self._invalidations.get(ns, 0),
+                }
+                for ns in namespaces
+            }
+        try:
+            entries = self.backend.size()
+        except Exception:
+            entries = None
+        return {
+            "backend": type(self.backend).__name__.replace("Backend", "").lower(),
+            "enabled": self.enabled,
+            "entries": entries,
+            "evictions": self.backend.evictions,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "namespaces": per_namespace,
+        }
+
+
+response_cache = ResponseCache.from_env()
@@ -0,0 +1,263 @@
+"""
+Categorización automática de transacciones.
+
+Aprende de las transacciones categorizadas a mano (category_source 'manual' o
+categorizadas antes de existir la columna) y combina:
+- un índice por comercio: si un comercio siempre se categorizó igual, se usa esa categoría
+- naive Bayes multinomial sobre features hasheadas de la descripción y el comercio,
+  evaluado por lote con NumPy (una matriz categoría × bucket del vocabulario)
+
+El modelo se entrena una vez por proceso y se re-entrena cuando cambia la versión
+'categorizations' de data_versions (cada categorización manual la incrementa).
+"""
+import os
+import re
+import zlib
+import threading
+import unicodedata
+import logging
+from collections import Counter, defaultdict
+from typing import Collection, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Cantidad de buckets del hashing de features
+FEATURE_BUCKETS = 1 << 18
+# Suavizado de Laplace
+ALPHA = 0.5
+# Probabilidad mínima para asignar una categoría
+MIN_CONFIDENCE = float(os.getenv("CATEGORIZER_MIN_CONFIDENCE", 0.6))
+# Un comercio se asigna directo si tiene al menos estas categorizaciones y esta proporción de acuerdo
+MERCHANT_MIN_VOTES = 2
+MERCHANT_MIN_SHARE = 0.8
+
+_token_pattern = re.compile(r"[A-Z]+")
+
+
+def _normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).upper()
+
+
+def _merchant_key(merchant: Optional[str]) -> Optional[str]:
+    return _normalize(merchant).strip() if merchant else None
+
+
+def extract_features(description: str, merchant: Optional[str] = None) -> List[int]:
+    """Features hasheadas: palabras, pares de palabras consecutivas y comercio"""
+    tokens = [t for t in _token_pattern.findall(_normalize(description or "")) if len(t) > 1]
+    features = [f"w:{t}" for t in tokens]
+    features += [f"b:{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+    merchant_key = _merchant_key(merchant)
+    if merchant_key:
+        features.append(f"m:{merchant_key}")
+    return [zlib.crc32(f.encode()) % FEATURE_BUCKETS for f in features]
+
+
+class Categorizer:
+    """Clasificador de transacciones en categorías"""
+
+    def __init__(self):
+        self.class_counts: Counter = Counter()
+        self.feature_counts: Dict[int, Counter] = defaultdict(Counter)  # categoría -> bucket -> cuenta
+        self.feature_totals: Counter = Counter()
+        self.vocabulary = set()
+        self.merchant_votes: Dict[str, Counter] = defaultdict(Counter)
+        self.merchant_index: Dict[str, int] = {}
+        # Precalculado en train(): categorías, log P(categoría) y log P(bucket | categoría)
+        # por columna del vocabulario ordenado (la última columna es "bucket no visto")
+        self._classes = np.zeros(0, dtype=np.int64)
+        self._log_priors = np.zeros(0)
+        self._vocabulary = np.zeros(0, dtype=np.int64)
+        self._log_likelihoods = np.zeros((0, 1))
+
+    @property
+    def trained(self) -> bool:
+        return bool(self.class_counts)
+
+    def train(self, rows: Iterable[Tuple[str, Optional[str], int]]) -> "Categorizer":
+        """Entrena con filas (descripción, comercio, category_id)"""
+        for description, merchant, category_id in rows:
+            self.class_counts[category_id] += 1
+            counts = self.feature_counts[category_id]
+            for bucket in extract_features(description, merchant):
+                counts[bucket] += 1
+                self.feature_totals[category_id] += 1
+                self.vocabulary.add(bucket)
+            merchant_key = _merchant_key(merchant)
+            if merchant_key:
+                self.merchant_votes[merchant_key][category_id] += 1
+
+        # Precalcular lo que no depende de la fila a clasificar
+        total = sum(self.class_counts.values())
+        vocabulary_size = max(1, len(self.vocabulary))
+        self._classes = np.array(sorted(self.class_counts), dtype=np.int64)
+        self._vocabulary = np.array(sorted(self.vocabulary), dtype=np.int64)
+        columns = {bucket: i for i, bucket in enumerate(self._vocabulary.tolist())}
+        counts = np.zeros((len(self._classes), len(self._vocabulary) + 1))
+        for row, category_id in enumerate(self._classes.tolist()):
+            for bucket, count in self.feature_counts[category_id].items():
+                counts[row, columns[bucket]] = count
+        denominators = np.array([self.feature_totals[c] + ALPHA * vocabulary_size for c in self._classes.tolist()])
+        self._log_priors = np.log(np.array([self.class_counts[c] for c in self._classes.tolist()]) / total) \
+            if total else np.zeros(0)
+        self._log_likelihoods = np.log(counts + ALPHA) - np.log(denominators)[:, None]
+        self.merchant_index = {}
+        for merchant_key, votes in self.merchant_votes.items():
+            category_id, count = votes.most_common(1)[0]
+            if count >= MERCHANT_MIN_VOTES and count / sum(votes.values()) >= MERCHANT_MIN_SHARE:
+                self.merchant_index[merchant_key] = category_id
+        return self
+
+    def predict_with_confidence(
+        self, rows: Iterable[Tuple[str, Optional[str]]]
+    ) -> List[Tuple[Optional[int], float]]:
+        """
+        (category_id, confianza) de cada (descripción, comercio) del lote; category_id None
+        si no hay suficiente confianza. Las filas de comercios del índice no pasan por el modelo.
+        """
+        rows = list(rows)
+        results: List[Tuple[Optional[int], float]] = [(None, 0.0)] * len(rows)
+        if not self.trained:
+            return results
+
+        # Features de todas las filas pendientes en un solo arreglo, con la fila a la que pertenecen
+        pending, buckets, owners = [], [], []
+        for i, (description, merchant) in enumerate(rows):
+            merchant_key = _merchant_key(merchant)
+            if merchant_key in self.merchant_index:
+                results[i] = (self.merchant_index[merchant_key], 1.0)
+                continue
+            features = extract_features(description, merchant)
+            buckets.extend(features)
+            owners.extend([len(pending)] * len(features))
+            pending.append(i)
+        if not pending:
+            return results
+
+        class_count = len(self._classes)
+        scores = np.tile(self._log_priors, (len(pending), 1))
+        if buckets:
+            buckets = np.array(buckets, dtype=np.int64)
+            owners = np.array(owners, dtype=np.int64)
+            # Columna de cada bucket en el vocabulario (la última si no se vio al entrenar)
+            unseen = len(self._vocabulary)
+            columns = np.searchsorted(self._vocabulary, buckets)
+            found = columns < unseen
+            found[found] = self._vocabulary[columns[found]] == buckets[found]
+            columns[~found] = unseen
+            # Suma por fila y categoría de log P(bucket | categoría)
+            cells = (owners[:, None] * class_count + np.arange(class_count)).ravel()
+            scores += np.bincount(
+                cells, weights=self._log_likelihoods[:, columns].T.ravel(), minlength=len(pending) * class_count
+            ).reshape(len(pending), class_count)
+
+        best = scores.argmax(axis=1)
+        # Probabilidad de la mejor clase (softmax de los log-scores)
+        confidences = 1.0 / np.exp(scores - scores[np.arange(len(pending)), best][:, None]).sum(axis=1)
+        for i, column, confidence in zip(pending, best.tolist(), confidences.tolist()):
+            category_id = int(self._classes[column]) if confidence >= MIN_CONFIDENCE else None
+            results[i] = (category_id, confidence)
+        return results
+
+    def predict_one(self, description: str, merchant: Optional[str] = None) -> Tuple[Optional[int], float]:
+        """(category_id, confianza) de una transacción; category_id None si no hay suficiente confianza"""
+        return self.predict_with_confidence([(description, merchant)])[0]
+
+    def predict(
+        self,
+        rows: Iterable[Tuple[str, Optional[str]]],
+        category_ids: Optional[Collection[int]] = None
+    ) -> List[Optional[int]]:
+        """
+        Predice la categoría de un lote de (descripción, comercio).
+        Con category_ids se descartan las predicciones de categorías que ya no existen
+        (el modelo pudo entrenarse antes de que se eliminaran).
+        """
+        predictions = [category_id for category_id, _ in self.predict_with_confidence(rows)]
+        if category_ids is not None:
+            predictions = [p if p in category_ids else None for p in predictions]
+        return predictions
+
+    def categorize_transactions(self, transactions: List[Dict], category_ids: Optional[Collection[int]] = None) -> int:
+        """
+        Asigna category_id (con category_source 'auto') a las transacciones que no tienen categoría.
+        Retorna cuántas se categorizaron.
+        """
+        pending = [tx for tx in transactions if not tx.get('category_id')]
+        assigned = 0
+        predictions = self.predict(((tx.get('description') or '', tx.get('merchant')) for tx in pending), category_ids)
+        for tx, category_id in zip(pending, predictions):
+            if category_id:
+                tx['category_id'] = category_id
+                tx['category_source'] = 'auto'
+                assigned += 1
+        return assigned
+
+
+def load_training_rows() -> List[Tuple[str, Optional[str], int]]:
+    """Transacciones categorizadas a mano (las auto-categorizadas no se usan para no reforzar errores)"""
+    from database import get_db_connection
+
+    conn = get_db_connection()
+    if not conn:
+        return []
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT t.description, t.merchant, t.category_id
+                FROM transactions t
+                JOIN categories c ON c.id = t.category_id
+                WHERE t.category_source IS NULL OR t.category_source = 'manual'
+            """)
+            return [(row['description'], row['merchant'], row['category_id']) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def load_category_ids() -> Optional[set]:
+    """IDs de las categorías existentes (None si no hay conexión)"""
+    from database import get_db_connection
+
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM categories")
+            return {row['id'] for row in cursor.fetchall()}
+    finally:
+        conn.close()
+
+
+_model: Optional[Categorizer] = None
+_model_version: Optional[int] = None
+_model_lock = threading.Lock()
+
+
+def get_categorizer() -> Categorizer:
+    """Modelo del proceso, re-entrenado si hubo nuevas categorizaciones manuales"""
+    global _model, _model_version
+    from services import DataVersionService
+
+    try:
+        versions = DataVersionService.get("categorizations")
+        version = versions["categorizations"]["version"] if versions else None
+    except Exception as e:
+        logger.warning(f"No se pudo obtener la versión de las categorizaciones: {e}")
+        version = None
+
+    with _model_lock:
+        if _model is None or (version is not None and version != _model_version):
+            try:
+                rows = load_training_rows()
+            except Exception as e:
+                logger.warning(f"No se pudo entrenar el categorizador: {e}")
+                rows = []
+            if rows or _model is None:
+                _model = Categorizer().train(rows)
+                _model_version = version
+                logger.info(f"Categorizador entrenado con {len(rows)} transacciones")
+        return _model
@@ -0,0 +1,65 @@
+"""
+GET condicional (ETag / Last-Modified) para los endpoints de lectura.
+
+La versión de los datos sale de los contadores de data_versions (una consulta por
+clave primaria). Si el cliente ya tiene esa versión se responde 304 sin ejecutar la
+consulta del endpoint ni serializar el resultado.
+"""
+import hashlib
+import logging
+from email.utils import format_datetime
+from typing import Optional
+from fastapi import Request, Response
+from services import DataVersionService
+
+logger = logging.getLogger(__name__)
+
+
+def not_modified_response(request: Request, response: Response, *resources: str) -> Optional[Response]:
+    """
+    Calcula ETag y Last-Modified para los recursos de los que depende el endpoint.
+
+    Si la petición trae un If-None-Match vigente, retorna la respuesta 304 que el
+    endpoint debe devolver tal cual. Si no, deja los headers en response y retorna
+    None para que el endpoint responda normalmente.
+    """
+    try:
+        versions = DataVersionService.get(*resources)
+    except Exception as e:
+        logger.warning(f"No se pudo obtener la versión de los datos: {e}")
+        versions = None
+    if versions is None:
+        return None
+
+    # La representación depende de los datos y de los parámetros de la consulta
+    signature = "|".join(f"{name}:{versions[name]['version']}" for name in resources)
+    signature += "|" + str(request.url.path) + "?" + str(request.query_params)
+    etag = 'W/"' + hashlib.sha1(signature.encode()).hexdigest()[:20] + '"'
+
+    modified = [v['updated_at'] for v in versions.values() if v['updated_at']]
+    last_modified = max(modified) if modified else None
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    if _is_fresh(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
+
+
+def _is_fresh(request: Request, etag: str) -> bool:
+    """
+    Evalúa If-None-Match. If-Modified-Since no se usa: siempre hay ETag, que tiene
+    prioridad (RFC 9110 §13.2.2), y con resolución de segundos daría 304 falsos
+    ante escrituras en el mismo segundo que la lectura anterior.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Comparación débil: W/"x" equivale a "x"
+    bare = etag[2:]
+    return "*" in candidates or any(tag in (etag, bare) or tag[2:] == bare for tag in candidates)
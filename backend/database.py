@@ -1,5 +1,9 @@
 """Database connection utilities"""
 import os
+import time
+import threading
+import logging
+from collections import deque
 from typing import Optional
 import pymysql
 from pymysql.cursors import DictCursor
@@ -7,35 +11,278 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+def _connect():
+    """Abre una conexión nueva a MySQL (handshake completo)"""
+    return pymysql.connect(
+        host=os.getenv("DB_HOST", "mysql"),
+        port=int(os.getenv("DB_PORT", 3306)),
+        user=os.getenv("DB_USER", "bankountable_user"),
+        password=os.getenv("DB_PASSWORD", "bankountable_password"),
+        database=os.getenv("DB_NAME", "bankountable_db"),
+        cursorclass=DictCursor,
+        charset="utf8mb4",
+        connect_timeout=5,
+    )
+
+
+class PooledConnection:
+    """
+    Envoltorio de una conexión PyMySQL prestada por el pool.
+    Se comporta como la conexión original, pero close() la devuelve al pool
+    en lugar de cerrar el socket.
+    """
+
+    def __init__(self, pool: "ConnectionPool", raw, created_at: float):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Devuelve la conexión al pool (idempotente)"""
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._raw, self._created_at)
+
+    def invalidate(self):
+        """Descarta la conexión en lugar de devolverla al pool"""
+        if self._released:
+            return
+        self._released = True
+        self._pool._discard(self._raw)
+
+
+class ConnectionPool:
+    """
+    Pool acotado y thread-safe de conexiones MySQL.
+
+    - max_size: número máximo de conexiones abiertas (prestadas + ociosas)
+    - max_wait: segundos máximos esperando una conexión libre
+    - max_lifetime: segundos tras los cuales una conexión se recicla
+    - ping_interval: segundos de inactividad tras los cuales se hace ping antes de prestarla
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10,
+        max_wait: float = 5.0,
+        max_lifetime: float = 1800.0,
+        ping_interval: float = 30.0,
+    ):
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self._idle = deque()  # (conexión, creada_en, último_uso)
+        self._checked_out = 0
+        self._lock = threading.Condition(threading.Lock())
+        # Métricas acumuladas
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+        self._acquisitions = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._failed_health_checks = 0
+
+    @classmethod
+    def from_env(cls) -> "ConnectionPool":
+        """Crea el pool a partir de las variables DB_POOL_*"""
+        return cls(
+            max_size=int(os.getenv("DB_POOL_SIZE", 10)),
+            max_wait=float(os.getenv("DB_POOL_MAX_WAIT", 5)),
+            max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", 1800)),
+            ping_interval=float(os.getenv("DB_POOL_PING_INTERVAL", 30)),
+        )
+
+    def acquire(self) -> PooledConnection:
+        """
+        Presta una conexión del pool, abriendo una nueva si hay cupo.
+        Lanza TimeoutError si no se libera ninguna dentro de max_wait.
+        """
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        while True:
+            candidate = None
+            with self._lock:
+                while not self._idle and self._checked_out >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise TimeoutError(
+                            f"No hay conexiones libres en el pool tras {self.max_wait}s"
+                        )
+                    self._lock.wait(remaining)
+                if self._idle:
+                    candidate = self._idle.pop()  # LIFO: la más caliente primero
+                self._checked_out += 1
+
+            now = time.monotonic()
+            if candidate:
+                raw, created_at, last_used = candidate
+                if now - created_at > self.max_lifetime:
+                    self._close_quietly(raw)
+                    self._record_recycle()
+                    candidate = None
+                elif now - last_used > self.ping_interval and not self._is_alive(raw):
+                    self._close_quietly(raw)
+                    with self._lock:
+                        self._failed_health_checks += 1
+                    candidate = None
+
+            try:
+                if candidate:
+                    raw, created_at = candidate[0], candidate[1]
+                else:
+                    raw, created_at = _connect(), time.monotonic()
+                    with self._lock:
+                        self._created += 1
+            except Exception:
+                self._return_slot()
+                raise
+
+            waited = time.monotonic() - started
+            with self._lock:
+                self._acquisitions += 1
+                self._total_wait += waited
+                self._max_wait_seen = max(self._max_wait_seen, waited)
+            return PooledConnection(self, raw, created_at)
+
+    def _release(self, raw, created_at: float):
+        """Devuelve una conexión al pool, dejando la sesión limpia"""
+        try:
+            if raw.open:
+                # Siempre: server_status solo se actualiza con paquetes OK (no tras un SELECT),
+                # así que no sirve para saber si quedó abierta la transacción (y su snapshot
+                # de REPEATABLE READ) de un lector; el siguiente usuario vería datos viejos
+                raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+
+        if not raw.open or time.monotonic() - created_at > self.max_lifetime:
+            if raw.open:
+                self._record_recycle()
+            self._discard(raw)
+            return
+
+        with self._lock:
+            self._checked_out -= 1
+            self._idle.append((raw, created_at, time.monotonic()))
+            self._lock.notify()
+
+    def _discard(self, raw):
+        self._close_quietly(raw)
+        self._return_slot()
+
+    def _return_slot(self):
+        with self._lock:
+            self._checked_out -= 1
+            self._lock.notify()
+
+    def _record_recycle(self):
+        with self._lock:
+            self._recycled += 1
+
+    @staticmethod
+    def _is_alive(raw) -> bool:
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """Cierra todas las conexiones ociosas"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for raw, _, _ in idle:
+            self._close_quietly(raw)
+
+    def metrics(self) -> dict:
+        """Métricas actuales del pool"""
+        with self._lock:
+            acquisitions = self._acquisitions
+            return {
+                "max_size": self.max_size,
+                "checked_out": self._checked_out,
+                "idle": len(self._idle),
+                "acquisitions": acquisitions,
+                "timeouts": self._timeouts,
+                "connections_created": self._created,
+                "connections_recycled": self._recycled,
+                "failed_health_checks": self._failed_health_checks,
+                "total_wait_ms": round(self._total_wait * 1000, 2),
+                "avg_wait_ms": round(self._total_wait * 1000 / acquisitions, 3) if acquisitions else 0.0,
+                "max_wait_ms": round(self._max_wait_seen * 1000, 2),
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Obtiene el pool del proceso actual (se recrea tras un fork)"""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool.from_env()
+                _pool_pid = pid
+    return _pool
+
 
 def get_db_connection():
     """
-    Create and return a MySQL database connection.
+    Obtiene una conexión MySQL del pool compartido.
+    Llamar a close() la devuelve al pool.
     Returns None if connection fails (allows app to start without DB).
     """
     try:
-        connection = pymysql.connect(
-            host=os.getenv("DB_HOST", "mysql"),
-            port=int(os.getenv("DB_PORT", 3306)),
-            user=os.getenv("DB_USER", "bankountable_user"),
-            password=os.getenv("DB_PASSWORD", "bankountable_password"),
-            database=os.getenv("DB_NAME", "bankountable_db"),
-            cursorclass=DictCursor,
-            charset="utf8mb4",
-            connect_timeout=5,
-        )
-        return connection
+        return get_pool().acquire()
     except Exception as e:
         print(f"Database connection error: {e}")
         return None
 
 
+def get_pool_metrics() -> dict:
+    """Métricas del pool de conexiones"""
+    return get_pool().metrics()
+
+
 def test_db_connection() -> bool:
     """Test if database connection works"""
     conn = get_db_connection()
     if conn:
+        try:
+            conn.ping(reconnect=False)
+        except Exception:
+            conn.invalidate()
+            return False
         conn.close()
         return True
     return False
-
-
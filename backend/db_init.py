@@ -97,17 +97,33 @@ def init_database():
         try:
             with connection.cursor() as cursor:
                 # Ejecutar cada statement SQL (separados por ;)
-                statements = [s.strip() for s in schema_sql.split(';') if s.strip() and not s.strip().startswith('--')]
+                # Quitar primero las líneas de comentario para no descartar el statement que les sigue
+                schema_sql = "\n".join(
+                    line for line in schema_sql.splitlines() if not line.strip().startswith('--')
+                )
+                statements = [s.strip() for s in schema_sql.split(';') if s.strip()]
                 for statement in statements:
                     if statement:
                         try:
                             cursor.execute(statement)
                         except Exception as e:
-                            # Ignorar errores de "table already exists"
-                            if "already exists" not in str(e).lower():
+                            # Ignorar errores de "table already exists" y de migraciones ya aplicadas
+                            error_str = str(e).lower()
+                            if not any(msg in error_str for msg in ("already exists", "duplicate column", "duplicate key name")):
                                 print(f"Advertencia al ejecutar statement: {e}")
                 connection.commit()
                 print("✅ Base de datos inicializada correctamente")
+                
+                # Poblar los rollups de estadísticas si la tabla es nueva en una base con datos
+                cursor.execute("""
+                    SELECT EXISTS(SELECT 1 FROM daily_rollups) AS has_rollups,
+                           EXISTS(SELECT 1 FROM transactions) AS has_transactions
+                """)
+                state = cursor.fetchone()
+                if state['has_transactions'] and not state['has_rollups']:
+                    from services import RollupService
+                    rows = RollupService.rebuild(conn=connection)
+                    print(f"✅ Rollups de estadísticas generados ({rows} filas)")
         finally:
             connection.close()
     except Exception as e:
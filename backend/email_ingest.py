@@ -0,0 +1,343 @@
+"""
+Ingesta de cartolas desde correos del banco (.eml o mbox).
+
+Los mensajes se recorren línea a línea: solo se guardan en memoria los headers de cada
+parte MIME y el contenido decodificado de los PDFs adjuntos (que se vuelca a disco si
+es grande). Los adjuntos se deduplican por hash y se importan con el mismo pipeline
+que los PDFs subidos, registrando import_type='email'.
+
+Uso:
+    python email_ingest.py <directorio-con-.eml | archivo.mbox> [--dry-run] [--allow-duplicates]
+"""
+import io
+import os
+import sys
+import json
+import hashlib
+import binascii
+import logging
+import tempfile
+from email.parser import BytesHeaderParser
+from email import policy
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Adjuntos bajo este tamaño se mantienen en memoria
+MEMORY_ATTACHMENT_BYTES = int(os.getenv("IMPORT_MEMORY_UPLOAD_MB", 5)) * 1024 * 1024
+# Adjuntos sobre este tamaño se descartan
+MAX_ATTACHMENT_BYTES = int(os.getenv("IMPORT_MAX_UPLOAD_MB", 20)) * 1024 * 1024
+
+_header_parser = BytesHeaderParser(policy=policy.default)
+
+
+class Attachment:
+    """PDF adjunto extraído de un correo"""
+
+    def __init__(self, filename: str, data: Union[bytes, Path], content_hash: str, size: int, subject: str, origin: str):
+        self.filename = filename
+        self.data = data  # bytes o ruta de un temporal
+        self.content_hash = content_hash
+        self.size = size
+        self.subject = subject
+        self.origin = origin
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        """Fuente para PDFParser / cola de imports (bytes o ruta)"""
+        return str(self.data) if isinstance(self.data, Path) else self.data
+
+    def discard(self):
+        """Elimina el temporal si el adjunto se volcó a disco"""
+        if isinstance(self.data, Path):
+            self.data.unlink(missing_ok=True)
+
+
+class _AttachmentSink:
+    """Destino de un adjunto: decodifica por líneas, calcula el hash y vuelca a disco si crece"""
+
+    def __init__(self, encoding: str, spill_dir: Optional[str]):
+        self.encoding = encoding
+        self.spill_dir = spill_dir
+        self.digest = hashlib.sha256()
+        self.buffer = io.BytesIO()
+        self.spill = None
+        self.size = 0
+        self.too_large = False
+        self._pending = b""  # base64 sin completar un bloque de 4 caracteres
+
+    def feed(self, line: bytes):
+        if self.too_large:
+            return
+        if self.encoding == "base64":
+            chunk = self._pending + b"".join(line.split())
+            usable = len(chunk) - len(chunk) % 4
+            self._pending = chunk[usable:]
+            data = binascii.a2b_base64(chunk[:usable]) if usable else b""
+        elif self.encoding == "quoted-printable":
+            data = binascii.a2b_qp(line)
+        else:
+            data = line
+        self._write(data)
+
+    def _write(self, data: bytes):
+        if not data:
+            return
+        self.size += len(data)
+        if self.size > MAX_ATTACHMENT_BYTES:
+            self.too_large = True
+            return
+        self.digest.update(data)
+        if self.spill is None and self.size > MEMORY_ATTACHMENT_BYTES:
+            self.spill = tempfile.NamedTemporaryFile(dir=self.spill_dir, prefix="email_", suffix=".pdf", delete=False)
+            self.spill.write(self.buffer.getbuffer())
+            self.buffer = None
+        (self.spill or self.buffer).write(data)
+
+    def finish(self) -> Optional[Union[bytes, Path]]:
+        """Cierra el adjunto; None si se descartó por tamaño"""
+        if self._pending and not self.too_large:
+            # Relleno faltante en la última línea
+            self._write(binascii.a2b_base64(self._pending + b"=" * (-len(self._pending) % 4)))
+        if self.spill is not None:
+            self.spill.close()
+            if self.too_large:
+                Path(self.spill.name).unlink(missing_ok=True)
+                return None
+            return Path(self.spill.name)
+        return None if self.too_large else self.buffer.getvalue()
+
+
+def _is_pdf_part(headers) -> Optional[str]:
+    """Retorna el nombre del archivo si la parte es un PDF adjunto"""
+    filename = headers.get_filename() or ""
+    if headers.get_content_type() == "application/pdf" or filename.lower().endswith(".pdf"):
+        return filename or "adjunto.pdf"
+    return None
+
+
+def _read_headers(lines: Iterator[bytes]) -> bytes:
+    """Consume líneas hasta la línea en blanco que cierra los headers"""
+    header_lines = []
+    for line in lines:
+        if not line.strip():
+            break
+        header_lines.append(line)
+    return b"".join(header_lines)
+
+
+def iter_message_attachments(lines: Iterable[bytes], origin: str, spill_dir: Optional[str] = None) -> Iterator[Attachment]:
+    """
+    Recorre un mensaje (como iterable de líneas en bytes) y entrega sus PDFs adjuntos.
+    Soporta multipart anidado; las partes que no son PDF se saltan sin guardarlas.
+    """
+    lines = iter(lines)
+    top = _header_parser.parsebytes(_read_headers(lines))
+    subject = str(top.get("Subject", ""))
+
+    if top.get_content_maintype() != "multipart" or not top.get_boundary():
+        filename = _is_pdf_part(top)
+        if filename:
+            sink = _AttachmentSink(top.get("Content-Transfer-Encoding", "7bit").strip().lower(), spill_dir)
+            for line in lines:
+                sink.feed(line)
+            data = sink.finish()
+            if data is not None:
+                yield Attachment(filename, data, sink.digest.hexdigest(), sink.size, subject, origin)
+        return
+
+    boundaries = [top.get_boundary().encode()]
+    sink = None
+    filename = None
+
+    def close_part():
+        nonlocal sink
+        if sink is None:
+            return None
+        data = sink.finish()
+        attachment = None
+        if data is not None:
+            attachment = Attachment(filename, data, sink.digest.hexdigest(), sink.size, subject, origin)
+        else:
+            logger.warning(f"Adjunto {filename} de {origin} descartado por superar el tamaño máximo")
+        sink = None
+        return attachment
+
+    for line in lines:
+        if line.startswith(b"--") and boundaries:
+            marker = line.rstrip()
+            matched = next((b for b in reversed(boundaries) if marker in (b"--" + b, b"--" + b + b"--")), None)
+            if matched is not None:
+                attachment = close_part()
+                if attachment:
+                    yield attachment
+                if marker.endswith(b"--") and marker == b"--" + matched + b"--":
+                    # Cierre del multipart (y de los anidados dentro de él)
+                    del boundaries[boundaries.index(matched):]
+                    continue
+                del boundaries[boundaries.index(matched) + 1:]
+
+                headers = _header_parser.parsebytes(_read_headers(lines))
+                if headers.get_content_maintype() == "multipart" and headers.get_boundary():
+                    boundaries.append(headers.get_boundary().encode())
+                    continue
+                filename = _is_pdf_part(headers)
+                if filename:
+                    encoding = headers.get("Content-Transfer-Encoding", "7bit").strip().lower()
+                    sink = _AttachmentSink(encoding, spill_dir)
+                continue
+        if sink is not None:
+            sink.feed(line)
+
+    attachment = close_part()
+    if attachment:
+        yield attachment
+
+
+def _iter_mbox_messages(handle) -> Iterator[Iterator[bytes]]:
+    """Divide un mbox en mensajes, entregando cada uno como iterador de líneas"""
+    state = {"line": None}
+
+    def next_line():
+        line = handle.readline()
+        return line if line else None
+
+    line = next_line()
+    while line is not None and not line.startswith(b"From "):
+        line = next_line()
+
+    while line is not None:
+        # line es el separador "From " del mensaje actual
+        def message_lines():
+            previous_blank = False
+            while True:
+                current = next_line()
+                if current is None or (previous_blank and current.startswith(b"From ")):
+                    state["line"] = current
+                    return
+                previous_blank = not current.strip()
+                # mboxrd: ">From " escapado
+                if current.startswith(b">") and current.lstrip(b">").startswith(b"From "):
+                    current = current[1:]
+                yield current
+
+        message = message_lines()
+        yield message
+        for _ in message:  # Consumir lo que el lector no haya leído
+            pass
+        line = state["line"]
+
+
+def iter_mailbox_attachments(path: Union[str, Path], spill_dir: Optional[str] = None) -> Iterator[Attachment]:
+    """
+    Entrega los PDFs adjuntos de un directorio de .eml o de un archivo mbox,
+    deduplicados por hash de contenido.
+    """
+    path = Path(path)
+    seen = set()
+
+    def messages():
+        if path.is_dir():
+            for eml in sorted(path.glob("*.eml")):
+                with open(eml, "rb") as handle:
+                    yield str(eml), handle
+        else:
+            with open(path, "rb") as handle:
+                for index, message in enumerate(_iter_mbox_messages(handle)):
+                    yield f"{path}#{index}", message
+
+    for origin, lines in messages():
+        try:
+            for attachment in iter_message_attachments(lines, origin, spill_dir):
+                if attachment.content_hash in seen:
+                    attachment.discard()
+                    continue
+                seen.add(attachment.content_hash)
+                yield attachment
+        except Exception as e:
+            logger.error(f"No se pudo leer el correo {origin}: {e}")
+
+
+def ingest_mailbox(path: Union[str, Path], reject_duplicates: bool = True, spill_dir: Optional[str] = None) -> List[dict]:
+    """
+    Importa los PDFs adjuntos de un directorio de .eml o de un mbox.
+    Los adjuntos se parsean en paralelo en la cola de imports y se registran con import_type='email'.
+
+    Returns:
+        Un resumen por adjunto
+    """
+    from import_jobs import import_queue, run_import_batch
+    from services import ImportService
+
+    summary = []
+    items = []
+    for attachment in iter_mailbox_attachments(path, spill_dir):
+        previous = ImportService.find_by_hash(attachment.content_hash) if reject_duplicates else None
+        if previous:
+            attachment.discard()
+            summary.append({
+                "filename": attachment.filename,
+                "origin": attachment.origin,
+                "status": "duplicate",
+                "import_id": previous['id'],
+            })
+            continue
+
+        import_id = ImportService.create(
+            attachment.filename,
+            str(attachment.data) if isinstance(attachment.data, Path) else None,
+            import_type="email",
+            status="pending",
+            content_hash=attachment.content_hash,
+        )
+        item = {
+            "import_id": import_id,
+            "filename": attachment.filename,
+            "origin": attachment.origin,
+            "source": attachment.source,
+            "content_hash": attachment.content_hash,
+        }
+        items.append(item)
+        summary.append(item)
+
+    results = iter(run_import_batch(items, import_queue)) if items else iter(())
+    summary = [
+        {**next(results), "origin": entry["origin"]} if "source" in entry else entry
+        for entry in summary
+    ]
+    return summary
+
+
+def main(argv: List[str]) -> int:
+    args = [a for a in argv if not a.startswith("--")]
+    if len(args) != 1:
+        print(__doc__)
+        return 1
+
+    if "--dry-run" in argv:
+        # Solo extraer y parsear, sin base de datos
+        from pdf_parser import PDFParser
+
+        parser = PDFParser()
+        for attachment in iter_mailbox_attachments(args[0]):
+            try:
+                count = len(parser.parse_pdf(attachment.source))
+                print(f"{attachment.filename}: {attachment.size} bytes, {count} transacciones ({attachment.origin})")
+            finally:
+                attachment.discard()
+        return 0
+
+    from import_jobs import import_queue
+
+    try:
+        summary = ingest_mailbox(args[0], reject_duplicates="--allow-duplicates" not in argv)
+    finally:
+        import_queue.shutdown(wait=True)
+    print(json.dumps(summary, indent=2, ensure_ascii=False, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main(sys.argv[1:]))
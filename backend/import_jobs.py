@@ -0,0 +1,248 @@
+"""Cola de jobs de importación procesados por un pool de procesos"""
+import os
+import hashlib
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Hitos de progreso reportados en imports.progress
+PROGRESS_STARTED = 5
+PROGRESS_PARSED = 60
+PROGRESS_DONE = 100
+
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 del contenido de un archivo"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_source(source) -> str:
+    """SHA-256 de una cartola dada como ruta o como bytes"""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    return hash_file(source)
+
+
+def parse_statement(source, content_hash: Optional[str] = None) -> list:
+    """
+    Parsea una cartola (ruta o bytes) usando la caché persistente por hash de contenido.
+    Si el mismo archivo ya se parseó con esta versión del parser, no se abre el PDF.
+    
+    La caché guarda el resultado sin clasificar: comercio, método de pago y categoría se
+    infieren después con las reglas y el categorizador vigentes, así que cambiarlos no
+    invalida la caché.
+    """
+    from pdf_parser import PDFParser
+    from services import ParseCacheService
+
+    content_hash = content_hash or hash_source(source)
+    try:
+        cached = ParseCacheService.get(content_hash, PDFParser.VERSION)
+    except Exception as e:
+        logger.warning(f"No se pudo consultar la caché de cartolas: {e}")
+        cached = None
+    if cached is not None:
+        logger.info(f"Cartola {content_hash[:12]} encontrada en caché ({len(cached)} transacciones)")
+        return classify_statement(cached)
+
+    transactions_data = PDFParser().parse_pdf(source, classify=False)
+    try:
+        ParseCacheService.put(content_hash, PDFParser.VERSION, transactions_data)
+    except Exception as e:
+        # La caché es una optimización: no debe hacer fallar el import
+        logger.warning(f"No se pudo guardar la cartola en caché: {e}")
+    return classify_statement(transactions_data)
+
+
+def classify_statement(transactions: list) -> list:
+    """Infiere comercio y método de pago con las reglas y la categoría con el categorizador"""
+    from rules import get_rule_engine
+    from categorizer import get_categorizer, load_category_ids
+
+    get_rule_engine().classify_transactions(transactions)
+    try:
+        categorized = get_categorizer().categorize_transactions(transactions, load_category_ids())
+        logger.info(f"Categorizadas automáticamente {categorized} de {len(transactions)} transacciones")
+    except Exception as e:
+        # Sin categoría automática el import sigue siendo válido
+        logger.warning(f"No se pudo categorizar automáticamente: {e}")
+    return transactions
+
+
+def run_import_job(import_id: int, source, content_hash: Optional[str] = None) -> dict:
+    """
+    Procesa un import en un proceso worker: parsea el PDF y guarda las transacciones.
+    Recorre los estados pending -> processing -> completed/failed de la tabla imports.
+    
+    source es la ruta del archivo (que se elimina al terminar) o su contenido en bytes.
+    """
+    # Importar aquí para que el proceso worker cargue sus propias dependencias (y su pool de conexiones)
+    from services import TransactionService, ImportService
+
+    try:
+        ImportService.update(import_id, status="processing", progress=PROGRESS_STARTED)
+
+        transactions_data = parse_statement(source, content_hash)
+        ImportService.update(import_id, progress=PROGRESS_PARSED)
+
+        result = TransactionService.bulk_create(transactions_data, import_id=import_id)
+        for failure in result['failed']:
+            logger.error(f"Import {import_id}: error al guardar transacción #{failure['index']}: {failure['error']}")
+
+        ImportService.update(
+            import_id,
+            status="completed",
+            progress=PROGRESS_DONE,
+            transactions_count=result['created'],
+            duplicates_count=result['duplicates'],
+        )
+        return {
+            "import_id": import_id,
+            "transactions_imported": result['created'],
+            "transactions_failed": len(result['failed']),
+            "duplicates_skipped": result['duplicates'],
+        }
+    except Exception as e:
+        logger.error(f"Import {import_id} falló: {e}", exc_info=True)
+        ImportService.update(import_id, status="failed", error_message=str(e))
+        raise
+    finally:
+        if isinstance(source, str):
+            Path(source).unlink(missing_ok=True)
+
+
+def run_import_batch(items: List[dict], queue: "ImportJobQueue") -> List[dict]:
+    """
+    Importa varias cartolas ya registradas en imports.
+
+    Cada item trae import_id, filename, source (ruta o bytes) y content_hash. Los PDFs
+    se parsean en paralelo en el pool de procesos de la cola y luego se guardan con
+    inserciones masivas sobre una misma conexión, con un commit por archivo.
+
+    Returns:
+        Un resumen por archivo, en el mismo orden de items
+    """
+    from database import get_db_connection
+    from services import TransactionService, ImportService
+
+    for item in items:
+        ImportService.update(item['import_id'], status="processing", progress=PROGRESS_STARTED)
+    futures = [queue.submit_parse(item['source'], item.get('content_hash')) for item in items]
+
+    summary = []
+    conn = get_db_connection()
+    try:
+        for item, future in zip(items, futures):
+            import_id = item['import_id']
+            try:
+                transactions_data = future.result()
+                ImportService.update(import_id, progress=PROGRESS_PARSED)
+                if not conn:
+                    raise Exception("No se pudo conectar a la base de datos")
+                result = TransactionService.bulk_create(transactions_data, import_id=import_id, conn=conn)
+                ImportService.update(
+                    import_id, status="completed", progress=PROGRESS_DONE,
+                    transactions_count=result['created'], duplicates_count=result['duplicates']
+                )
+                summary.append({
+                    "filename": item['filename'],
+                    "import_id": import_id,
+                    "status": "completed",
+                    "transactions_imported": result['created'],
+                    "transactions_failed": len(result['failed']),
+                    "duplicates_skipped": result['duplicates'],
+                })
+            except Exception as e:
+                logger.error(f"Import {import_id} ({item['filename']}) falló: {e}")
+                ImportService.update(import_id, status="failed", error_message=str(e))
+                summary.append({
+                    "filename": item['filename'],
+                    "import_id": import_id,
+                    "status": "failed",
+                    "error": str(e),
+                })
+            finally:
+                if isinstance(item['source'], str):
+                    Path(item['source']).unlink(missing_ok=True)
+    finally:
+        if conn:
+            conn.close()
+    return summary
+
+
+class ImportJobQueue:
+    """
+    Cola en proceso de jobs de importación.
+
+    La tabla imports es la fuente de verdad del estado de cada job; esta cola
+    solo reparte el trabajo entre IMPORT_WORKERS procesos.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or int(os.getenv("IMPORT_WORKERS", 2))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: no heredar hilos ni sockets del servidor
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def submit(self, import_id: int, source, content_hash: Optional[str] = None) -> Future:
+        """Encola un import ya registrado con status 'pending' (source: ruta o bytes)"""
+        future = self._get_executor().submit(run_import_job, import_id, source, content_hash)
+        future.add_done_callback(lambda f: self._log_result(import_id, f))
+        return future
+
+    def submit_parse(self, source, content_hash: Optional[str] = None) -> Future:
+        """Encola solo el parsing de una cartola (con caché); el resultado son sus transacciones"""
+        return self._get_executor().submit(parse_statement, source, content_hash)
+
+    @staticmethod
+    def _log_result(import_id: int, future: Future):
+        error = future.exception()
+        if error:
+            logger.error(f"Job de import {import_id} terminó con error: {error}")
+        else:
+            logger.info(f"Job de import {import_id} completado: {future.result()}")
+
+    def recover_pending(self) -> int:
+        """
+        Re-encola los imports que quedaron en 'pending' (p.ej. tras un reinicio).
+        Los que se procesaban en memoria no tienen archivo y se marcan como fallidos.
+        """
+        from services import ImportService
+
+        recovered = 0
+        for job in ImportService.get_by_status("pending"):
+            if job.get('file_path') and Path(job['file_path']).exists():
+                self.submit(job['id'], job['file_path'], job.get('content_hash'))
+                recovered += 1
+            else:
+                ImportService.update(job['id'], status="failed", error_message="Archivo de import no encontrado")
+        if recovered:
+            logger.info(f"Re-encolados {recovered} imports pendientes")
+        return recovered
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+import_queue = ImportJobQueue()
@@ -0,0 +1,286 @@
+"""
+Análisis de patrones de gasto (fase "inteligencia financiera").
+
+El historial se carga una sola vez en arreglos columnares de NumPy (fechas, montos y
+códigos enteros de comercio, categoría y método de pago) y cada análisis es una pasada
+vectorizada sobre ellos:
+- anomalías: z-score robusto (mediana y MAD) por comercio, o por categoría si el
+  comercio tiene pocas transacciones
+- cobros recurrentes: grupos comercio + monto similar con intervalos regulares
+- variación mes a mes por categoría y uso de crédito por mes
+"""
+import os
+import logging
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# |z| robusto sobre el que un gasto se considera anómalo
+ANOMALY_THRESHOLD = float(os.getenv("INSIGHTS_ANOMALY_THRESHOLD", 3.5))
+# Transacciones mínimas de un grupo para estimar su gasto típico
+MIN_GROUP_SIZE = 5
+# Dos montos son "el mismo cobro" si difieren en menos de esta proporción
+RECURRING_AMOUNT_TOLERANCE = 0.1
+RECURRING_MIN_OCCURRENCES = 3
+# Dispersión máxima de los intervalos (MAD / mediana) para considerarlos regulares
+RECURRING_MAX_JITTER = 0.2
+# Períodos reconocidos: nombre -> (días mínimos, días máximos)
+PERIODS = {
+    'weekly': (6, 8),
+    'biweekly': (13, 16),
+    'monthly': (27, 33),
+    'quarterly': (85, 95),
+    'yearly': (350, 380),
+}
+DAYS_PER_MONTH = 30.44
+MAX_RESULTS = 50
+
+# Escala que hace la MAD comparable con la desviación estándar en datos normales
+_MAD_SCALE = 0.6745
+
+
+class History:
+    """Historial de transacciones en arreglos columnares"""
+
+    def __init__(self, rows: List[Dict]):
+        self.size = len(rows)
+        self.ids = np.fromiter((row['id'] for row in rows), dtype=np.int64, count=self.size)
+        self.dates = np.array([row['transaction_date'] for row in rows], dtype='datetime64[D]')
+        self.amounts = np.fromiter((float(row['amount']) for row in rows), dtype=np.float64, count=self.size)
+        self.descriptions = [row['description'] for row in rows]
+        # Dimensiones como códigos enteros (índices en merchant_names, etc.)
+        self.merchant_names, self.merchants = _encode(row['merchant'] or '' for row in rows)
+        self.category_names, self.categories = _encode(row['category_name'] or 'Sin categoría' for row in rows)
+        self.payment_names, self.payments = _encode(row['payment_method'] or '' for row in rows)
+
+    def merchants_known(self) -> np.ndarray:
+        """True para las transacciones con comercio"""
+        empty = self.merchant_names.index('') if '' in self.merchant_names else -1
+        return self.merchants != empty
+
+    @classmethod
+    def load(cls, start_date: Optional[date] = None, end_date: Optional[date] = None) -> "History":
+        """Carga el historial (o un rango de fechas) con una consulta"""
+        conn = get_db_connection()
+        if not conn:
+            return cls([])
+        try:
+            with conn.cursor() as cursor:
+                conditions = []
+                params = []
+                if start_date:
+                    conditions.append("t.transaction_date >= %s")
+                    params.append(start_date)
+                if end_date:
+                    conditions.append("t.transaction_date <= %s")
+                    params.append(end_date)
+                where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+                cursor.execute(f"""
+                    SELECT t.id, t.transaction_date, t.amount, t.description, t.merchant,
+                           t.payment_method, c.name AS category_name
+                    FROM transactions t
+                    LEFT JOIN categories c ON t.category_id = c.id
+                    {where_clause}
+                    ORDER BY t.transaction_date, t.id
+                """, params)
+                return cls(cursor.fetchall())
+        finally:
+            conn.close()
+
+
+def _encode(values):
+    """(nombres únicos, código de cada valor)"""
+    names, codes = np.unique(np.array(list(values), dtype=object), return_inverse=True)
+    return names.tolist(), codes.astype(np.int64)
+
+
+def _group_medians(values: np.ndarray, groups: np.ndarray, group_count: int):
+    """Mediana y tamaño de values por grupo (grupos vacíos: mediana NaN)"""
+    order = np.lexsort((values, groups))
+    ordered = values[order]
+    sizes = np.bincount(groups, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    medians = np.full(group_count, np.nan)
+    present = sizes > 0
+    low = starts[present] + (sizes[present] - 1) // 2
+    high = starts[present] + sizes[present] // 2
+    medians[present] = (ordered[low] + ordered[high]) / 2
+    return medians, sizes
+
+
+def _robust_scores(values: np.ndarray, groups: np.ndarray, group_count: int):
+    """z-score robusto de cada valor dentro de su grupo, con la mediana del grupo y su tamaño"""
+    medians, sizes = _group_medians(values, groups, group_count)
+    deviations = np.abs(values - medians[groups])
+    mads, _ = _group_medians(deviations, groups, group_count)
+    # Con MAD 0 (la mayoría de los montos iguales) se usa la desviación media absoluta
+    mean_deviations = np.bincount(groups, weights=deviations, minlength=group_count) / np.maximum(sizes, 1)
+    spread = np.where(mads > 0, mads / _MAD_SCALE, mean_deviations * 1.2533)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = (values - medians[groups]) / spread[groups]
+    scores[~np.isfinite(scores)] = 0.0
+    return scores, medians, sizes
+
+
+def detect_anomalies(history: History, threshold: float = ANOMALY_THRESHOLD) -> List[Dict]:
+    """Gastos muy por sobre lo típico de su comercio (o de su categoría si el comercio tiene pocos datos)"""
+    if history.size == 0:
+        return []
+    merchant_scores, merchant_medians, merchant_sizes = _robust_scores(
+        history.amounts, history.merchants, len(history.merchant_names)
+    )
+    category_scores, category_medians, category_sizes = _robust_scores(
+        history.amounts, history.categories, len(history.category_names)
+    )
+    by_merchant = (merchant_sizes[history.merchants] >= MIN_GROUP_SIZE) & history.merchants_known()
+    by_category = ~by_merchant & (category_sizes[history.categories] >= MIN_GROUP_SIZE)
+    scores = np.where(by_merchant, merchant_scores, np.where(by_category, category_scores, 0.0))
+    typical = np.where(by_merchant, merchant_medians[history.merchants], category_medians[history.categories])
+
+    flagged = np.flatnonzero(scores > threshold)
+    flagged = flagged[np.argsort(-scores[flagged])][:MAX_RESULTS]
+    return [
+        {
+            'transaction_id': int(history.ids[i]),
+            'transaction_date': str(history.dates[i]),
+            'description': history.descriptions[i],
+            'merchant': history.merchant_names[history.merchants[i]] or None,
+            'category': history.category_names[history.categories[i]],
+            'amount': round(float(history.amounts[i]), 2),
+            'typical_amount': round(float(typical[i]), 2),
+            'score': round(float(scores[i]), 2),
+            'compared_with': 'merchant' if by_merchant[i] else 'category',
+        }
+        for i in flagged
+    ]
+
+
+def _period_name(days: float) -> Optional[str]:
+    for name, (low, high) in PERIODS.items():
+        if low <= days <= high:
+            return name
+    return None
+
+
+def detect_recurring(history: History) -> List[Dict]:
+    """
+    Cobros recurrentes: mismo comercio, monto similar (dentro de la tolerancia) e
+    intervalos regulares que calzan con un período conocido.
+    """
+    known = np.flatnonzero(history.merchants_known() & (history.amounts > 0))
+    if known.size < RECURRING_MIN_OCCURRENCES:
+        return []
+    amounts = history.amounts[known]
+    days = history.dates[known].astype(np.int64)
+    # Montos dentro de la tolerancia caen en el mismo tramo logarítmico
+    amount_bands = np.round(np.log(amounts) / np.log1p(RECURRING_AMOUNT_TOLERANCE)).astype(np.int64)
+    _, groups = np.unique(
+        np.stack((history.merchants[known], amount_bands), axis=1), axis=0, return_inverse=True
+    )
+    groups = groups.reshape(-1)
+    group_count = int(groups.max()) + 1
+
+    order = np.lexsort((days, groups))
+    groups, days, amounts, rows = groups[order], days[order], amounts[order], known[order]
+
+    # Intervalos entre cobros consecutivos del mismo grupo
+    same_group = groups[1:] == groups[:-1]
+    interval_groups = groups[1:][same_group]
+    intervals = (days[1:] - days[:-1])[same_group].astype(np.float64)
+    if intervals.size == 0:
+        return []
+    median_intervals, interval_counts = _group_medians(intervals, interval_groups, group_count)
+    jitter, _ = _group_medians(
+        np.abs(intervals - median_intervals[interval_groups]), interval_groups, group_count
+    )
+    median_amounts, sizes = _group_medians(amounts, groups, group_count)
+    last_positions = np.cumsum(sizes) - 1
+
+    candidates = np.flatnonzero(
+        (sizes >= RECURRING_MIN_OCCURRENCES)
+        & (median_intervals > 0)
+        & (jitter <= RECURRING_MAX_JITTER * median_intervals)
+    )
+    recurring = []
+    for group in candidates:
+        period = _period_name(median_intervals[group])
+        if period is None:
+            continue
+        last = last_positions[group]
+        last_day = np.datetime64(int(days[last]), 'D')
+        recurring.append({
+            'merchant': history.merchant_names[history.merchants[rows[last]]],
+            'amount': round(float(median_amounts[group]), 2),
+            'period': period,
+            'period_days': round(float(median_intervals[group]), 1),
+            'occurrences': int(sizes[group]),
+            'last_date': str(last_day),
+            'next_expected': str(last_day + int(round(median_intervals[group]))),
+            'monthly_cost': round(float(median_amounts[group]) * DAYS_PER_MONTH / float(median_intervals[group]), 2),
+        })
+    recurring.sort(key=lambda r: r['monthly_cost'], reverse=True)
+    return recurring[:MAX_RESULTS]
+
+
+def month_over_month(history: History) -> Dict:
+    """Totales por mes, uso de crédito por mes y variación del último mes por categoría"""
+    if history.size == 0:
+        return {'months': [], 'totals': [], 'credit_share': [], 'by_category': []}
+    months = history.dates.astype('datetime64[M]')
+    first = months.min()
+    month_index = (months - first).astype(np.int64)
+    month_count = int(month_index.max()) + 1
+    labels = [str(first + i) for i in range(month_count)]
+
+    totals = np.bincount(month_index, weights=history.amounts, minlength=month_count)
+    credit_code = history.payment_names.index('credit') if 'credit' in history.payment_names else -1
+    credit = np.bincount(
+        month_index, weights=history.amounts * (history.payments == credit_code), minlength=month_count
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        credit_share = np.where(totals > 0, credit / totals * 100, 0.0)
+
+    # Matriz categoría × mes en una pasada
+    category_count = len(history.category_names)
+    matrix = np.bincount(
+        history.categories * month_count + month_index, weights=history.amounts,
+        minlength=category_count * month_count
+    ).reshape(category_count, month_count)
+
+    by_category = []
+    if month_count >= 2:
+        current, previous = matrix[:, -1], matrix[:, -2]
+        deltas = current - previous
+        for i in np.argsort(-np.abs(deltas)):
+            if current[i] == 0 and previous[i] == 0:
+                continue
+            by_category.append({
+                'category': history.category_names[i],
+                'current': round(float(current[i]), 2),
+                'previous': round(float(previous[i]), 2),
+                'delta': round(float(deltas[i]), 2),
+                'delta_pct': round(float(deltas[i] / previous[i] * 100), 1) if previous[i] else None,
+            })
+
+    return {
+        'months': labels,
+        'totals': [round(float(v), 2) for v in totals],
+        'credit_share': [round(float(v), 1) for v in credit_share],
+        'by_category': by_category[:MAX_RESULTS],
+    }
+
+
+def get_insights(start_date: Optional[date] = None, end_date: Optional[date] = None) -> Dict:
+    """Carga el historial una vez y corre todos los análisis"""
+    history = History.load(start_date, end_date)
+    return {
+        'transactions_analyzed': history.size,
+        'anomalies': detect_anomalies(history),
+        'recurring': detect_recurring(history),
+        'month_over_month': month_over_month(history),
+    }
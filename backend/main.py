@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import test_db_connection
+from database import test_db_connection, get_pool_metrics
+from cache import response_cache
 import os
 import logging
 
@@ -12,12 +13,14 @@ app = FastAPI(title="Bankountable API", version="0.2.0")
 
 # Intentar importar routers con manejo de errores
 try:
-    from routers import transactions, stats, categories, tags, imports
+    from routers import transactions, stats, categories, tags, imports, insights, budgets
     app.include_router(transactions.router)
     app.include_router(stats.router)
     app.include_router(categories.router)
     app.include_router(tags.router)
     app.include_router(imports.router)
+    app.include_router(insights.router)
+    app.include_router(budgets.router)
     logger.info("Todos los routers cargados correctamente")
 except Exception as e:
     logger.error(f"Error al cargar routers: {e}", exc_info=True)
@@ -30,6 +33,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
 )
 
 # Incluir routers
@@ -38,16 +42,37 @@ app.include_router(stats.router)
 app.include_router(categories.router)
 app.include_router(tags.router)
 app.include_router(imports.router)
+app.include_router(insights.router)
+app.include_router(budgets.router)
+
+
+@app.on_event("startup")
+def start_import_queue():
+    """Re-encola los imports pendientes que quedaron de una ejecución anterior"""
+    try:
+        from import_jobs import import_queue
+        import_queue.recover_pending()
+    except Exception as e:
+        logger.error(f"No se pudieron recuperar imports pendientes: {e}")
+
+
+@app.on_event("shutdown")
+def stop_import_queue():
+    """Espera a que terminen los jobs de importación en curso"""
+    from import_jobs import import_queue
+    import_queue.shutdown(wait=True)
 
 
 @app.get("/health")
-async def health_check():
+def health_check():
     """Health check endpoint"""
     db_status = test_db_connection()
     return {
         "status": "ok",
         "message": "Bankountable API is running",
-        "database": "connected" if db_status else "disconnected"
+        "database": "connected" if db_status else "disconnected",
+        "db_pool": get_pool_metrics(),
+        "cache": response_cache.metrics()
     }
 
 
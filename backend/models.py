@@ -32,6 +32,27 @@ class TransactionResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class RecategorizeRequest(BaseModel):
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    include_auto: bool = True  # También re-evaluar las categorizadas automáticamente
+    dry_run: bool = False
+
+class BulkTagRequest(BaseModel):
+    transaction_ids: List[int]
+    add: List[str] = []  # Tags a agregar (se crean si no existen)
+    remove: List[str] = []  # Tags a quitar
+
+class BudgetCreate(BaseModel):
+    category_id: Optional[int] = None  # None: todo el gasto
+    period: str = 'monthly'  # 'weekly', 'monthly' o 'yearly'
+    amount_limit: float
+    alert_threshold: float = 80  # % del monto desde el que se avisa
+
+class BudgetUpdate(BaseModel):
+    amount_limit: Optional[float] = None
+    alert_threshold: Optional[float] = None
+
 class CategoryResponse(BaseModel):
     id: int
     name: str
@@ -57,6 +78,8 @@ class StatsResponse(BaseModel):
     by_category: dict
     by_merchant: dict
     by_payment_method: dict
+    by_account: Optional[dict] = None
+    by_tag: Optional[dict] = None
     top_categories: List[dict]
     top_merchants: List[dict]
     credit_usage: float
@@ -66,6 +89,7 @@ class ImportResponse(BaseModel):
     filename: str
     status: str
     transactions_count: int
+    duplicates_count: int = 0
     imported_at: datetime
     error_message: Optional[str] = None
 
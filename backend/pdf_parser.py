@@ -1,184 +1,561 @@
 """Parser para cartolas bancarias en formato PDF"""
+import io
 import os
 import re
-from datetime import datetime
-from typing import List, Dict, Optional
+import time
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple, Union, BinaryIO
 import pdfplumber
 from PyPDF2 import PdfReader
-from pdfminer.pdfdocument import PDFPasswordIncorrect
+from pdfminer.pdfdocument import PDFDocument, PDFPasswordIncorrect
+from pdfminer.pdfparser import PDFParser as PDFMinerParser
+from pdfminer.pdftypes import int_value, resolve1
+from pdfminer.psparser import literal_name
 import logging
+from rules import get_rule_engine
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Número de procesos para extraer páginas en paralelo (1 = secuencial)
+PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", min(4, os.cpu_count() or 1)))
+# Bajo este número de páginas no compensa el costo de repartir entre procesos
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARSE_PARALLEL_MIN_PAGES", 4))
+
+# Máximo de huellas de encriptación recordadas por proceso
+PASSWORD_CACHE_SIZE = 1000
+
+# Un PDF se puede parsear desde su ruta o desde su contenido en memoria
+PDFSource = Union[str, os.PathLike, bytes, bytearray]
+
+# Máximo de fechas y montos ya parseados que se recuerdan por proceso
+PARSE_CACHE_SIZE = 4096
+
+# Patrones del parsing por fila, compilados una sola vez
+# Monto CLP con puntos de miles: 1.234, 12.345, 123.456
+_clp_thousands_pattern = re.compile(r'\d{1,3}(?:\.\d{3})+')
+# Montos CLP dentro de una línea: $123.456, -123.456,78
+# (el primero incluye el símbolo y los espacios previos para quitarlos de la descripción;
+# el segundo entrega los mismos montos sin probar un prefijo opcional en cada posición)
+_clp_amount_pattern = re.compile(r'[\$]?\s*([-]?\d{1,3}(?:\.\d{3})+(?:,\d+)?)')
+_clp_amount_value_pattern = re.compile(r'-?\d{1,3}(?:\.\d{3})+(?:,\d+)?')
+# Fecha dentro de una línea: DD/MM/YYYY o DD-MM-YY
+_line_date_pattern = re.compile(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})')
+# Fecha de una celda: DD/MM/YYYY (o DD-MM-YY) o YYYY/MM/DD, en una sola regex
+_cell_date_pattern = re.compile(r'(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})|(\d{4})[/-](\d{1,2})[/-](\d{1,2})')
+# Línea FECHA DESCRIPCIÓN MONTO del formato alternativo
+_alternative_line_pattern = re.compile(
+    r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+(.+?)\s+([\$]?\s*[-]?\d{1,3}(?:\.\d{3})*(?:,\d+)?)', re.MULTILINE
+)
+# Símbolos de moneda y espacios dentro de un monto
+_currency_pattern = re.compile(r'\$|CLP|CL| ')
+# Palabras de una celda de encabezado y de una fila de encabezado/totales repetida
+_header_cell_pattern = re.compile(r'fecha|descripcion|monto|importe')
+_header_row_pattern = re.compile(r'fecha|descripcion|monto|importe|saldo|total')
+# Caracteres que se ignoran al decidir si una descripción es solo números
+_description_noise_pattern = re.compile(r'[.,\- $]')
+_strip_currency_spaces = str.maketrans('', '', '$ ')
+_strip_currency_spaces_commas = str.maketrans('', '', '$ ,')
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_cell_date(date_str: str) -> Optional[date]:
+    """Primera fecha válida (DD/MM/YYYY, DD/MM/YY o YYYY/MM/DD) de una celda"""
+    for match in _cell_date_pattern.finditer(date_str):
+        try:
+            if match.group(1):
+                day, month, year = int(match.group(1)), int(match.group(2)), int(match.group(3))
+                if len(match.group(3)) < 4 and year < 100:
+                    year += 2000
+            else:
+                year, month, day = int(match.group(4)), int(match.group(5)), int(match.group(6))
+            if 1 <= month <= 12 and 1 <= day <= 31 and 2000 <= year <= 2100:
+                return datetime(year, month, day).date()
+        except ValueError:
+            continue
+    return None
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_line_date(date_str: str) -> Optional[date]:
+    """Fecha DD/MM/YYYY o DD-MM-YY encontrada en una línea de texto (None si no es válida)"""
+    parts = date_str.split('/') if '/' in date_str else date_str.split('-')
+    if len(parts) != 3:
+        return None
+    day, month, year = int(parts[0]), int(parts[1]), int(parts[2])
+    if year < 100:
+        year += 2000
+    try:
+        return datetime(year, month, day).date()
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_clp_amount(amount_str: str) -> Optional[float]:
+    """Monto CLP (con puntos de miles) mayor o igual a $1.000; None si no lo es"""
+    # Remover símbolos de moneda y espacios
+    amount_str = _currency_pattern.sub('', amount_str.strip()).strip()
+    
+    # Un monto CLP válido DEBE tener puntos como separadores de miles (ej: 1.234, 12.345, 123.456)
+    # Esto evita que números pequeños (como "21", "10", "202", "5", "1") sean interpretados como montos
+    if not _clp_thousands_pattern.search(amount_str):
+        return None
+    
+    # Formato CLP: 123.456,78 o 123.456
+    if ',' in amount_str and '.' in amount_str:
+        # Tiene decimales: 123.456,78
+        amount_str = amount_str.replace('.', '').replace(',', '.')
+    elif '.' in amount_str:
+        parts = amount_str.split('.')
+        if len(parts) == 2 and len(parts[1]) <= 2:
+            # Probablemente es decimal: 123.45
+            amount_str = amount_str.replace(',', '')
+        else:
+            # Probablemente es separador de miles: 123.456
+            amount_str = amount_str.replace('.', '').replace(',', '.')
+    else:
+        # Solo tiene coma, probablemente es decimal
+        amount_str = amount_str.replace(',', '.')
+    
+    try:
+        amount = float(amount_str)
+    except ValueError:
+        return None
+    # Montos muy pequeños probablemente son parte de fechas o texto
+    return amount if amount >= 1000 else None
+
+
+def clear_parse_caches():
+    """Vacía las cachés de fechas y montos parseados"""
+    _parse_cell_date.cache_clear()
+    _parse_line_date.cache_clear()
+    _parse_clp_amount.cache_clear()
+
+_page_executor: Optional[ProcessPoolExecutor] = None
+_page_executor_lock = threading.Lock()
+
+
+def _get_page_executor(workers: int) -> ProcessPoolExecutor:
+    """Pool de procesos compartido para la extracción de páginas"""
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is None:
+            _page_executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _page_executor
+
+
+def _as_stream(source: PDFSource):
+    """pdfplumber y PyPDF2 aceptan rutas o streams; los bytes se envuelven en un stream nuevo por apertura"""
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+
+def _open_binary(source: PDFSource) -> BinaryIO:
+    """Abre la fuente como archivo binario (el llamador la cierra)"""
+    stream = _as_stream(source)
+    return open(stream, "rb") if isinstance(stream, (str, os.PathLike)) else stream
+
+
+def _describe(source: PDFSource) -> str:
+    """Descripción de la fuente para logs"""
+    if isinstance(source, (bytes, bytearray)):
+        return f"<en memoria, {len(source)} bytes>"
+    return str(source)
+
+
+@contextmanager
+def _phase(timings: Optional[Dict[str, float]], name: str):
+    """Suma a timings[name] los segundos del bloque (no hace nada si timings es None)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+def _extract_page(page, timings: Optional[Dict[str, float]] = None) -> Tuple[List, Optional[str]]:
+    """Extrae tablas y texto de una página en una sola pasada"""
+    try:
+        with _phase(timings, "tables"):
+            tables = page.extract_tables()
+        with _phase(timings, "text"):
+            text = page.extract_text()
+        return tables, text
+    finally:
+        # Liberar los objetos de layout de la página ya procesada
+        page.flush_cache()
+
+
+def _extract_page_range(source: PDFSource, password: Optional[str], start: int, end: int) -> List[Tuple[List, Optional[str]]]:
+    """Worker: abre el PDF y extrae las páginas [start, end)"""
+    with pdfplumber.open(_as_stream(source), password=password) as pdf:
+        return [_extract_page(page) for page in pdf.pages[start:end]]
+
+
+class _EncryptionProbe(PDFDocument):
+    """Lee xref, trailer y /Encrypt de un PDF sin autenticar ninguna contraseña"""
+    
+    def _initialize_password(self, password: str = "") -> None:
+        pass
+
+
 class PDFParser:
     """Parser para extraer transacciones de cartolas bancarias PDF"""
     
-    def __init__(self):
+    # Subir cuando cambie el resultado del parsing: invalida la caché de cartolas parseadas
+    VERSION = "2"
+    
+    # Huella de encriptación (emisor o documento) -> contraseña que funcionó, compartida por el proceso
+    _password_cache: Dict[str, str] = {}
+    _password_cache_lock = threading.Lock()
+    _last_password: Optional[str] = None
+    
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers if workers is not None else PARSE_WORKERS
         # Cargar contraseñas desde variables de entorno
         pwd1 = os.getenv("PDF_PASSWORD_1", "0647")
         pwd2 = os.getenv("PDF_PASSWORD_2", "198306479")
         self.passwords = [pwd for pwd in [pwd1, pwd2] if pwd]  # Solo agregar si no están vacías
         logger.info(f"Contraseñas configuradas: {len(self.passwords)} contraseñas disponibles")
     
-    def parse_pdf(self, file_path: str) -> List[Dict]:
+    def parse_pdf(
+        self,
+        source: PDFSource,
+        classify: bool = True,
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[Dict]:
         """
         Parsea un archivo PDF y extrae las transacciones
         
+        Args:
+            source: ruta del archivo o su contenido en memoria (bytes)
+            classify: completar merchant y payment_method con el motor de reglas;
+                      con False quedan en None (para guardar el resultado independiente de las reglas)
+            timings: si se indica, se le suman los segundos de cada fase: open, tables y text
+                     (extracción secuencial) o extract (en paralelo), parse, dedupe y classify
+        
         Returns:
             Lista de diccionarios con las transacciones encontradas
         """
         transactions = []
         
         try:
-            # Intentar abrir el PDF con pdfplumber
-            pdf = None
-            last_error = None
+            with _phase(timings, "open"):
+                pdf, password = self._open_pdf(source)
             
-            # Primero intentar sin contraseña
+            # Extraer tablas y texto de cada página en una sola pasada (en paralelo si el PDF es grande)
             try:
-                pdf = pdfplumber.open(file_path)
-                logger.info("PDF abierto exitosamente sin contraseña")
-            except PDFPasswordIncorrect:
-                # PDF requiere contraseña
-                logger.debug("PDF requiere contraseña, intentando con contraseñas disponibles...")
-                last_error = None
-            except Exception as e:
-                last_error = e
-                error_str = str(e).lower()
-                # Si el error no es de contraseña, relanzar
-                if "password" not in error_str and "encrypted" not in error_str and "decrypt" not in error_str:
-                    logger.error(f"Error al abrir PDF (no es de contraseña): {e}")
-                    raise
-                logger.debug(f"PDF requiere contraseña, intentando con contraseñas disponibles...")
-            
-            # Si no se pudo abrir sin contraseña, intentar con cada contraseña
-            if pdf is None:
-                for password in self.passwords:
-                    try:
-                        pdf = pdfplumber.open(file_path, password=password)
-                        logger.info(f"PDF abierto exitosamente con contraseña: {password}")
-                        break
-                    except PDFPasswordIncorrect:
-                        # Esta contraseña no es correcta, intentar siguiente
-                        logger.debug(f"Contraseña '{password}' incorrecta, intentando siguiente...")
-                        last_error = PDFPasswordIncorrect("Contraseña incorrecta")
-                        continue
-                    except Exception as e:
-                        last_error = e
-                        error_str = str(e).lower()
-                        # Si el error no es de contraseña, relanzar
-                        if "password" not in error_str and "encrypted" not in error_str and "decrypt" not in error_str:
-                            logger.error(f"Error al abrir PDF con contraseña '{password}' (no es de contraseña): {e}")
-                            raise
-                        logger.debug(f"Contraseña '{password}' incorrecta, intentando siguiente...")
-                        continue
+                pages = self._extract_pages(pdf, source, password, timings)
+            finally:
+                pdf.close()
             
-            # Si aún no se pudo abrir, intentar con PyPDF2 primero para desbloquear
-            if pdf is None:
-                logger.info("Intentando desbloquear PDF con PyPDF2...")
-                try:
-                    reader = PdfReader(file_path)
-                    if reader.is_encrypted:
-                        # Intentar desbloquear con cada contraseña disponible
-                        decrypted = False
-                        correct_password = None
-                        for pwd in self.passwords:
-                            try:
-                                result = reader.decrypt(pwd)
-                                # decrypt() devuelve 0 (falló), 1 (user password) o 2 (owner password)
-                                if result in [1, 2]:
-                                    correct_password = pwd
-                                    decrypted = True
-                                    logger.info(f"PDF desbloqueado con PyPDF2 usando contraseña: {pwd} (resultado: {result})")
-                                    break
-                                else:
-                                    logger.debug(f"Contraseña '{pwd}' no desbloqueó el PDF (resultado: {result})")
-                            except Exception as e:
-                                logger.debug(f"Error al desbloquear con contraseña '{pwd}': {e}")
-                                continue
-                        
-                        if not decrypted:
-                            raise Exception("No se pudo desbloquear el PDF con ninguna contraseña disponible")
-                        
-                        # Si se desbloqueó exitosamente, intentar abrir con pdfplumber
-                        pdf = pdfplumber.open(file_path, password=correct_password)
-                        logger.info(f"PDF abierto con pdfplumber usando contraseña: {correct_password}")
-                    else:
-                        # No está encriptado, intentar abrir directamente
-                        pdf = pdfplumber.open(file_path)
-                        logger.info("PDF no está encriptado, abierto con pdfplumber")
-                except Exception as e:
-                    last_error = e
-                    logger.error(f"Error al desbloquear PDF con PyPDF2: {e}")
-                    # Continuar para que se lance el error final si no se pudo abrir
-            
-            if pdf is None:
-                error_msg = f"No se pudo abrir el PDF con ninguna contraseña. Último error: {str(last_error)}"
-                logger.error(error_msg)
-                raise Exception(error_msg)
-            
-            # Intentar extraer tablas primero (más preciso)
-            transactions = []
-            
-            for page in pdf.pages:
-                # Intentar extraer tablas
-                tables = page.extract_tables()
-                if tables:
+            with _phase(timings, "parse"):
+                # Intentar con tablas primero (más preciso)
+                transactions = []
+                for tables, _ in pages:
                     for table in tables:
                         table_transactions = self._parse_table(table)
                         transactions.extend(table_transactions)
-            
-            # Si no se encontraron transacciones en tablas, usar extracción de texto
-            if not transactions:
-                full_text = ""
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if text:
-                        full_text += text + "\n"
                 
-                text_transactions = self._parse_transactions_from_text(full_text)
-                transactions.extend(text_transactions)
-            
-            pdf.close()
-            
-            # DEDUPLICACIÓN FINAL: Para cada (fecha, descripción), mantener solo la transacción con el monto mayor
-            # Esto evita que se guarden múltiples transacciones para el mismo gasto
-            final_transactions = []
-            tx_by_key = {}  # (fecha, descripción) -> transacción con mayor monto
+                # Si no se encontraron transacciones en tablas, usar extracción de texto
+                if not transactions:
+                    full_text = "".join(text + "\n" for _, text in pages if text)
+                    
+                    text_transactions = self._parse_transactions_from_text(full_text)
+                    transactions.extend(text_transactions)
             
-            for tx in transactions:
-                # Normalizar descripción para comparación
-                desc_normalized = tx.get('description', '').lower().strip()[:100]
-                tx_key = (
-                    str(tx.get('transaction_date')),
-                    desc_normalized
-                )
+            with _phase(timings, "dedupe"):
+                # DEDUPLICACIÓN FINAL: Para cada (fecha, descripción), mantener solo la transacción con el monto mayor
+                # Esto evita que se guarden múltiples transacciones para el mismo gasto
+                final_transactions = []
+                tx_by_key = {}  # (fecha, descripción) -> transacción con mayor monto
                 
-                if tx_key not in tx_by_key:
-                    # Primera vez que vemos esta transacción
-                    tx_by_key[tx_key] = tx
-                else:
-                    # Ya existe una transacción con esta fecha y descripción
-                    # Mantener la que tenga el monto mayor
-                    existing_amount = tx_by_key[tx_key].get('amount', 0)
-                    current_amount = tx.get('amount', 0)
-                    
-                    if current_amount > existing_amount:
-                        # Este monto es mayor, reemplazar
+                for tx in transactions:
+                    # Normalizar descripción para comparación
+                    desc_normalized = tx.get('description', '').lower().strip()[:100]
+                    tx_key = (
+                        str(tx.get('transaction_date')),
+                        desc_normalized
+                    )
+                
+                    if tx_key not in tx_by_key:
+                        # Primera vez que vemos esta transacción
                         tx_by_key[tx_key] = tx
-                        logger.debug(f"Reemplazando transacción {tx_key} con monto mayor: {current_amount} > {existing_amount}")
+                    else:
+                        # Ya existe una transacción con esta fecha y descripción
+                        # Mantener la que tenga el monto mayor
+                        existing_amount = tx_by_key[tx_key].get('amount', 0)
+                        current_amount = tx.get('amount', 0)
+                        
+                        if current_amount > existing_amount:
+                            # Este monto es mayor, reemplazar
+                            tx_by_key[tx_key] = tx
+                            logger.debug(f"Reemplazando transacción {tx_key} con monto mayor: {current_amount} > {existing_amount}")
+                
+                final_transactions = list(tx_by_key.values())
             
-            final_transactions = list(tx_by_key.values())
+            # Comercio y método de pago de todo el lote en una llamada
+            if classify:
+                with _phase(timings, "classify"):
+                    get_rule_engine().classify_transactions(final_transactions)
             
             logger.info(f"Se encontraron {len(transactions)} transacciones en el PDF, {len(final_transactions)} después de deduplicación")
             
         except Exception as e:
-            logger.error(f"Error al parsear PDF {file_path}: {e}")
+            logger.error(f"Error al parsear PDF {_describe(source)}: {e}")
             raise
         
         return final_transactions
     
+    def _open_pdf(self, source: PDFSource):
+        """
+        Abre el PDF intentando primero con la última contraseña que funcionó (también abre PDFs
+        sin encriptar). Si falla, lee el diccionario /Encrypt una sola vez y verifica las
+        contraseñas candidatas contra él antes de volver a abrir.
+        
+        Returns:
+            Tupla (pdf abierto con pdfplumber, contraseña usada o None)
+        """
+        guess = PDFParser._last_password
+        try:
+            pdf = pdfplumber.open(_as_stream(source), password=guess or "")
+            password = guess if pdf.doc.encryption else None
+            if pdf.doc.encryption:
+                self._remember_password(self._encryption_fingerprints(pdf.doc.encryption), password)
+            logger.info("PDF abierto al primer intento")
+            return pdf, password
+        except PDFPasswordIncorrect:
+            pass
+        except Exception as e:
+            error_str = str(e).lower()
+            # Si el error no es de contraseña, relanzar
+            if "password" not in error_str and "encrypted" not in error_str and "decrypt" not in error_str:
+                logger.error(f"Error al abrir PDF (no es de contraseña): {e}")
+                raise
+        
+        resolved, password = self._resolve_password(source)
+        if not resolved:
+            # Encriptación no estándar u otro problema: probar abriendo con cada contraseña
+            return self._open_pdf_by_trial(source)
+        return pdfplumber.open(_as_stream(source), password=password), password
+    
+    def _resolve_password(self, source: PDFSource) -> Tuple[bool, Optional[str]]:
+        """
+        Lee el diccionario /Encrypt una sola vez y verifica las contraseñas candidatas contra él,
+        empezando por las que ya funcionaron para la misma huella (emisor o ID de documento).
+        
+        Returns:
+            (True, contraseña) si se encontró, (False, None) si no se pudo leer la encriptación
+        
+        Raises:
+            Exception si ninguna contraseña desbloquea el PDF
+        """
+        try:
+            with _open_binary(source) as f:
+                probe = _EncryptionProbe(PDFMinerParser(f))
+                encryption = probe.encryption
+                if encryption is None:
+                    return False, None
+                docid, param = encryption
+                if literal_name(param.get("Filter")) != "Standard":
+                    return False, None
+                handler_factory = probe.security_handler_registry.get(int_value(param.get("V", 0)))
+                if handler_factory is None:
+                    return False, None
+        except Exception as e:
+            logger.debug(f"No se pudo leer la encriptación del PDF: {e}")
+            return False, None
+        
+        fingerprints = self._encryption_fingerprints(encryption)
+        with PDFParser._password_cache_lock:
+            remembered = [PDFParser._password_cache[fp] for fp in fingerprints if fp in PDFParser._password_cache]
+        
+        # Las recordadas primero; luego la vacía (PDFs con solo contraseña de propietario) y las configuradas
+        for password in dict.fromkeys([*remembered, "", *self.passwords]):
+            try:
+                handler_factory(docid, param, password)
+            except PDFPasswordIncorrect:
+                continue
+            except Exception as e:
+                logger.debug(f"Error al verificar contraseña: {e}")
+                return False, None
+            self._remember_password(fingerprints, password)
+            logger.info("PDF desbloqueado" + (" con contraseña recordada" if password in remembered else ""))
+            return True, password
+        
+        raise Exception("No se pudo desbloquear el PDF con ninguna contraseña disponible")
+    
+    @staticmethod
+    def _encryption_fingerprints(encryption) -> List[str]:
+        """
+        Huellas para recordar la contraseña de un PDF a partir de (ID, /Encrypt):
+        - emisor: parámetros de /Encrypt incluyendo /O, que depende solo de las contraseñas
+          (las cartolas de un mismo banco lo comparten)
+        - documento: primer elemento de /ID en el trailer
+        """
+        docid, param = encryption
+        issuer = hashlib.sha1(repr(
+            [resolve1(param.get(key)) for key in ("Filter", "V", "R", "Length", "P", "O")]
+        ).encode()).hexdigest()
+        fingerprints = [f"issuer:{issuer}"]
+        document_id = resolve1(docid[0]) if docid else None
+        if isinstance(document_id, bytes) and document_id:
+            fingerprints.append(f"doc:{document_id.hex()}")
+        return fingerprints
+    
+    @staticmethod
+    def _remember_password(fingerprints: List[str], password: Optional[str]):
+        """Recuerda la contraseña para estas huellas y como primera opción del próximo PDF"""
+        with PDFParser._password_cache_lock:
+            if len(PDFParser._password_cache) >= PASSWORD_CACHE_SIZE:
+                PDFParser._password_cache.clear()
+            for fp in fingerprints:
+                PDFParser._password_cache[fp] = password
+            PDFParser._last_password = password
+    
+    def _open_pdf_by_trial(self, source: PDFSource):
+        """
+        Abre el PDF probando sin contraseña y luego con las contraseñas configuradas.
+        
+        Returns:
+            Tupla (pdf abierto con pdfplumber, contraseña usada o None)
+        """
+        # Intentar abrir el PDF con pdfplumber
+        pdf = None
+        used_password = None
+        last_error = None
+        
+        # Primero intentar sin contraseña
+        try:
+            pdf = pdfplumber.open(_as_stream(source))
+            logger.info("PDF abierto exitosamente sin contraseña")
+        except PDFPasswordIncorrect:
+            # PDF requiere contraseña
+            logger.debug("PDF requiere contraseña, intentando con contraseñas disponibles...")
+            last_error = None
+        except Exception as e:
+            last_error = e
+            error_str = str(e).lower()
+            # Si el error no es de contraseña, relanzar
+            if "password" not in error_str and "encrypted" not in error_str and "decrypt" not in error_str:
+                logger.error(f"Error al abrir PDF (no es de contraseña): {e}")
+                raise
+            logger.debug(f"PDF requiere contraseña, intentando con contraseñas disponibles...")
+        
+        # Si no se pudo abrir sin contraseña, intentar con cada contraseña
+        if pdf is None:
+            for password in self.passwords:
+                try:
+                    pdf = pdfplumber.open(_as_stream(source), password=password)
+                    used_password = password
+                    logger.info(f"PDF abierto exitosamente con contraseña: {password}")
+                    break
+                except PDFPasswordIncorrect:
+                    # Esta contraseña no es correcta, intentar siguiente
+                    logger.debug(f"Contraseña '{password}' incorrecta, intentando siguiente...")
+                    last_error = PDFPasswordIncorrect("Contraseña incorrecta")
+                    continue
+                except Exception as e:
+                    last_error = e
+                    error_str = str(e).lower()
+                    # Si el error no es de contraseña, relanzar
+                    if "password" not in error_str and "encrypted" not in error_str and "decrypt" not in error_str:
+                        logger.error(f"Error al abrir PDF con contraseña '{password}' (no es de contraseña): {e}")
+                        raise
+                    logger.debug(f"Contraseña '{password}' incorrecta, intentando siguiente...")
+                    continue
+        
+        # Si aún no se pudo abrir, intentar con PyPDF2 primero para desbloquear
+        if pdf is None:
+            logger.info("Intentando desbloquear PDF con PyPDF2...")
+            try:
+                reader = PdfReader(_as_stream(source))
+                if reader.is_encrypted:
+                    # Intentar desbloquear con cada contraseña disponible
+                    decrypted = False
+                    correct_password = None
+                    for pwd in self.passwords:
+                        try:
+                            result = reader.decrypt(pwd)
+                            # decrypt() devuelve 0 (falló), 1 (user password) o 2 (owner password)
+                            if result in [1, 2]:
+                                correct_password = pwd
+                                decrypted = True
+                                logger.info(f"PDF desbloqueado con PyPDF2 usando contraseña: {pwd} (resultado: {result})")
+                                break
+                            else:
+                                logger.debug(f"Contraseña '{pwd}' no desbloqueó el PDF (resultado: {result})")
+                        except Exception as e:
+                            logger.debug(f"Error al desbloquear con contraseña '{pwd}': {e}")
+                            continue
+                    
+                    if not decrypted:
+                        raise Exception("No se pudo desbloquear el PDF con ninguna contraseña disponible")
+                    
+                    # Si se desbloqueó exitosamente, intentar abrir con pdfplumber
+                    pdf = pdfplumber.open(_as_stream(source), password=correct_password)
+                    used_password = correct_password
+                    logger.info(f"PDF abierto con pdfplumber usando contraseña: {correct_password}")
+                else:
+                    # No está encriptado, intentar abrir directamente
+                    pdf = pdfplumber.open(_as_stream(source))
+                    logger.info("PDF no está encriptado, abierto con pdfplumber")
+            except Exception as e:
+                last_error = e
+                logger.error(f"Error al desbloquear PDF con PyPDF2: {e}")
+                # Continuar para que se lance el error final si no se pudo abrir
+        
+        if pdf is None:
+            error_msg = f"No se pudo abrir el PDF con ninguna contraseña. Último error: {str(last_error)}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        
+        return pdf, used_password
+    
+    def _extract_pages(
+        self,
+        pdf,
+        source: PDFSource,
+        password: Optional[str],
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[Tuple[List, Optional[str]]]:
+        """
+        Extrae (tablas, texto) de cada página, en orden de página.
+        Con suficientes páginas reparte rangos contiguos entre procesos worker
+        (en ese caso timings recibe solo el total, como 'extract').
+        """
+        page_count = len(pdf.pages)
+        workers = min(self.workers, page_count)
+        
+        if workers <= 1 or page_count < PARALLEL_MIN_PAGES:
+            return [_extract_page(page, timings) for page in pdf.pages]
+        
+        chunk = -(-page_count // workers)  # División redondeando hacia arriba
+        executor = _get_page_executor(self.workers)
+        futures = [
+            executor.submit(_extract_page_range, source, password, start, min(start + chunk, page_count))
+            for start in range(0, page_count, chunk)
+        ]
+        
+        # Unir en orden de página para que el resultado sea idéntico al secuencial
+        pages = []
+        with _phase(timings, "extract"):
+            for future in futures:
+                pages.extend(future.result())
+        return pages
+    
     def _parse_table(self, table: List[List]) -> List[Dict]:
         """Parsea una tabla extraída del PDF"""
         transactions = []
@@ -190,7 +567,8 @@ class PDFParser:
         headers = None
         header_row_idx = 0
         for i, row in enumerate(table):
-            if row and any(cell and ('fecha' in str(cell).lower() or 'descripcion' in str(cell).lower() or 'monto' in str(cell).lower() or 'importe' in str(cell).lower()) for cell in row if cell):
+            # Las palabras clave no tienen espacios: buscar en la fila unida equivale a buscar celda por celda
+            if row and _header_cell_pattern.search(' '.join(str(cell) for cell in row if cell).lower()):
                 headers = [str(cell).strip().lower() if cell else '' for cell in row]
                 header_row_idx = i
                 break
@@ -210,7 +588,7 @@ class PDFParser:
                             col_values.append(str(row[col_idx]).strip())
                     
                     # Contar cuántos valores parecen montos CLP válidos (con formato de miles)
-                    monto_like_count = sum(1 for v in col_values if re.search(r'\d{1,3}(?:\.\d{3})+', v.replace('$', '').replace(' ', '')))
+                    monto_like_count = sum(1 for v in col_values if _clp_thousands_pattern.search(v.translate(_strip_currency_spaces)))
                     if monto_like_count > len(col_values) * 0.3:  # Al menos 30% parecen montos
                         potential_monto_cols.append((col_idx, monto_like_count))
                 
@@ -262,6 +640,13 @@ class PDFParser:
         # Procesar filas de datos
         seen_in_table = {}  # Dict: (fecha, descripción) -> monto máximo, para evitar duplicados dentro de la misma tabla
         
+        # Cantidad de columnas necesaria (igual para todas las filas)
+        max_col_idx = max(
+            fecha_idx if fecha_idx is not None else 0,
+            desc_idx if desc_idx is not None else 0,
+            abs(monto_idx) if monto_idx < 0 else (monto_idx if monto_idx is not None else 0)
+        )
+        
         for row in table[header_row_idx + 1:]:
             if not row:
                 continue
@@ -273,15 +658,10 @@ class PDFParser:
             
             # Verificar que no sea un header repetido
             row_text = ' '.join(row_content).lower()
-            if any(keyword in row_text for keyword in ['fecha', 'descripcion', 'monto', 'importe', 'saldo', 'total']):
+            if _header_row_pattern.search(row_text):
                 continue
             
             # Verificar que tengamos suficientes columnas
-            max_col_idx = max(
-                fecha_idx if fecha_idx is not None else 0,
-                desc_idx if desc_idx is not None else 0,
-                abs(monto_idx) if monto_idx < 0 else (monto_idx if monto_idx is not None else 0)
-            )
             if len(row) <= max_col_idx:
                 continue
             
@@ -302,7 +682,7 @@ class PDFParser:
                     continue
                 
                 # Filtrar descripciones que son solo números, símbolos o texto genérico
-                desc_clean = description.replace('.', '').replace(',', '').replace('-', '').replace(' ', '').replace('$', '')
+                desc_clean = _description_noise_pattern.sub('', description)
                 if desc_clean.isdigit() or description.lower() in ['total', 'saldo', 'subtotal', '']:
                     continue
                 
@@ -319,8 +699,7 @@ class PDFParser:
                 
                 # CRÍTICO: Validar que el monto_str realmente parece un monto CLP válido
                 # Debe tener formato de miles con puntos: 1.234, 12.345, 123.456, etc.
-                monto_clean = monto_str.replace('$', '').replace(' ', '').replace(',', '')
-                if not re.search(r'\d{1,3}(?:\.\d{3})+', monto_clean):
+                if not _clp_thousands_pattern.search(monto_str.translate(_strip_currency_spaces_commas)):
                     # Si no tiene formato de monto CLP con puntos de miles, NO es un monto válido
                     # Esto evita que números como "21", "10", "202", "5", "1" sean interpretados como montos
                     continue
@@ -359,9 +738,9 @@ class PDFParser:
                 transaction = {
                     'transaction_date': transaction_date,
                     'description': description[:500],
-                    'merchant': self._extract_merchant(description),
+                    'merchant': None,  # Se completa con el motor de reglas
                     'amount': abs(amount),
-                    'payment_method': self._infer_payment_method(description),
+                    'payment_method': None,
                 }
                 transactions.append(transaction)
                 
@@ -392,84 +771,13 @@ class PDFParser:
         """Parsea una fecha en diferentes formatos"""
         if not date_str:
             return None
-        
-        # Limpiar la fecha
-        date_str = date_str.strip()
-        
-        # Patrones de fecha comunes
-        patterns = [
-            r'(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})',  # DD/MM/YYYY o DD-MM-YYYY
-            r'(\d{4})[/-](\d{1,2})[/-](\d{1,2})',    # YYYY/MM/DD
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, date_str)
-            if match:
-                try:
-                    parts = match.groups()
-                    if len(parts) == 3:
-                        # Determinar formato
-                        if len(parts[2]) == 4:  # YYYY al final
-                            day, month, year = int(parts[0]), int(parts[1]), int(parts[2])
-                        elif len(parts[0]) == 4:  # YYYY al inicio
-                            year, month, day = int(parts[0]), int(parts[1]), int(parts[2])
-                        else:  # Asumir DD/MM/YY
-                            day, month, year = int(parts[0]), int(parts[1]), int(parts[2])
-                            if year < 100:
-                                year += 2000
-                        
-                        if 1 <= month <= 12 and 1 <= day <= 31 and 2000 <= year <= 2100:
-                            return datetime(year, month, day).date()
-                except:
-                    continue
-        
-        return None
+        return _parse_cell_date(date_str.strip())
     
     def _parse_amount(self, amount_str: str) -> Optional[float]:
         """Parsea un monto en formato CLP"""
         if not amount_str:
             return None
-        
-        # Limpiar el monto
-        amount_str = amount_str.strip()
-        
-        # Remover símbolos de moneda
-        amount_str = amount_str.replace('$', '').replace('CLP', '').replace('CL', '').replace(' ', '').strip()
-        
-        # Validar que tenga formato de monto CLP (debe tener puntos como separadores de miles)
-        # Un monto CLP válido DEBE tener puntos como separadores de miles (ej: 1.234, 12.345, 123.456)
-        if not re.search(r'\d{1,3}(?:\.\d{3})+', amount_str):
-            # Si no tiene formato de miles con puntos, NO es un monto CLP válido
-            # Esto evita que números pequeños (como "21", "10", "202", "5", "1") sean interpretados como montos
-            return None
-        
-        # Remover puntos (separadores de miles) y reemplazar coma por punto (decimal)
-        # Formato CLP: 123.456,78 o 123.456
-        if ',' in amount_str and '.' in amount_str:
-            # Tiene decimales: 123.456,78
-            amount_str = amount_str.replace('.', '').replace(',', '.')
-        elif '.' in amount_str:
-            # Verificar si el punto es separador de miles o decimal
-            parts = amount_str.split('.')
-            if len(parts) == 2 and len(parts[1]) <= 2:
-                # Probablemente es decimal: 123.45
-                amount_str = amount_str.replace(',', '')
-            else:
-                # Probablemente es separador de miles: 123.456
-                amount_str = amount_str.replace('.', '').replace(',', '.')
-        else:
-            # Solo tiene coma, probablemente es decimal
-            amount_str = amount_str.replace(',', '.')
-        
-        try:
-            amount = float(amount_str)
-            # Validación adicional: montos muy pequeños probablemente son errores
-            # Solo aceptar montos >= $1.000 para evitar números que son parte de fechas o texto
-            if amount < 1000:
-                return None
-            return amount
-        except:
-            return None
+        return _parse_clp_amount(amount_str)
     
     def _parse_transactions_from_text(self, text: str) -> List[Dict]:
         """
@@ -478,17 +786,8 @@ class PDFParser:
         """
         transactions = []
         
-        # Patrones comunes para transacciones bancarias chilenas
-        # Formato típico: FECHA | DESCRIPCIÓN | MONTO
-        
-        # Buscar líneas que parezcan transacciones
-        # Patrón para fechas: DD/MM/YYYY o DD-MM-YYYY
-        date_pattern = r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
-        
-        # Patrón para montos en CLP: $123.456 o 123.456 o -123.456
-        # NOTA: Este patrón se usa solo para referencia, el parsing real usa clp_amount_pattern más estricto
-        amount_pattern = r'[\$]?\s*([-]?\d{1,3}(?:\.\d{3})*(?:,\d+)?)'
-        
+        # Formato típico de cartolas chilenas: FECHA | DESCRIPCIÓN | MONTO
+        # Se buscan líneas que parezcan transacciones (patrones compilados a nivel de módulo)
         lines = text.split('\n')
         
         current_date = None
@@ -498,30 +797,15 @@ class PDFParser:
                 continue
             
             # Buscar fecha en la línea
-            date_match = re.search(date_pattern, line)
+            date_match = _line_date_pattern.search(line)
             if date_match:
-                try:
-                    date_str = date_match.group(1)
-                    # Normalizar formato de fecha
-                    if '/' in date_str:
-                        parts = date_str.split('/')
-                    else:
-                        parts = date_str.split('-')
-                    
-                    if len(parts) == 3:
-                        day = int(parts[0])
-                        month = int(parts[1])
-                        year = int(parts[2])
-                        if year < 100:
-                            year += 2000
-                        current_date = datetime(year, month, day).date()
-                except:
-                    pass
+                line_date = _parse_line_date(date_match.group(1))
+                if line_date:
+                    current_date = line_date
             
             # Buscar montos en la línea - solo montos con formato CLP válido (con puntos de miles)
             # Patrón estricto: debe tener formato 123.456 o 123.456,78 (con puntos como separadores de miles)
-            clp_amount_pattern = r'[\$]?\s*([-]?\d{1,3}(?:\.\d{3})+(?:,\d+)?)'
-            amount_matches = re.findall(clp_amount_pattern, line)
+            amount_matches = _clp_amount_value_pattern.findall(line) if '.' in line else []
             
             if amount_matches and current_date:
                 # Filtrar montos: solo tomar el que parece más un monto de transacción
@@ -543,20 +827,20 @@ class PDFParser:
                     # Extraer descripción (todo lo que no es fecha ni monto)
                     description = line
                     # Remover fecha
-                    description = re.sub(date_pattern, '', description)
+                    description = _line_date_pattern.sub('', description)
                     # Remover el monto específico que estamos usando
                     description = description.replace(amount_str, '', 1)
                     # Remover otros montos que puedan estar en la línea
-                    description = re.sub(clp_amount_pattern, '', description)
+                    description = _clp_amount_pattern.sub('', description)
                     description = description.strip()
                     
                     if description and len(description) > 3:
                         transaction = {
                             'transaction_date': current_date,
                             'description': description[:500],
-                            'merchant': self._extract_merchant(description),
+                            'merchant': None,  # Se completa con el motor de reglas
                             'amount': amount,
-                            'payment_method': self._infer_payment_method(description),
+                            'payment_method': None,
                         }
                         transactions.append(transaction)
         
@@ -573,31 +857,16 @@ class PDFParser:
         # Buscar tablas o estructuras más complejas
         # Este método puede ser expandido según los PDFs específicos
         
-        # Patrón para líneas con: FECHA DESCRIPCIÓN MONTO
-        pattern = r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+(.+?)\s+([\$]?\s*[-]?\d{1,3}(?:\.\d{3})*(?:,\d+)?)'
-        
-        matches = re.finditer(pattern, text, re.MULTILINE)
-        
-        for match in matches:
+        # Líneas con: FECHA DESCRIPCIÓN MONTO
+        for match in _alternative_line_pattern.finditer(text):
             try:
                 date_str = match.group(1)
                 description = match.group(2).strip()
                 amount_str = match.group(3)
                 
                 # Parsear fecha
-                if '/' in date_str:
-                    parts = date_str.split('/')
-                else:
-                    parts = date_str.split('-')
-                
-                if len(parts) == 3:
-                    day = int(parts[0])
-                    month = int(parts[1])
-                    year = int(parts[2])
-                    if year < 100:
-                        year += 2000
-                    transaction_date = datetime(year, month, day).date()
-                    
+                transaction_date = _parse_line_date(date_str)
+                if transaction_date:
                     # Parsear monto
                     amount_clean = amount_str.replace('$', '').replace('.', '').replace(',', '.').strip()
                     amount = float(amount_clean)
@@ -606,9 +875,9 @@ class PDFParser:
                         transaction = {
                             'transaction_date': transaction_date,
                             'description': description[:500],
-                            'merchant': self._extract_merchant(description),
+                            'merchant': None,  # Se completa con el motor de reglas
                             'amount': abs(amount),
-                            'payment_method': self._infer_payment_method(description),
+                            'payment_method': None,
                         }
                         transactions.append(transaction)
             except Exception as e:
@@ -619,36 +888,10 @@ class PDFParser:
     
     def _extract_merchant(self, description: str) -> Optional[str]:
         """Extrae el nombre del comercio de la descripción"""
-        # Normalizar descripción
-        desc = description.upper()
-        
-        # Comercios conocidos
-        merchants = [
-            'STARBUCKS', 'RAPPI', 'UBER EATS', 'PEDIDOS YA', 'MCDONALDS',
-            'SUBWAY', 'FARMACIA AHUMADA', 'SHELL', 'COPEC', 'LIDER',
-            'JUMBO', 'SANTANDER', 'FALABELLA', 'RIPLEY', 'PARIS'
-        ]
-        
-        for merchant in merchants:
-            if merchant in desc:
-                return merchant.title()
-        
-        # Si no se encuentra, tomar las primeras palabras
-        words = description.split()
-        if len(words) > 0:
-            return words[0][:50]
-        
-        return None
+        return get_rule_engine().classify([description])[0][0]
     
     def _infer_payment_method(self, description: str) -> str:
         """Infiere el método de pago basado en la descripción"""
-        desc = description.upper()
-        
-        if any(word in desc for word in ['TARJETA', 'CREDITO', 'CREDIT', 'VISA', 'MASTERCARD']):
-            return 'credit'
-        elif any(word in desc for word in ['DEBITO', 'DEBIT', 'TRANSFERENCIA']):
-            return 'debit'
-        else:
-            return 'credit'  # Default
+        return get_rule_engine().classify([description])[0][1]
 
 
@@ -0,0 +1,37 @@
+"""
+Recalcula los rollups diarios de estadísticas (tabla daily_rollups) desde transactions
+y, con ellos, el consumo de los presupuestos (tabla budget_usage).
+
+Uso:
+    python rebuild_rollups.py [--start-date AAAA-MM-DD] [--end-date AAAA-MM-DD]
+"""
+import sys
+import argparse
+from datetime import date
+from services import RollupService, BudgetService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start-date", type=date.fromisoformat, help="Primer día a recalcular")
+    parser.add_argument("--end-date", type=date.fromisoformat, help="Último día a recalcular")
+    args = parser.parse_args()
+
+    try:
+        rows = RollupService.rebuild(start_date=args.start_date, end_date=args.end_date)
+    except Exception as e:
+        print(f"❌ Error al recalcular rollups: {e}")
+        return 1
+    print(f"✅ Rollups recalculados ({rows} filas)")
+
+    try:
+        usage = BudgetService.rebuild()
+    except Exception as e:
+        print(f"❌ Error al recalcular el consumo de presupuestos: {e}")
+        return 1
+    print(f"✅ Consumo de presupuestos recalculado ({usage} períodos)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
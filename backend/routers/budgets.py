@@ -0,0 +1,76 @@
+"""Endpoints para presupuestos"""
+from fastapi import APIRouter, Query, HTTPException
+from typing import Optional
+from datetime import date
+from models import BudgetCreate, BudgetUpdate
+from services import BudgetService
+
+router = APIRouter(prefix="/api/budgets", tags=["budgets"])
+
+@router.get("")
+def get_budgets():
+    """Obtiene todos los presupuestos"""
+    try:
+        return BudgetService.get_all()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/status")
+def get_budget_status(on: Optional[date] = Query(None, description="Día cuyo período se consulta (hoy por defecto)")):
+    """Consumo, saldo y estado ('ok', 'warning', 'over') de cada presupuesto en su período actual"""
+    try:
+        return BudgetService.get_status(on)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/alerts")
+def get_budget_alerts(
+    budget_id: Optional[int] = Query(None),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Alertas de presupuesto, de la más reciente a la más antigua"""
+    try:
+        return BudgetService.get_alerts(limit=limit, budget_id=budget_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("")
+def create_budget(budget: BudgetCreate):
+    """Crea un presupuesto y calcula su consumo con las transacciones existentes"""
+    try:
+        budget_id = BudgetService.create(
+            budget.category_id, budget.period, budget.amount_limit, budget.alert_threshold
+        )
+        return {"id": budget_id, **budget.model_dump()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/{budget_id}")
+def update_budget(budget_id: int, updates: BudgetUpdate):
+    """Actualiza el monto o el umbral de aviso de un presupuesto"""
+    try:
+        success = BudgetService.update(budget_id, updates.amount_limit, updates.alert_threshold)
+        if not success:
+            raise HTTPException(status_code=404, detail="Presupuesto no encontrado")
+        return {"success": True}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/{budget_id}")
+def delete_budget(budget_id: int):
+    """Elimina un presupuesto"""
+    try:
+        success = BudgetService.delete(budget_id)
+        if not success:
+            raise HTTPException(status_code=404, detail="Presupuesto no encontrado")
+        return {"success": True}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,22 +1,27 @@
 """Endpoints para categorías"""
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Request, Response
 from typing import Optional
 from models import CategoryResponse
 from services import CategoryService
+from cache import response_cache
+from conditional import not_modified_response
 
 router = APIRouter(prefix="/api/categories", tags=["categories"])
 
 @router.get("", response_model=list[CategoryResponse])
-async def get_categories():
+def get_categories(request: Request, response: Response):
     """Obtiene todas las categorías"""
+    not_modified = not_modified_response(request, response, "categories")
+    if not_modified:
+        return not_modified
     try:
-        categories = CategoryService.get_all()
+        categories = response_cache.get_or_set("categories", None, CategoryService.get_all)
         return categories
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("")
-async def create_category(data: dict = Body(...)):
+def create_category(data: dict = Body(...)):
     """Crea una nueva categoría"""
     try:
         name = data.get("name")
@@ -31,7 +36,7 @@ async def create_category(data: dict = Body(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/{category_id}")
-async def update_category(category_id: int, data: dict = Body(...)):
+def update_category(category_id: int, data: dict = Body(...)):
     """Actualiza una categoría"""
     try:
         name = data.get("name")
@@ -46,7 +51,7 @@ async def update_category(category_id: int, data: dict = Body(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{category_id}")
-async def delete_category(category_id: int):
+def delete_category(category_id: int):
     """Elimina una categoría"""
     try:
         success = CategoryService.delete(category_id)
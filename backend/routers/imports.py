@@ -1,19 +1,32 @@
 """Endpoints para importar archivos"""
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request, Response
+import io
 import os
-import shutil
+import hashlib
+import tempfile
+import zipfile
+import zlib
 from pathlib import Path
-from datetime import datetime
+from typing import List, Optional, Tuple, Union
 from database import get_db_connection
-from pdf_parser import PDFParser
-from services import TransactionService
+from import_jobs import import_queue, run_import_batch
+from services import ImportService
+from cache import response_cache
+from conditional import not_modified_response
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/import", tags=["import"])
 
+# Tamaño máximo de un archivo subido
+MAX_UPLOAD_BYTES = int(os.getenv("IMPORT_MAX_UPLOAD_MB", 20)) * 1024 * 1024
+# Bajo este tamaño el archivo se procesa en memoria, sin pasar por disco
+MEMORY_UPLOAD_BYTES = int(os.getenv("IMPORT_MEMORY_UPLOAD_MB", 5)) * 1024 * 1024
+# Límites de la importación por lotes (varios PDFs o un ZIP)
+MAX_BATCH_FILES = int(os.getenv("IMPORT_BATCH_MAX_FILES", 50))
+MAX_ZIP_BYTES = int(os.getenv("IMPORT_MAX_ZIP_MB", 100)) * 1024 * 1024
+
 # Directorio para guardar archivos subidos temporalmente
 def get_upload_dir():
     """Obtiene el directorio de uploads, creándolo si no existe"""
@@ -27,106 +40,256 @@ def get_upload_dir():
         upload_dir.mkdir(parents=True, exist_ok=True)
     return upload_dir
 
-@router.post("/pdf")
-async def import_pdf(file: UploadFile = File(...)):
-    """Importa transacciones desde un archivo PDF"""
-    import_id = None
-    upload_dir = get_upload_dir()
+def receive_upload(
+    source,
+    upload_dir: Path,
+    chunk_size: int = 256 * 1024,
+    max_bytes: Optional[int] = None
+) -> Tuple[Union[bytes, Path], str]:
+    """
+    Lee el archivo subido por bloques calculando su SHA-256 y aplicando el límite de tamaño.
+    Los archivos pequeños quedan en memoria; si superan MEMORY_UPLOAD_BYTES se vuelcan
+    a un archivo temporal con nombre único dentro de upload_dir.
     
+    Returns:
+        (contenido en bytes o ruta del archivo temporal, hash SHA-256)
+    """
+    max_bytes = max_bytes or MAX_UPLOAD_BYTES
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    spill = None
+    size = 0
     try:
-        # Guardar archivo temporalmente
-        file_path = upload_dir / file.filename
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Registrar import en la base de datos
-        conn = get_db_connection()
-        if not conn:
-            raise HTTPException(status_code=500, detail="No se pudo conectar a la base de datos")
-        
-        try:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO imports (filename, file_path, status, import_type)
-                    VALUES (%s, %s, %s, %s)
-                """, (file.filename, str(file_path), "processing", "pdf"))
-                import_id = cursor.lastrowid
-                conn.commit()
-        finally:
-            conn.close()
-        
-        # Parsear PDF
-        parser = PDFParser()
-        try:
-            transactions_data = parser.parse_pdf(str(file_path))
-        except Exception as parse_error:
-            logger.error(f"Error al parsear PDF: {parse_error}", exc_info=True)
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Error al parsear el PDF: {str(parse_error)}"
-            )
-        
-        # Guardar transacciones en la base de datos
-        saved_count = 0
-        for tx_data in transactions_data:
-            try:
-                tx_data['import_id'] = import_id
-                TransactionService.create_transaction(
-                    tx_data,
-                    tags=tx_data.get('tags', [])
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"El archivo supera el máximo de {max_bytes // (1024 * 1024)} MB"
+                )
+            digest.update(chunk)
+            if spill is None and size > MEMORY_UPLOAD_BYTES:
+                spill = tempfile.NamedTemporaryFile(dir=upload_dir, prefix="import_", suffix=".pdf", delete=False)
+                spill.write(buffer.getbuffer())
+                buffer = None
+            if spill is not None:
+                spill.write(chunk)
+            else:
+                buffer.write(chunk)
+    except Exception:
+        if spill is not None:
+            spill.close()
+            Path(spill.name).unlink(missing_ok=True)
+        raise
+
+    if spill is not None:
+        spill.close()
+        return Path(spill.name), digest.hexdigest()
+    return buffer.getvalue(), digest.hexdigest()
+
+def discard_upload(data: Union[bytes, Path, None]):
+    """Elimina el archivo temporal de un upload, si se volcó a disco"""
+    if isinstance(data, Path):
+        data.unlink(missing_ok=True)
+
+@router.post("/pdf", status_code=202)
+def import_pdf(
+    file: UploadFile = File(...),
+    reject_duplicates: bool = Query(True, description="Rechazar cartolas ya importadas (mismo contenido)")
+):
+    """
+    Encola la importación de un archivo PDF.
+    Retorna de inmediato el ID del job; el avance se consulta en GET /api/import/{import_id}.
+    """
+    data = None
+    try:
+        # Leer el archivo en memoria (o en un temporal único si es grande) para el worker
+        data, content_hash = receive_upload(file.file, get_upload_dir())
+
+        if reject_duplicates:
+            previous = ImportService.find_by_hash(content_hash)
+            if previous:
+                raise HTTPException(
+                    status_code=409,
+                    detail={
+                        "message": f"Esta cartola ya fue importada ({previous['filename']})",
+                        "import_id": previous['id'],
+                        "status": previous['status'],
+                    }
                 )
-                saved_count += 1
-            except Exception as e:
-                logger.error(f"Error al guardar transacción: {e}")
-        
-        # Actualizar estado del import
-        conn = get_db_connection()
-        if conn:
+
+        # Registrar el job en la base de datos
+        file_path = str(data) if isinstance(data, Path) else None
+        import_id = ImportService.create(
+            file.filename, file_path, import_type="pdf", status="pending", content_hash=content_hash
+        )
+    except HTTPException:
+        discard_upload(data)
+        raise
+    except Exception as e:
+        logger.error(f"Error al registrar import de PDF: {e}")
+        discard_upload(data)
+        raise HTTPException(status_code=500, detail=f"Error al importar PDF: {str(e)}")
+
+    try:
+        future = import_queue.submit(import_id, str(data) if isinstance(data, Path) else data, content_hash)
+        # El job guarda en otro proceso: invalidar la caché de este al terminar
+        future.add_done_callback(lambda _: response_cache.invalidate("stats", "tags"))
+    except Exception as e:
+        logger.error(f"Error al encolar import {import_id}: {e}")
+        discard_upload(data)
+        ImportService.update(import_id, status="failed", error_message=str(e))
+        raise HTTPException(status_code=500, detail=f"Error al importar PDF: {str(e)}")
+
+    return {
+        "success": True,
+        "import_id": import_id,
+        "status": "pending",
+        "message": "Archivo recibido, importación en curso"
+    }
+
+def is_zip_upload(file: UploadFile) -> bool:
+    """Indica si el archivo subido es un ZIP (por extensión o tipo de contenido)"""
+    return (file.filename or "").lower().endswith(".zip") or file.content_type in (
+        "application/zip", "application/x-zip-compressed"
+    )
+
+def receive_zip_members(file: UploadFile, upload_dir: Path) -> List[dict]:
+    """
+    Extrae los PDFs de un ZIP subido, aplicando a cada uno los mismos límites que a un upload.
+    Retorna una entrada por PDF con filename y data/content_hash, o error si no se pudo leer.
+    """
+    try:
+        archive, _ = receive_upload(file.file, upload_dir, max_bytes=MAX_ZIP_BYTES)
+    except HTTPException as e:
+        return [{"filename": file.filename, "error": str(e.detail)}]
+    entries = []
+    try:
+        with zipfile.ZipFile(io.BytesIO(archive) if isinstance(archive, bytes) else archive) as zf:
+            for member in zf.infolist():
+                name = Path(member.filename).name
+                if member.is_dir() or member.filename.startswith("__MACOSX/") or not name.lower().endswith(".pdf"):
+                    continue
+                try:
+                    if member.file_size > MAX_UPLOAD_BYTES:
+                        raise HTTPException(status_code=413, detail="El archivo supera el tamaño máximo")
+                    with zf.open(member) as stream:
+                        data, content_hash = receive_upload(stream, upload_dir)
+                    entries.append({"filename": name, "data": data, "content_hash": content_hash})
+                except HTTPException as e:
+                    entries.append({"filename": name, "error": str(e.detail)})
+                except (zipfile.BadZipFile, zlib.error):
+                    # Miembro dañado (CRC o compresión inválida): se informa solo ese archivo
+                    entries.append({"filename": name, "error": f"{name} está dañado dentro del ZIP"})
+    except zipfile.BadZipFile:
+        for entry in entries:
+            discard_upload(entry.get("data"))
+        return [{"filename": file.filename, "error": f"{file.filename} no es un ZIP válido"}]
+    except BaseException:
+        for entry in entries:
+            discard_upload(entry.get("data"))
+        raise
+    finally:
+        discard_upload(archive)
+    return entries
+
+@router.post("/batch")
+def import_batch(
+    files: List[UploadFile] = File(...),
+    reject_duplicates: bool = Query(True, description="Rechazar cartolas ya importadas (mismo contenido)")
+):
+    """
+    Importa varios PDFs (o un ZIP con PDFs) en una sola llamada.
+    Los archivos se parsean en paralelo, se registra un import por archivo y
+    se retorna un resumen por archivo.
+    """
+    upload_dir = get_upload_dir()
+
+    # Recibir archivos (expandiendo ZIPs)
+    entries = []
+    try:
+        for file in files:
+            if is_zip_upload(file):
+                entries.extend(receive_zip_members(file, upload_dir))
+                continue
             try:
-                with conn.cursor() as cursor:
-                    cursor.execute("""
-                        UPDATE imports 
-                        SET status = %s, transactions_count = %s
-                        WHERE id = %s
-                    """, ("completed", saved_count, import_id))
-                    conn.commit()
-            finally:
-                conn.close()
-        
-        # Eliminar archivo temporal
-        if file_path.exists():
-            file_path.unlink()
-        
-        return {
-            "success": True,
+                data, content_hash = receive_upload(file.file, upload_dir)
+                entries.append({"filename": file.filename, "data": data, "content_hash": content_hash})
+            except HTTPException as e:
+                entries.append({"filename": file.filename, "error": str(e.detail)})
+    except BaseException:
+        # No dejar temporales de los archivos ya recibidos si la recepción se corta
+        for entry in entries:
+            discard_upload(entry.get("data"))
+        raise
+
+    if len(entries) > MAX_BATCH_FILES:
+        for entry in entries:
+            discard_upload(entry.get("data"))
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_BATCH_FILES} archivos por lote")
+
+    # Registrar un import por archivo válido y no duplicado
+    summary = []
+    items = []
+    seen_hashes = set()
+    for entry in entries:
+        if "error" in entry:
+            summary.append({"filename": entry["filename"], "status": "rejected", "error": entry["error"]})
+            continue
+
+        content_hash = entry["content_hash"]
+        previous = ImportService.find_by_hash(content_hash) if reject_duplicates else None
+        if content_hash in seen_hashes or previous:
+            discard_upload(entry["data"])
+            summary.append({
+                "filename": entry["filename"],
+                "status": "duplicate",
+                "import_id": previous['id'] if previous else None,
+                "error": "Esta cartola ya fue importada",
+            })
+            continue
+        seen_hashes.add(content_hash)
+
+        try:
+            import_id = ImportService.create(
+                entry["filename"],
+                str(entry["data"]) if isinstance(entry["data"], Path) else None,
+                import_type="pdf",
+                status="pending",
+                content_hash=content_hash,
+            )
+        except Exception as e:
+            discard_upload(entry["data"])
+            summary.append({"filename": entry["filename"], "status": "failed", "error": str(e)})
+            continue
+
+        item = {
             "import_id": import_id,
-            "transactions_imported": saved_count,
-            "message": f"Se importaron {saved_count} transacciones exitosamente"
+            "filename": entry["filename"],
+            "source": str(entry["data"]) if isinstance(entry["data"], Path) else entry["data"],
+            "content_hash": content_hash,
         }
-        
-    except Exception as e:
-        logger.error(f"Error al importar PDF: {e}")
-        
-        # Actualizar estado del import como fallido
-        if import_id:
-            conn = get_db_connection()
-            if conn:
-                try:
-                    with conn.cursor() as cursor:
-                        cursor.execute("""
-                            UPDATE imports 
-                            SET status = %s, error_message = %s
-                            WHERE id = %s
-                        """, ("failed", str(e), import_id))
-                        conn.commit()
-                finally:
-                    conn.close()
-        
-        raise HTTPException(status_code=500, detail=f"Error al importar PDF: {str(e)}")
+        items.append(item)
+        summary.append(item)
+
+    # Parsear en paralelo y guardar; reemplazar cada item por su resumen
+    results = iter(run_import_batch(items, import_queue)) if items else iter(())
+    summary = [next(results) if "source" in entry else entry for entry in summary]
+
+    return {
+        "success": all(entry["status"] == "completed" for entry in summary),
+        "files": summary,
+        "transactions_imported": sum(entry.get("transactions_imported", 0) for entry in summary),
+        "duplicates_skipped": sum(entry.get("duplicates_skipped", 0) for entry in summary),
+    }
 
 @router.get("/list")
-async def list_imports():
+def list_imports(request: Request, response: Response):
     """Lista todos los imports realizados"""
+    not_modified = not_modified_response(request, response, "imports")
+    if not_modified:
+        return not_modified
+    
     conn = get_db_connection()
     if not conn:
         return []
@@ -134,7 +297,7 @@ async def list_imports():
     try:
         with conn.cursor() as cursor:
             cursor.execute("""
-                SELECT id, filename, status, transactions_count, 
+                SELECT id, filename, status, progress, transactions_count, duplicates_count,
                        imported_at, error_message
                 FROM imports
                 ORDER BY imported_at DESC
@@ -145,3 +308,12 @@ async def list_imports():
     finally:
         conn.close()
 
+
+@router.get("/{import_id}")
+def get_import_status(import_id: int):
+    """Estado y avance de un job de importación"""
+    job = ImportService.get(import_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import no encontrado")
+    job.pop('file_path', None)
+    return job
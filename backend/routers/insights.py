@@ -0,0 +1,43 @@
+"""Endpoints para análisis de patrones de gasto"""
+from fastapi import APIRouter, Query, HTTPException, Request, Response
+from typing import Optional
+from datetime import date
+from services import DataVersionService
+from insights import get_insights
+from cache import response_cache
+from conditional import not_modified_response
+
+router = APIRouter(prefix="/api/insights", tags=["insights"])
+
+@router.get("")
+def get_spending_insights(
+    request: Request,
+    response: Response,
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None)
+):
+    """
+    Gastos anómalos, cobros recurrentes y variación mes a mes por categoría.
+    El resultado se cachea por versión de los datos: cualquier escritura de
+    transacciones o categorías genera una clave nueva.
+    """
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date debe ser anterior a end_date")
+    not_modified = not_modified_response(request, response, "transactions", "categories")
+    if not_modified:
+        return not_modified
+    try:
+        versions = DataVersionService.get("transactions", "categories") or {}
+        return response_cache.get_or_set(
+            "insights",
+            {
+                "start_date": start_date,
+                "end_date": end_date,
+                "versions": {name: info["version"] for name, info in versions.items()},
+            },
+            lambda: get_insights(start_date=start_date, end_date=end_date),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
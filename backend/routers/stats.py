@@ -1,21 +1,72 @@
 """Endpoints para estadísticas"""
-from fastapi import APIRouter, Query, HTTPException
-from typing import Optional
+from fastapi import APIRouter, Query, HTTPException, Request, Response
+from typing import List, Optional
 from datetime import date
 from models import StatsResponse
 from services import StatsService
+from cache import response_cache
+from conditional import not_modified_response
 
 router = APIRouter(prefix="/api/stats", tags=["stats"])
 
 @router.get("", response_model=StatsResponse)
-async def get_stats(
+def get_stats(
+    request: Request,
+    response: Response,
     start_date: Optional[date] = Query(None),
-    end_date: Optional[date] = Query(None)
+    end_date: Optional[date] = Query(None),
+    dimensions: Optional[List[str]] = Query(None, description="Desgloses extra: account, tag")
 ):
     """Obtiene estadísticas de transacciones"""
+    not_modified = not_modified_response(request, response, "transactions", "categories", "tags")
+    if not_modified:
+        return not_modified
     try:
-        stats = StatsService.get_stats(start_date=start_date, end_date=end_date)
+        stats = response_cache.get_or_set(
+            "stats",
+            {"start_date": start_date, "end_date": end_date, "dimensions": sorted(dimensions or [])},
+            lambda: StatsService.get_stats(start_date=start_date, end_date=end_date, dimensions=dimensions),
+            scope=(start_date, end_date),
+        )
         return stats
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get("/timeseries")
+def get_timeseries(
+    request: Request,
+    response: Response,
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    bucket: str = Query("month", pattern="^(day|week|month)$"),
+    split_by: Optional[str] = Query(None, pattern="^(category|merchant)$"),
+    limit: int = Query(10, ge=1, le=50, description="Máximo de series con split_by (el resto va en 'Otros')")
+):
+    """
+    Serie de tiempo de gastos: suma y cantidad por día, semana o mes, en arreglos
+    alineados con 'periods'. Con split_by se separa por categoría o comercio.
+    """
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date debe ser anterior a end_date")
+    not_modified = not_modified_response(request, response, "transactions", "categories")
+    if not_modified:
+        return not_modified
+    try:
+        return response_cache.get_or_set(
+            "stats",
+            {
+                "view": "timeseries", "start_date": start_date, "end_date": end_date,
+                "bucket": bucket, "split_by": split_by, "limit": limit,
+            },
+            lambda: StatsService.get_timeseries(
+                start_date=start_date, end_date=end_date, bucket=bucket, split_by=split_by, limit=limit
+            ),
+            scope=(start_date, end_date),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,21 +1,26 @@
 """Endpoints para etiquetas"""
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Request, Response
 from models import TagResponse
 from services import TagService
+from cache import response_cache
+from conditional import not_modified_response
 
 router = APIRouter(prefix="/api/tags", tags=["tags"])
 
 @router.get("", response_model=list[TagResponse])
-async def get_tags():
+def get_tags(request: Request, response: Response):
     """Obtiene todas las etiquetas"""
+    not_modified = not_modified_response(request, response, "tags")
+    if not_modified:
+        return not_modified
     try:
-        tags = TagService.get_all()
+        tags = response_cache.get_or_set("tags", None, TagService.get_all)
         return tags
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("")
-async def create_tag(data: dict = Body(...)):
+def create_tag(data: dict = Body(...)):
     """Crea una nueva etiqueta"""
     try:
         name = data.get("name")
@@ -31,7 +36,7 @@ async def create_tag(data: dict = Body(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{tag_id}")
-async def delete_tag(tag_id: int):
+def delete_tag(tag_id: int):
     """Elimina una etiqueta"""
     try:
         success = TagService.delete(tag_id)
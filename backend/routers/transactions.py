@@ -1,23 +1,54 @@
 """Endpoints para transacciones"""
-from fastapi import APIRouter, Query, HTTPException, Body
-from typing import Optional
+from fastapi import APIRouter, Query, HTTPException, Body, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Iterator, Optional
 from datetime import date
-from models import TransactionResponse
+from decimal import Decimal
+import io
+import csv
+import json
+from models import TransactionResponse, RecategorizeRequest, BulkTagRequest
 from services import TransactionService
+from conditional import not_modified_response
 
 router = APIRouter(prefix="/api/transactions", tags=["transactions"])
 
+# Máximo de transacciones en una llamada de etiquetado masivo
+MAX_BULK_TAG_TRANSACTIONS = 50000
+
 @router.get("")
-async def get_transactions(
+def get_transactions(
+    request: Request,
+    response: Response,
     category_id: Optional[int] = Query(None),
     payment_method: Optional[str] = Query(None),
     start_date: Optional[date] = Query(None),
     end_date: Optional[date] = Query(None),
-    limit: int = Query(1000, le=10000),
-    offset: int = Query(0, ge=0)
+    limit: int = Query(1000, ge=1, le=10000),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(
+        None,
+        description="Paginación por cursor: vacío para la primera página, luego el next_cursor recibido"
+    )
 ):
-    """Obtiene transacciones con filtros opcionales"""
+    """
+    Obtiene transacciones con filtros opcionales.
+    Con cursor retorna {transactions, next_cursor}; sin él, la lista paginada por offset.
+    Soporta If-None-Match / If-Modified-Since (responde 304 si los datos no cambiaron).
+    """
+    not_modified = not_modified_response(request, response, "transactions", "categories", "tags")
+    if not_modified:
+        return not_modified
     try:
+        if cursor is not None:
+            return TransactionService.get_transactions_page(
+                category_id=category_id,
+                payment_method=payment_method,
+                start_date=start_date,
+                end_date=end_date,
+                limit=limit,
+                cursor=cursor or None
+            )
         transactions = TransactionService.get_transactions(
             category_id=category_id,
             payment_method=payment_method,
@@ -27,13 +58,164 @@ async def get_transactions(
             offset=offset
         )
         return transactions
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/search")
+def search_transactions(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, description="Palabras a buscar en descripción y comercio (como prefijos)"),
+    category_id: Optional[int] = Query(None),
+    payment_method: Optional[str] = Query(None),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Búsqueda de texto completo sobre las transacciones, ordenada por relevancia.
+    Combina con los filtros de categoría, método de pago y fechas.
+    """
+    not_modified = not_modified_response(request, response, "transactions", "categories", "tags")
+    if not_modified:
+        return not_modified
+    try:
+        return TransactionService.search(
+            q,
+            category_id=category_id,
+            payment_method=payment_method,
+            start_date=start_date,
+            end_date=end_date,
+            limit=limit,
+            offset=offset
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Columnas del export, en orden
+EXPORT_COLUMNS = [
+    "id", "transaction_date", "description", "merchant", "amount", "category_id",
+    "category_name", "payment_method", "account_id", "tags", "created_at", "updated_at",
+]
+# Filas por bloque enviado al cliente
+EXPORT_CHUNK_ROWS = 500
+
+def _export_value(value):
+    """Convierte un valor de MySQL a uno serializable"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+def _export_ndjson(rows: Iterator[dict]) -> Iterator[str]:
+    """Una transacción JSON por línea, enviadas en bloques"""
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps({col: _export_value(row[col]) for col in EXPORT_COLUMNS}, ensure_ascii=False))
+        if len(chunk) >= EXPORT_CHUNK_ROWS:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+def _export_csv(rows: Iterator[dict]) -> Iterator[str]:
+    """CSV con encabezado; los tags van separados por '|'"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow([
+            "|".join(row["tags"]) if col == "tags" else _export_value(row[col])
+            for col in EXPORT_COLUMNS
+        ])
+        count += 1
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@router.get("/export")
+def export_transactions(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    category_id: Optional[int] = Query(None),
+    payment_method: Optional[str] = Query(None),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None)
+):
+    """
+    Exporta las transacciones filtradas como NDJSON o CSV.
+    Las filas se leen con un cursor sin buffer y se envían a medida que llegan,
+    así que la memoria no crece con el tamaño del export.
+    """
+    try:
+        # La consulta se ejecuta aquí: un error todavía puede responderse como 500
+        rows = TransactionService.iter_transactions(
+            category_id=category_id,
+            payment_method=payment_method,
+            start_date=start_date,
+            end_date=end_date
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if format == "csv":
+        body, media_type = _export_csv(rows), "text/csv"
+    else:
+        body, media_type = _export_ndjson(rows), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="transactions.{format}"'}
+    )
+
+@router.post("/recategorize")
+def recategorize_transactions(request: RecategorizeRequest = Body(RecategorizeRequest())):
+    """
+    Re-categoriza en bloque con el categorizador automático (aprende de las
+    categorizaciones manuales). Las categorías asignadas a mano no se modifican.
+    Con dry_run solo cuenta cuántas cambiarían.
+    """
+    if request.start_date and request.end_date and request.start_date > request.end_date:
+        raise HTTPException(status_code=400, detail="start_date debe ser anterior a end_date")
+    try:
+        return TransactionService.recategorize(
+            start_date=request.start_date,
+            end_date=request.end_date,
+            include_auto=request.include_auto,
+            dry_run=request.dry_run
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/tags")
+def bulk_tag_transactions(request: BulkTagRequest):
+    """
+    Agrega y/o quita tags a muchas transacciones en una sola llamada.
+    Retorna cuántas relaciones transacción-tag se agregaron y eliminaron.
+    """
+    if len(request.transaction_ids) > MAX_BULK_TAG_TRANSACTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {MAX_BULK_TAG_TRANSACTIONS} transacciones por llamada"
+        )
+    try:
+        return TransactionService.bulk_tag(request.transaction_ids, add=request.add, remove=request.remove)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.put("/{transaction_id}")
-async def update_transaction(transaction_id: int, updates: dict = Body(...)):
+def update_transaction(transaction_id: int, updates: dict = Body(...)):
     """Actualiza una transacción"""
     try:
         success = TransactionService.update_transaction(transaction_id, updates)
@@ -46,7 +228,7 @@ async def update_transaction(transaction_id: int, updates: dict = Body(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{transaction_id}")
-async def delete_transaction(transaction_id: int):
+def delete_transaction(transaction_id: int):
     """Elimina una transacción"""
     try:
         success = TransactionService.delete_transaction(transaction_id)
@@ -0,0 +1,225 @@
+"""
+Motor de reglas para inferir el comercio y el método de pago desde la descripción.
+
+Las reglas (alias de comercio -> nombre, palabra clave -> método de pago) vienen de:
+- las reglas por defecto de este módulo
+- un archivo JSON (CLASSIFICATION_RULES_FILE)
+- la tabla classification_rules
+
+Todas se compilan en un único matcher: una regex con forma de trie que, en una pasada
+por la descripción, encuentra cada patrón contenido en ella. El costo por descripción
+casi no depende de la cantidad de reglas.
+
+Formato del archivo:
+    {"merchants": [{"pattern": "UBER EATS", "value": "Uber Eats", "priority": 10}],
+     "payment_methods": [{"pattern": "REDCOMPRA", "value": "debit"}]}
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MERCHANT = "merchant"
+PAYMENT_METHOD = "payment_method"
+KINDS = (MERCHANT, PAYMENT_METHOD)
+
+# Método de pago cuando ninguna regla coincide
+DEFAULT_PAYMENT_METHOD = "credit"
+# Prioridad de las reglas del archivo o la base de datos sin prioridad explícita
+# (menor gana; las reglas por defecto usan 100+ para que las propias tengan precedencia)
+CUSTOM_RULE_PRIORITY = 50
+# Segundos entre recargas de reglas en procesos de larga vida
+RULES_RELOAD_SECONDS = int(os.getenv("CLASSIFICATION_RULES_RELOAD_SECONDS", 300))
+
+DEFAULT_MERCHANTS = [
+    'STARBUCKS', 'RAPPI', 'UBER EATS', 'PEDIDOS YA', 'MCDONALDS',
+    'SUBWAY', 'FARMACIA AHUMADA', 'SHELL', 'COPEC', 'LIDER',
+    'JUMBO', 'SANTANDER', 'FALABELLA', 'RIPLEY', 'PARIS'
+]
+DEFAULT_PAYMENT_KEYWORDS = {
+    'credit': ['TARJETA', 'CREDITO', 'CREDIT', 'VISA', 'MASTERCARD'],
+    'debit': ['DEBITO', 'DEBIT', 'TRANSFERENCIA'],
+}
+
+
+class Rule(NamedTuple):
+    kind: str
+    pattern: str
+    value: str
+    priority: int
+
+
+def default_rules() -> List[Rule]:
+    """Reglas por defecto (en orden de prioridad)"""
+    rules = [Rule(MERCHANT, alias, alias.title(), 100 + i) for i, alias in enumerate(DEFAULT_MERCHANTS)]
+    for i, (method, keywords) in enumerate(DEFAULT_PAYMENT_KEYWORDS.items()):
+        rules.extend(Rule(PAYMENT_METHOD, keyword, method, 100 + i) for keyword in keywords)
+    return rules
+
+
+def file_rules(path: str) -> List[Rule]:
+    """Reglas desde un archivo JSON"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    rules = []
+    for kind, section in ((MERCHANT, "merchants"), (PAYMENT_METHOD, "payment_methods")):
+        for entry in data.get(section, []):
+            rules.append(Rule(kind, entry["pattern"], entry["value"], int(entry.get("priority", CUSTOM_RULE_PRIORITY))))
+    return rules
+
+
+def db_rules() -> List[Rule]:
+    """Reglas desde la tabla classification_rules"""
+    from database import get_db_connection
+
+    conn = get_db_connection()
+    if not conn:
+        return []
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT kind, pattern, value, priority FROM classification_rules")
+            return [
+                Rule(row['kind'], row['pattern'], row['value'], row['priority'])
+                for row in cursor.fetchall() if row['kind'] in KINDS
+            ]
+    finally:
+        conn.close()
+
+
+def _trie_regex(node: dict) -> str:
+    """Regex equivalente a un trie de patrones; en cada posición coincide con el más largo"""
+    terminal = "" in node
+    branches = [re.escape(char) + _trie_regex(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    return f"(?:{body})?" if terminal else body
+
+
+class RuleEngine:
+    """Clasificador compilado de descripciones"""
+
+    def __init__(self, rules: Iterable[Rule]):
+        # Patrón normalizado -> mejor regla de cada tipo
+        best: Dict[str, Dict[str, Rule]] = {}
+        for rule in rules:
+            pattern = rule.pattern.strip().upper()
+            if not pattern or rule.kind not in KINDS:
+                continue
+            current = best.setdefault(pattern, {}).get(rule.kind)
+            if current is None or rule.priority < current.priority:
+                best[pattern][rule.kind] = rule._replace(pattern=pattern)
+
+        self.rule_count = sum(len(kinds) for kinds in best.values())
+        self.fingerprint = hashlib.sha1(
+            json.dumps(sorted(r for kinds in best.values() for r in kinds.values())).encode()
+        ).hexdigest()
+
+        # En cada posición el matcher entrega solo el patrón más largo; los más cortos que
+        # también coinciden ahí son prefijos suyos, así que cada patrón hereda la mejor
+        # regla de sus prefijos y el resultado es el mismo que probar todos los patrones.
+        self._resolved: Dict[str, Tuple[Optional[Rule], Optional[Rule]]] = {}
+        for pattern in best:
+            resolved = []
+            for kind in KINDS:
+                candidates = [
+                    best[pattern[:i]][kind] for i in range(1, len(pattern) + 1)
+                    if pattern[:i] in best and kind in best[pattern[:i]]
+                ]
+                resolved.append(min(candidates, key=lambda r: r.priority) if candidates else None)
+            self._resolved[pattern] = tuple(resolved)
+
+        trie: dict = {}
+        for pattern in best:
+            node = trie
+            for char in pattern:
+                node = node.setdefault(char, {})
+            node[""] = True
+        self._matcher = re.compile("(?=(" + _trie_regex(trie) + "))") if trie else None
+
+    def match(self, description: str) -> Tuple[Optional[Rule], Optional[Rule]]:
+        """Mejor regla de comercio y de método de pago contenidas en la descripción"""
+        merchant = payment = None
+        if self._matcher is None:
+            return merchant, payment
+        for m in self._matcher.finditer(description.upper()):
+            merchant_rule, payment_rule = self._resolved[m.group(1)]
+            if merchant_rule and (merchant is None or merchant_rule.priority < merchant.priority):
+                merchant = merchant_rule
+            if payment_rule and (payment is None or payment_rule.priority < payment.priority):
+                payment = payment_rule
+        return merchant, payment
+
+    def classify(self, descriptions: Iterable[str]) -> List[Tuple[Optional[str], str]]:
+        """
+        Clasifica un lote de descripciones.
+
+        Returns:
+            (comercio, método de pago) por descripción. Sin regla de comercio se usa la
+            primera palabra de la descripción; sin regla de pago, DEFAULT_PAYMENT_METHOD.
+        """
+        results = []
+        for description in descriptions:
+            merchant_rule, payment_rule = self.match(description)
+            if merchant_rule:
+                merchant = merchant_rule.value
+            else:
+                words = description.split()
+                merchant = words[0][:50] if words else None
+            results.append((merchant, payment_rule.value if payment_rule else DEFAULT_PAYMENT_METHOD))
+        return results
+
+    def classify_transactions(self, transactions: List[Dict]) -> List[Dict]:
+        """Completa merchant y payment_method de las transacciones (en el mismo dict)"""
+        for tx, (merchant, payment_method) in zip(
+            transactions, self.classify(tx.get('description') or '' for tx in transactions)
+        ):
+            tx['merchant'] = merchant
+            tx['payment_method'] = payment_method
+        return transactions
+
+    @classmethod
+    def load(cls, rules_file: Optional[str] = None, use_db: bool = True) -> "RuleEngine":
+        """Compila las reglas por defecto más las del archivo y de la base de datos"""
+        rules = default_rules()
+        rules_file = rules_file or os.getenv("CLASSIFICATION_RULES_FILE")
+        if rules_file:
+            try:
+                rules.extend(file_rules(rules_file))
+            except Exception as e:
+                logger.warning(f"No se pudieron leer las reglas de {rules_file}: {e}")
+        if use_db:
+            try:
+                rules.extend(db_rules())
+            except Exception as e:
+                logger.warning(f"No se pudieron leer las reglas de la base de datos: {e}")
+        return cls(rules)
+
+
+_engine: Optional[RuleEngine] = None
+_engine_loaded_at = 0.0
+_engine_lock = threading.Lock()
+
+
+def get_rule_engine() -> RuleEngine:
+    """Motor de reglas del proceso, recargado cada RULES_RELOAD_SECONDS"""
+    global _engine, _engine_loaded_at
+    if _engine is None or time.monotonic() - _engine_loaded_at > RULES_RELOAD_SECONDS:
+        with _engine_lock:
+            if _engine is None or time.monotonic() - _engine_loaded_at > RULES_RELOAD_SECONDS:
+                _engine = RuleEngine.load()
+                _engine_loaded_at = time.monotonic()
+    return _engine
+
+
+def reload_rule_engine() -> RuleEngine:
+    """Fuerza la recarga de reglas (p.ej. tras modificar classification_rules)"""
+    global _engine_loaded_at
+    _engine_loaded_at = 0.0
+    return get_rule_engine()
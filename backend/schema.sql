@@ -42,10 +42,25 @@ CREATE TABLE IF NOT EXISTS imports (
     status VARCHAR(50) DEFAULT 'pending', -- 'pending', 'processing', 'completed', 'failed'
     error_message TEXT,
     transactions_count INT DEFAULT 0,
+    duplicates_count INT DEFAULT 0, -- movimientos omitidos por estar ya guardados
+    progress TINYINT UNSIGNED DEFAULT 0, -- 0-100, avance del job de importación
+    content_hash CHAR(64), -- SHA-256 del archivo importado
     imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE SET NULL,
     INDEX idx_import_status (status),
-    INDEX idx_import_date (imported_at)
+    INDEX idx_import_date (imported_at),
+    INDEX idx_import_content_hash (content_hash)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Caché de cartolas ya parseadas (por hash del archivo y versión del parser)
+CREATE TABLE IF NOT EXISTS parse_cache (
+    content_hash CHAR(64) NOT NULL,
+    parser_version VARCHAR(20) NOT NULL,
+    transactions JSON NOT NULL,
+    transactions_count INT DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (content_hash, parser_version)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Tabla de transacciones
@@ -58,8 +73,10 @@ CREATE TABLE IF NOT EXISTS transactions (
     merchant VARCHAR(255),
     amount DECIMAL(15, 2) NOT NULL,
     category_id INT,
+    category_source VARCHAR(10), -- 'manual' o 'auto' (categorizador); NULL si no tiene categoría
     payment_method VARCHAR(50), -- 'credit', 'debit', 'cash', etc.
     raw_data TEXT, -- Datos originales del parsing para debugging
+    fingerprint CHAR(40), -- Huella de fecha, monto, descripción, cuenta y ocurrencia en la cartola
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE SET NULL,
@@ -67,9 +84,13 @@ CREATE TABLE IF NOT EXISTS transactions (
     FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE SET NULL,
     INDEX idx_transaction_date (transaction_date),
     INDEX idx_transaction_category (category_id),
+    INDEX idx_transaction_category_date (category_id, transaction_date),
+    INDEX idx_transaction_payment_date (payment_method, transaction_date),
     INDEX idx_transaction_account (account_id),
     INDEX idx_transaction_merchant (merchant),
-    INDEX idx_transaction_description (description(255))
+    INDEX idx_transaction_description (description(255)),
+    FULLTEXT INDEX ft_transaction_text (description, merchant),
+    UNIQUE INDEX uq_transaction_fingerprint (fingerprint)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Tabla de relación many-to-many entre transacciones y etiquetas
@@ -83,6 +104,79 @@ CREATE TABLE IF NOT EXISTS transaction_tags (
     INDEX idx_transaction_tag (transaction_id, tag_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Rollups diarios para estadísticas: suma y cantidad por fecha × categoría × comercio × método de pago × cuenta
+-- (NULL se guarda como 0 / '' porque las columnas son parte de la clave primaria)
+-- Se mantienen desde TransactionService; para recalcularlos: python rebuild_rollups.py
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    rollup_date DATE NOT NULL,
+    category_id INT NOT NULL DEFAULT 0,
+    merchant VARCHAR(255) NOT NULL DEFAULT '',
+    payment_method VARCHAR(50) NOT NULL DEFAULT '',
+    account_id INT NOT NULL DEFAULT 0,
+    total DECIMAL(17, 2) NOT NULL DEFAULT 0,
+    tx_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (rollup_date, category_id, merchant, payment_method, account_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Presupuestos por categoría (NULL: todo el gasto) y período ('weekly', 'monthly', 'yearly')
+CREATE TABLE IF NOT EXISTS budgets (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    category_id INT,
+    period VARCHAR(10) NOT NULL DEFAULT 'monthly',
+    amount_limit DECIMAL(15, 2) NOT NULL,
+    alert_threshold DECIMAL(5, 2) NOT NULL DEFAULT 80, -- % del monto desde el que se avisa
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE,
+    INDEX idx_budget_category (category_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Consumo de cada presupuesto por período, mantenido desde TransactionService
+-- (alert_level: nivel más alto ya notificado en el período, 0 ok, 1 aviso, 2 excedido)
+-- Para recalcularlo: python rebuild_rollups.py
+CREATE TABLE IF NOT EXISTS budget_usage (
+    budget_id INT NOT NULL,
+    period_start DATE NOT NULL,
+    spent DECIMAL(17, 2) NOT NULL DEFAULT 0,
+    tx_count INT NOT NULL DEFAULT 0,
+    alert_level TINYINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (budget_id, period_start),
+    FOREIGN KEY (budget_id) REFERENCES budgets(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Alertas de presupuesto generadas al escribir transacciones (level: 'warning' u 'over')
+CREATE TABLE IF NOT EXISTS budget_alerts (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    budget_id INT NOT NULL,
+    period_start DATE NOT NULL,
+    level VARCHAR(10) NOT NULL,
+    spent DECIMAL(17, 2) NOT NULL,
+    amount_limit DECIMAL(15, 2) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (budget_id) REFERENCES budgets(id) ON DELETE CASCADE,
+    INDEX idx_budget_alert_budget (budget_id, period_start)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Contadores de escritura por recurso ('transactions', 'categories', 'tags', 'imports', 'categorizations', 'tag_deletions'),
+-- usados como versión de los datos para ETag / Last-Modified
+CREATE TABLE IF NOT EXISTS data_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Reglas para inferir comercio y método de pago desde la descripción
+-- (kind: 'merchant' o 'payment_method'; pattern se busca como texto dentro de la descripción; menor priority gana)
+CREATE TABLE IF NOT EXISTS classification_rules (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    kind VARCHAR(20) NOT NULL,
+    pattern VARCHAR(255) NOT NULL,
+    value VARCHAR(255) NOT NULL,
+    priority INT NOT NULL DEFAULT 50,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_classification_rule (kind, pattern)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- Insertar categorías iniciales
 INSERT IGNORE INTO categories (name, description) VALUES
 ('Alimentación', 'Gastos en comida y bebidas'),
@@ -94,4 +188,18 @@ INSERT IGNORE INTO categories (name, description) VALUES
 ('Educación', 'Gastos educativos'),
 ('Otros', 'Otros gastos');
 
-
+-- Migraciones para bases de datos existentes
+-- (db_init ignora los errores de columna/índice duplicado al re-ejecutarse)
+ALTER TABLE imports ADD COLUMN progress TINYINT UNSIGNED DEFAULT 0 AFTER transactions_count;
+ALTER TABLE imports ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP AFTER imported_at;
+ALTER TABLE imports ADD COLUMN content_hash CHAR(64) AFTER progress;
+ALTER TABLE imports ADD INDEX idx_import_content_hash (content_hash);
+ALTER TABLE transactions ADD INDEX idx_transaction_category_date (category_id, transaction_date);
+ALTER TABLE transactions ADD INDEX idx_transaction_payment_date (payment_method, transaction_date);
+ALTER TABLE transactions ADD COLUMN category_source VARCHAR(10) AFTER category_id;
+-- Deduplicación entre cartolas (luego calcular las huellas existentes con: python backfill_fingerprints.py)
+ALTER TABLE transactions ADD COLUMN fingerprint CHAR(40) AFTER raw_data;
+ALTER TABLE transactions ADD UNIQUE INDEX uq_transaction_fingerprint (fingerprint);
+ALTER TABLE imports ADD COLUMN duplicates_count INT DEFAULT 0 AFTER transactions_count;
+-- Búsqueda de texto en descripción y comercio
+ALTER TABLE transactions ADD FULLTEXT INDEX ft_transaction_text (description, merchant);
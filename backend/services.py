@@ -1,17 +1,154 @@
 """Servicios para interactuar con la base de datos"""
-from typing import List, Optional, Dict
-from datetime import date, datetime
+from typing import Iterator, List, Optional, Dict, Tuple
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
 from database import get_db_connection
+from cache import response_cache
+import re
+import json
+import threading
+import base64
+import hashlib
+import unicodedata
 import logging
+import pymysql
 
 logger = logging.getLogger(__name__)
 
+
+def _tag_key(name: str) -> str:
+    """Normaliza un nombre de tag como lo compara la collation utf8mb4_unicode_ci"""
+    decomposed = unicodedata.normalize('NFKD', name.strip())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+class TagIdCache:
+    """
+    Caché en proceso de nombre de tag (normalizado con _tag_key) -> id.
+
+    Solo guarda tags que ya existían antes de la transacción que los resolvió, así un
+    rollback no deja IDs inexistentes. Las entradas valen para una versión de
+    'tag_deletions' en data_versions (TagService.delete la incrementa): si otro proceso
+    eliminó un tag, la versión cambia y el caché se descarta en vez de enlazar un ID
+    que ya no existe (INSERT IGNORE lo omitiría en silencio).
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, int] = {}
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get_many(self, keys, version: int) -> Dict[str, int]:
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            return {key: self._entries[key] for key in keys if key in self._entries}
+
+    def put_many(self, ids: Dict[str, int], version: int):
+        with self._lock:
+            if version == self._version:
+                self._entries.update(ids)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+tag_id_cache = TagIdCache()
+
+
+# Palabras de una búsqueda de texto (sin operadores del modo booleano de FULLTEXT)
+_search_word_pattern = re.compile(r"\w+")
+
+
+def transaction_fingerprint(
+    transaction_date, amount, description: str, account_id: Optional[int], occurrence: int = 0
+) -> str:
+    """
+    Huella de un movimiento para detectar el mismo movimiento en cartolas distintas:
+    fecha, monto con 2 decimales, descripción sin espacios repetidos en mayúsculas y cuenta.
+
+    occurrence numera los movimientos idénticos dentro de una misma cartola (dos cafés
+    iguales el mismo día son 0 y 1): así ambos se guardan, y al re-importar una cartola
+    que se traslapa cada uno calza con su par.
+    """
+    normalized = "|".join((
+        str(transaction_date)[:10],
+        f"{Decimal(str(amount)):.2f}",
+        " ".join(str(description).split()).upper(),
+        str(account_id or 0),
+    ))
+    if occurrence:
+        normalized += f"|#{occurrence}"
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+class DataVersionService:
+    """
+    Contadores de escritura por recurso (tabla data_versions).
+
+    Cada escritura incrementa el contador de lo que modificó dentro de su misma
+    transacción; los endpoints de lectura los usan como versión de los datos
+    (ETag / Last-Modified) sin tener que correr la consulta pesada.
+    """
+
+    @staticmethod
+    def bump(cursor, *names: str):
+        """Incrementa la versión de los recursos indicados"""
+        cursor.executemany("""
+            INSERT INTO data_versions (name, version) VALUES (%s, 1)
+            ON DUPLICATE KEY UPDATE version = version + 1
+        """, [(name,) for name in names])
+
+    @staticmethod
+    def get(*names: str) -> Optional[Dict[str, Dict]]:
+        """
+        Versión y fecha de última modificación (datetime en UTC) de cada recurso.
+        Retorna None si no hay conexión a la base de datos.
+        """
+        conn = get_db_connection()
+        if not conn:
+            return None
+
+        try:
+            with conn.cursor() as cursor:
+                placeholders = ", ".join(["%s"] * len(names))
+                # UNIX_TIMESTAMP no depende de la zona horaria de la sesión (TIMESTAMP se guarda en UTC)
+                cursor.execute(
+                    f"SELECT name, version, UNIX_TIMESTAMP(updated_at) AS updated_epoch "
+                    f"FROM data_versions WHERE name IN ({placeholders})",
+                    names
+                )
+                rows = {row['name']: row for row in cursor.fetchall()}
+                return {
+                    name: {
+                        'version': rows[name]['version'] if name in rows else 0,
+                        'updated_at': (
+                            datetime.fromtimestamp(int(rows[name]['updated_epoch']), timezone.utc)
+                            if name in rows and rows[name]['updated_epoch'] is not None else None
+                        ),
+                    }
+                    for name in names
+                }
+        finally:
+            conn.close()
+
+
 class TransactionService:
     """Servicio para operaciones con transacciones"""
     
+    # Campos que entran en transaction_fingerprint
+    FINGERPRINT_COLUMNS = ('transaction_date', 'amount', 'description', 'account_id')
+    
     @staticmethod
     def create_transaction(transaction_data: dict, tags: List[str] = None) -> int:
-        """Crea una transacción y retorna su ID"""
+        """
+        Crea una transacción y retorna su ID.
+
+        También lleva huella (con la primera ocurrencia libre), de modo que importar
+        después la cartola que contiene un movimiento ingresado a mano no lo duplica.
+        """
         conn = get_db_connection()
         if not conn:
             raise Exception("No se pudo conectar a la base de datos")
@@ -21,8 +158,8 @@ class TransactionService:
                 sql = """
                     INSERT INTO transactions 
                     (account_id, import_id, transaction_date, description, merchant, 
-                     amount, category_id, payment_method, raw_data)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                     amount, category_id, payment_method, raw_data, category_source, fingerprint)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """
                 cursor.execute(sql, (
                     transaction_data.get('account_id'),
@@ -33,183 +170,1450 @@ class TransactionService:
                     transaction_data.get('amount'),
                     transaction_data.get('category_id'),
                     transaction_data.get('payment_method'),
-                    transaction_data.get('raw_data')
+                    transaction_data.get('raw_data'),
+                    'manual' if transaction_data.get('category_id') else None,
+                    TransactionService._free_fingerprint(cursor, transaction_data)
                 ))
                 transaction_id = cursor.lastrowid
                 
                 # Agregar etiquetas si existen
                 if tags:
-                    TransactionService._add_tags_to_transaction(cursor, transaction_id, tags)
+                    TransactionService._link_tags(cursor, [(transaction_id, name) for name in tags])
+                
+                RollupService.apply(cursor, [RollupService.key_of(transaction_data)], 1)
+                # Una categoría asignada a mano es un ejemplo nuevo para el categorizador
+                versions = ["transactions"]
+                if tags:
+                    versions.append("tags")
+                if transaction_data.get('category_id'):
+                    versions.append("categorizations")
+                DataVersionService.bump(cursor, *versions)
+                conn.commit()
+                response_cache.invalidate("stats", days=[transaction_data.get('transaction_date')])
+                if tags:
+                    response_cache.invalidate("tags")
+                return transaction_id
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _free_fingerprint(cursor, tx: dict, batch: int = 10, exclude_id: Optional[int] = None) -> str:
+        """
+        Huella de la primera ocurrencia que aún no existe para este movimiento.
+        Bloquea los valores consultados del índice único hasta el commit.
+        exclude_id ignora la propia fila al recalcular la huella de una transacción editada.
+        """
+        args = (tx.get('transaction_date'), tx.get('amount'), tx.get('description'), tx.get('account_id'))
+        start = 0
+        while True:
+            candidates = [transaction_fingerprint(*args, occurrence) for occurrence in range(start, start + batch)]
+            placeholders = ", ".join(["%s"] * len(candidates))
+            sql = f"SELECT fingerprint FROM transactions WHERE fingerprint IN ({placeholders})"
+            params = list(candidates)
+            if exclude_id is not None:
+                sql += " AND id <> %s"
+                params.append(exclude_id)
+            cursor.execute(sql + " FOR UPDATE", params)
+            taken = {row['fingerprint'] for row in cursor.fetchall()}
+            for fingerprint in candidates:
+                if fingerprint not in taken:
+                    return fingerprint
+            start += batch
+
+    @staticmethod
+    def bulk_create(transactions: List[dict], import_id: Optional[int] = None, conn=None) -> Dict:
+        """
+        Crea muchas transacciones en una sola transacción de base de datos.
+
+        Las filas se insertan con executemany (INSERT multi-fila) y las etiquetas
+        se resuelven en bloque. Una fila inválida no aborta el lote: se reporta
+        en 'failed' con su índice y el error.
+
+        Cada fila lleva su huella (transaction_fingerprint) con índice único: las que ya
+        existen (p.ej. el mismo movimiento en cartolas que se traslapan) no se insertan y
+        se cuentan en 'duplicates'. Un lote es una cartola: los movimientos idénticos dentro
+        de él son movimientos distintos y se numeran con occurrence.
+
+        Si se pasa conn, se usa esa conexión (el llamador la cierra), lo que permite
+        compartirla entre varios lotes; cada llamada hace su propio commit.
+
+        Returns:
+            {'created': int, 'ids': List[int], 'failed': [{'index', 'error'}], 'duplicates': int}
+        """
+        failed = []
+        valid = []  # (índice original, fila, tags)
+        occurrences = {}  # huella base -> veces vista en el lote
+        for index, tx in enumerate(transactions):
+            error = TransactionService._validate_row(tx)
+            if error:
+                failed.append({'index': index, 'error': error})
+                continue
+            tags = [t.strip() for t in (tx.get('tags') or []) if t and t.strip()]
+            params = TransactionService._row_params(tx, import_id)
+            occurrence = occurrences.get(params[-1], 0)
+            occurrences[params[-1]] = occurrence + 1
+            if occurrence:
+                params = params[:-1] + (transaction_fingerprint(
+                    tx.get('transaction_date'), tx.get('amount'), params[3], tx.get('account_id'), occurrence
+                ),)
+            valid.append((index, params, tags))
+
+        if not valid:
+            return {'created': 0, 'ids': [], 'failed': failed, 'duplicates': 0}
+
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db_connection()
+        if not conn:
+            raise Exception("No se pudo conectar a la base de datos")
+
+        try:
+            with conn.cursor() as cursor:
+                # Descartar movimientos ya guardados (búsqueda por índice único)
+                unique = TransactionService._skip_duplicates(cursor, valid)
+                rejected_before = len(failed)
+                ids, inserted = [], []
+                if unique and import_id is None and any(tags for _, _, tags in unique):
+                    # Sin import_id no hay forma fiable de mapear IDs de un INSERT multi-fila
+                    ids, inserted = TransactionService._insert_rows_individually(cursor, unique, failed)
+                elif unique:
+                    cursor.execute("SAVEPOINT bulk_insert")
+                    try:
+                        cursor.executemany(TransactionService._INSERT_SQL, [params for _, params, _ in unique])
+                        if cursor.rowcount == len(unique):
+                            ids = TransactionService._fetch_inserted_ids(cursor, import_id, len(unique))
+                            inserted = unique
+                        else:
+                            # Otro import guardó alguna de estas filas entre la búsqueda y el INSERT:
+                            # rehacer fila a fila para saber cuáles quedaron
+                            cursor.execute("ROLLBACK TO SAVEPOINT bulk_insert")
+                            ids, inserted = TransactionService._insert_rows_individually(cursor, unique, failed)
+                    except pymysql.MySQLError as e:
+                        # Alguna fila rompió el INSERT multi-fila: aislar las culpables fila a fila
+                        logger.warning(f"Inserción masiva falló ({e}), reintentando fila a fila")
+                        cursor.execute("ROLLBACK TO SAVEPOINT bulk_insert")
+                        ids, inserted = TransactionService._insert_rows_individually(cursor, unique, failed)
+                # Lo que no se insertó ni falló era un duplicado
+                duplicates = len(valid) - len(inserted) - (len(failed) - rejected_before)
+
+                tag_links = [
+                    (transaction_id, tag_name)
+                    for transaction_id, (_, _, tags) in zip(ids, inserted)
+                    for tag_name in tags
+                ]
+                if tag_links:
+                    TransactionService._link_tags(cursor, tag_links)
+
+                RollupService.apply(cursor, [RollupService.key_of_params(params) for _, params, _ in inserted], 1)
+                DataVersionService.bump(cursor, "transactions", *(["tags"] if tag_links else []))
+                conn.commit()
+                response_cache.invalidate("stats", days=[params[2] for _, params, _ in inserted])
+                if tag_links:
+                    response_cache.invalidate("tags")
+                failed.sort(key=lambda f: f['index'])
+                return {'created': len(inserted), 'ids': ids, 'failed': failed, 'duplicates': duplicates}
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if own_conn:
+                conn.close()
+
+    # Un duplicado por huella no se inserta ni falla (0 filas afectadas)
+    _INSERT_SQL = """
+        INSERT INTO transactions
+        (account_id, import_id, transaction_date, description, merchant,
+         amount, category_id, payment_method, raw_data, category_source, fingerprint)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE id = id
+    """
+
+    @staticmethod
+    def _validate_row(tx: dict) -> Optional[str]:
+        """Valida una fila antes de insertarla; retorna el error o None"""
+        if not tx.get('transaction_date'):
+            return "Falta transaction_date"
+        if not tx.get('description'):
+            return "Falta description"
+        try:
+            float(tx.get('amount'))
+        except (TypeError, ValueError):
+            return f"Monto inválido: {tx.get('amount')!r}"
+        return None
+
+    @staticmethod
+    def _row_params(tx: dict, import_id: Optional[int]) -> tuple:
+        """Parámetros del INSERT para una fila (la huella va al final)"""
+        description = str(tx.get('description'))[:500]
+        return (
+            tx.get('account_id'),
+            import_id if import_id is not None else tx.get('import_id'),
+            tx.get('transaction_date'),
+            description,
+            tx.get('merchant'),
+            tx.get('amount'),
+            tx.get('category_id'),
+            tx.get('payment_method'),
+            tx.get('raw_data'),
+            tx.get('category_source') or ('manual' if tx.get('category_id') else None),
+            transaction_fingerprint(tx.get('transaction_date'), tx.get('amount'), description, tx.get('account_id')),
+        )
+
+    @staticmethod
+    def _skip_duplicates(cursor, rows: List[tuple], chunk_size: int = 1000) -> List[tuple]:
+        """
+        Filtra las filas (índice, parámetros, tags) cuya huella ya existe en transactions.
+        La búsqueda usa el índice único de la huella.
+        """
+        fingerprints = [row[1][-1] for row in rows]
+        existing = set()
+        for start in range(0, len(fingerprints), chunk_size):
+            chunk = fingerprints[start:start + chunk_size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"SELECT fingerprint FROM transactions WHERE fingerprint IN ({placeholders})", chunk)
+            existing.update(row['fingerprint'] for row in cursor.fetchall())
+        return [row for row in rows if row[1][-1] not in existing]
+
+    @staticmethod
+    def _insert_rows_individually(cursor, rows: List[tuple], failed: List[dict]):
+        """
+        Inserta fila a fila, registrando en failed las que MySQL rechace.
+        Las filas duplicadas (0 filas afectadas) no quedan ni en inserted ni en failed.
+        """
+        ids, inserted = [], []
+        for index, params, tags in rows:
+            try:
+                if not cursor.execute(TransactionService._INSERT_SQL, params):
+                    continue
+                ids.append(cursor.lastrowid)
+                inserted.append((index, params, tags))
+            except pymysql.MySQLError as e:
+                failed.append({'index': index, 'error': str(e)})
+        return ids, inserted
+
+    @staticmethod
+    def _fetch_inserted_ids(cursor, import_id: Optional[int], count: int) -> List[int]:
+        """
+        Recupera los IDs de las filas recién insertadas, en orden de inserción.
+        Las filas de este lote son las últimas del import, así que basta un SELECT.
+        """
+        if import_id is None:
+            return []
+        cursor.execute(
+            "SELECT id FROM transactions WHERE import_id = %s ORDER BY id DESC LIMIT %s",
+            (import_id, count)
+        )
+        return [row['id'] for row in reversed(cursor.fetchall())]
+
+    @staticmethod
+    def _resolve_tag_ids(cursor, names, create: bool = True) -> Dict[str, int]:
+        """
+        Obtiene (y con create, crea) los tags indicados. Los que no están en tag_id_cache
+        se resuelven con un INSERT IGNORE multi-fila y un SELECT ... IN.
+        El resultado está indexado por _tag_key(), igual que compara MySQL.
+        """
+        by_key = {}
+        for name in sorted({name.strip() for name in names if name and name.strip()}):
+            by_key.setdefault(_tag_key(name), name)
+        if not by_key:
+            return {}
+        cursor.execute("SELECT version FROM data_versions WHERE name = 'tag_deletions'")
+        row = cursor.fetchone()
+        version = row['version'] if row else 0
+        resolved = tag_id_cache.get_many(by_key, version)
+        missing = [name for key, name in by_key.items() if key not in resolved]
+        if not missing:
+            return resolved
+        
+        created = 0
+        if create:
+            cursor.executemany("INSERT IGNORE INTO tags (name) VALUES (%s)", [(n,) for n in missing])
+            created = cursor.rowcount
+        placeholders = ", ".join(["%s"] * len(missing))
+        cursor.execute(f"SELECT id, name FROM tags WHERE name IN ({placeholders})", missing)
+        found = {_tag_key(row['name']): row['id'] for row in cursor.fetchall()}
+        if created == 0:
+            # Todos existían antes de esta transacción
+            tag_id_cache.put_many(found, version)
+        resolved.update(found)
+        return resolved
+
+    @staticmethod
+    def _link_tags(cursor, links: List[Tuple[int, str]]) -> int:
+        """
+        Relaciona transacciones con tags: [(transaction_id, nombre del tag)], creando los
+        tags que falten. Retorna cuántas relaciones nuevas se agregaron.
+        """
+        tag_ids = TransactionService._resolve_tag_ids(cursor, {name for _, name in links})
+        rows = {
+            (transaction_id, tag_ids[_tag_key(name)])
+            for transaction_id, name in links
+            if name and name.strip()
+        }
+        if not rows:
+            return 0
+        cursor.executemany(
+            "INSERT IGNORE INTO transaction_tags (transaction_id, tag_id) VALUES (%s, %s)", sorted(rows)
+        )
+        return cursor.rowcount
+
+    @staticmethod
+    def _replace_tags(cursor, transaction_id: int, tags: List[str]):
+        """Deja a la transacción exactamente con estos tags (sin borrar y re-crear los que se mantienen)"""
+        tag_ids = sorted(set(TransactionService._resolve_tag_ids(cursor, tags).values()))
+        if tag_ids:
+            placeholders = ", ".join(["%s"] * len(tag_ids))
+            cursor.execute(
+                f"DELETE FROM transaction_tags WHERE transaction_id = %s AND tag_id NOT IN ({placeholders})",
+                [transaction_id, *tag_ids]
+            )
+            cursor.executemany(
+                "INSERT IGNORE INTO transaction_tags (transaction_id, tag_id) VALUES (%s, %s)",
+                [(transaction_id, tag_id) for tag_id in tag_ids]
+            )
+        else:
+            cursor.execute("DELETE FROM transaction_tags WHERE transaction_id = %s", (transaction_id,))
+
+    @staticmethod
+    def bulk_tag(
+        transaction_ids: List[int],
+        add: Optional[List[str]] = None,
+        remove: Optional[List[str]] = None,
+        chunk_size: int = 1000
+    ) -> Dict:
+        """
+        Agrega y/o quita tags a muchas transacciones en una sola transacción de base de datos.
+        Los tags a agregar que no existen se crean; los IDs de transacciones inexistentes
+        se ignoran.
+
+        Returns:
+            {'added': int, 'removed': int} (relaciones agregadas y eliminadas)
+        """
+        add = [name for name in (add or []) if name and name.strip()]
+        remove = [name for name in (remove or []) if name and name.strip()]
+        if {_tag_key(name) for name in add} & {_tag_key(name) for name in remove}:
+            raise ValueError("Un mismo tag no puede agregarse y quitarse a la vez")
+        transaction_ids = sorted(set(transaction_ids))
+        if not transaction_ids or not (add or remove):
+            return {'added': 0, 'removed': 0}
+        
+        conn = get_db_connection()
+        if not conn:
+            raise Exception("No se pudo conectar a la base de datos")
+        
+        added = removed = 0
+        try:
+            with conn.cursor() as cursor:
+                add_ids = sorted(set(TransactionService._resolve_tag_ids(cursor, add).values()))
+                remove_ids = sorted(set(TransactionService._resolve_tag_ids(cursor, remove, create=False).values()))
+                for start in range(0, len(transaction_ids), chunk_size):
+                    chunk = transaction_ids[start:start + chunk_size]
+                    if remove_ids:
+                        cursor.execute(f"""
+                            DELETE FROM transaction_tags
+                            WHERE transaction_id IN ({", ".join(["%s"] * len(chunk))})
+                              AND tag_id IN ({", ".join(["%s"] * len(remove_ids))})
+                        """, [*chunk, *remove_ids])
+                        removed += cursor.rowcount
+                    if add_ids:
+                        # INSERT IGNORE también omite los IDs de transacción que no existen (FK)
+                        cursor.executemany(
+                            "INSERT IGNORE INTO transaction_tags (transaction_id, tag_id) VALUES (%s, %s)",
+                            [(transaction_id, tag_id) for transaction_id in chunk for tag_id in add_ids]
+                        )
+                        added += cursor.rowcount
+                if added or removed:
+                    DataVersionService.bump(cursor, "transactions", "tags")
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        if added or removed:
+            response_cache.invalidate("tags", "stats")
+        return {'added': added, 'removed': removed}
+    
+    # Página de get_transactions (bench_transactions.py revisa su plan con EXPLAIN)
+    _PAGE_SQL = """
+        SELECT 
+            t.id, t.account_id, t.transaction_date, t.description, 
+            t.merchant, t.amount, t.category_id, t.payment_method,
+            t.created_at, t.updated_at,
+            c.name as category_name
+        FROM transactions t
+        LEFT JOIN categories c ON t.category_id = c.id
+        {where_clause}
+        ORDER BY t.transaction_date DESC, t.id DESC
+        LIMIT %s OFFSET %s
+    """
+
+    @staticmethod
+    def get_transactions(
+        category_id: Optional[int] = None,
+        payment_method: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        limit: int = 1000,
+        offset: int = 0,
+        after: Optional[Tuple[date, int]] = None
+    ) -> List[Dict]:
+        """
+        Obtiene transacciones con filtros opcionales.
+        after: (transaction_date, id) de la última fila de la página anterior (paginación por cursor);
+        si se entrega, offset se ignora.
+        """
+        conn = get_db_connection()
+        if not conn:
+            return []
+        
+        try:
+            with conn.cursor() as cursor:
+                conditions, params = TransactionService._filter_conditions(
+                    category_id, payment_method, start_date, end_date, after
+                )
+                if after:
+                    offset = 0
+                
+                where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+                
+                # 1) Página de transacciones por el índice de fecha, sin el join de tags
+                sql = TransactionService._PAGE_SQL.format(where_clause=where_clause)
+                params.extend([limit, offset])
+                
+                cursor.execute(sql, params)
+                transactions = [dict(row) for row in cursor.fetchall()]
+                
+                # 2) Tags de solo esas transacciones, en una consulta
+                TransactionService._attach_tags(cursor, transactions)
+                
+                for transaction in transactions:
+                    # Asegurar que todos los campos requeridos estén presentes
+                    if 'created_at' not in transaction:
+                        transaction['created_at'] = datetime.now()
+                    if 'updated_at' not in transaction:
+                        transaction['updated_at'] = datetime.now()
+                
+                return transactions
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def search(
+        query: str,
+        category_id: Optional[int] = None,
+        payment_method: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> List[Dict]:
+        """
+        Busca transacciones por descripción y comercio con el índice FULLTEXT.
+
+        Cada palabra es obligatoria y se busca como prefijo ("rapp" encuentra "RAPPI").
+        Los resultados vienen ordenados por relevancia (score) y luego por fecha, y se
+        pueden combinar con los mismos filtros de get_transactions.
+        """
+        words = _search_word_pattern.findall(query or "")
+        if not words:
+            raise ValueError("La búsqueda debe contener al menos una palabra")
+        boolean_query = " ".join(f"+{word}*" for word in words)
+
+        conn = get_db_connection()
+        if not conn:
+            return []
+        
+        try:
+            with conn.cursor() as cursor:
+                conditions, params = TransactionService._filter_conditions(
+                    category_id, payment_method, start_date, end_date
+                )
+                conditions.insert(0, "MATCH(t.description, t.merchant) AGAINST (%s IN BOOLEAN MODE)")
+                sql = f"""
+                    SELECT 
+                        t.id, t.account_id, t.transaction_date, t.description, 
+                        t.merchant, t.amount, t.category_id, t.payment_method,
+                        t.created_at, t.updated_at,
+                        c.name as category_name,
+                        MATCH(t.description, t.merchant) AGAINST (%s IN BOOLEAN MODE) AS score
+                    FROM transactions t
+                    LEFT JOIN categories c ON t.category_id = c.id
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY score DESC, t.transaction_date DESC, t.id DESC
+                    LIMIT %s OFFSET %s
+                """
+                cursor.execute(sql, [boolean_query, boolean_query, *params, limit, offset])
+                transactions = [dict(row) for row in cursor.fetchall()]
+                for transaction in transactions:
+                    transaction['score'] = round(float(transaction['score']), 4)
+                
+                TransactionService._attach_tags(cursor, transactions)
+                return transactions
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _filter_conditions(
+        category_id: Optional[int] = None,
+        payment_method: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        after: Optional[Tuple[date, int]] = None
+    ) -> Tuple[List[str], List]:
+        """Condiciones WHERE (sobre el alias t) y parámetros de los filtros de transacciones"""
+        conditions = []
+        params = []
+        
+        if category_id:
+            conditions.append("t.category_id = %s")
+            params.append(category_id)
+        
+        if payment_method:
+            conditions.append("t.payment_method = %s")
+            params.append(payment_method)
+        
+        if start_date:
+            conditions.append("t.transaction_date >= %s")
+            params.append(start_date)
+        
+        if end_date:
+            conditions.append("t.transaction_date <= %s")
+            params.append(end_date)
+        
+        if after:
+            # Keyset: continuar justo después de la última fila vista, usando el índice por fecha.
+            # Forma expandida: MySQL no usa el constructor de fila (a, b) < (x, y) como rango
+            after_date, after_id = after
+            conditions.append("(t.transaction_date < %s OR (t.transaction_date = %s AND t.id < %s))")
+            params.extend([after_date, after_date, after_id])
+        
+        return conditions, params
+    
+    @staticmethod
+    def iter_transactions(
+        category_id: Optional[int] = None,
+        payment_method: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        batch_size: int = 500
+    ) -> Iterator[Dict]:
+        """
+        Recorre las transacciones filtradas (mismo orden que get_transactions) con un
+        cursor sin buffer: las filas llegan desde MySQL a medida que se consumen, así
+        que la memoria no depende de la cantidad de filas.
+        Los tags vienen en la misma fila (subconsulta por transacción) porque la conexión
+        queda ocupada por el cursor hasta terminar.
+
+        La conexión se obtiene y la consulta se ejecuta al llamar (no al empezar a iterar):
+        los errores se lanzan aquí, antes de que un StreamingResponse envíe el 200.
+        """
+        rows = TransactionService._stream_transactions(
+            category_id, payment_method, start_date, end_date, batch_size
+        )
+        next(rows)  # Ejecuta la consulta
+        return rows
+    
+    @staticmethod
+    def _stream_transactions(
+        category_id: Optional[int],
+        payment_method: Optional[str],
+        start_date: Optional[date],
+        end_date: Optional[date],
+        batch_size: int
+    ) -> Iterator[Optional[Dict]]:
+        """Generador de iter_transactions: primero entrega None (consulta ejecutada) y luego las filas"""
+        conn = get_db_connection()
+        if not conn:
+            raise Exception("No se pudo conectar a la base de datos")
+        
+        conditions, params = TransactionService._filter_conditions(
+            category_id, payment_method, start_date, end_date
+        )
+        where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+        exhausted = False
+        cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+        try:
+            cursor.execute(f"""
+                SELECT 
+                    t.id, t.account_id, t.transaction_date, t.description, 
+                    t.merchant, t.amount, t.category_id, t.payment_method,
+                    t.created_at, t.updated_at,
+                    c.name as category_name,
+                    (SELECT JSON_ARRAYAGG(tg.name)
+                     FROM transaction_tags tt JOIN tags tg ON tg.id = tt.tag_id
+                     WHERE tt.transaction_id = t.id) as tags
+                FROM transactions t
+                LEFT JOIN categories c ON t.category_id = c.id
+                {where_clause}
+                ORDER BY t.transaction_date DESC, t.id DESC
+            """, params)
+            yield None
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    exhausted = True
+                    break
+                for row in rows:
+                    row['tags'] = sorted(json.loads(row['tags'])) if row['tags'] else []
+                    yield row
+        finally:
+            if exhausted:
+                cursor.close()
+                conn.close()
+            else:
+                # Export interrumpido: descartar la conexión en vez de leer el resto del resultado
+                conn.invalidate()
+    
+    @staticmethod
+    def _attach_tags(cursor, transactions: List[Dict]):
+        """Agrega a cada transacción la lista de nombres de sus tags"""
+        by_id = {}
+        for transaction in transactions:
+            transaction['tags'] = []
+            by_id[transaction['id']] = transaction
+        if not by_id:
+            return
+        
+        placeholders = ", ".join(["%s"] * len(by_id))
+        cursor.execute(f"""
+            SELECT tt.transaction_id, tg.name
+            FROM transaction_tags tt
+            JOIN tags tg ON tg.id = tt.tag_id
+            WHERE tt.transaction_id IN ({placeholders})
+            ORDER BY tt.transaction_id, tg.name
+        """, list(by_id))
+        for row in cursor.fetchall():
+            by_id[row['transaction_id']]['tags'].append(row['name'])
+    
+    @staticmethod
+    def get_transactions_page(
+        category_id: Optional[int] = None,
+        payment_method: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        limit: int = 1000,
+        cursor: Optional[str] = None
+    ) -> Dict:
+        """
+        Página de transacciones por cursor (mismo orden que get_transactions).
+        Cada página cuesta lo mismo sin importar su profundidad.
+
+        Returns:
+            {'transactions': [...], 'next_cursor': cursor de la siguiente página o None}
+        """
+        after = TransactionService.decode_cursor(cursor) if cursor else None
+        # Pedir una fila extra para saber si hay más páginas
+        rows = TransactionService.get_transactions(
+            category_id=category_id,
+            payment_method=payment_method,
+            start_date=start_date,
+            end_date=end_date,
+            limit=limit + 1,
+            after=after
+        )
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = TransactionService.encode_cursor(rows[-1]['transaction_date'], rows[-1]['id'])
+        return {"transactions": rows, "next_cursor": next_cursor}
+    
+    @staticmethod
+    def encode_cursor(transaction_date: date, transaction_id: int) -> str:
+        """Cursor opaco para la posición (transaction_date, id)"""
+        raw = f"{transaction_date.isoformat()}|{transaction_id}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[date, int]:
+        """Decodifica un cursor de encode_cursor; lanza ValueError si no es válido"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            transaction_date, transaction_id = raw.split("|")
+            return date.fromisoformat(transaction_date), int(transaction_id)
+        except Exception:
+            raise ValueError("Cursor inválido")
+    
+    @staticmethod
+    def update_transaction(transaction_id: int, updates: dict) -> bool:
+        """Actualiza una transacción"""
+        conn = get_db_connection()
+        if not conn:
+            return False
+        
+        try:
+            with conn.cursor() as cursor:
+                set_clauses = []
+                params = []
+                
+                for key, value in updates.items():
+                    if key != 'tags':
+                        set_clauses.append(f"{key} = %s")
+                        params.append(value)
+                
+                # Una categoría asignada a mano pasa a ser ejemplo de entrenamiento del categorizador
+                versions = ["transactions"]
+                if 'category_id' in updates:
+                    set_clauses.append("category_source = %s")
+                    params.append('manual' if updates['category_id'] else None)
+                    versions.append("categorizations")
+                
+                # Si cambia un campo de la huella, recalcularla para que siga detectando duplicados
+                if any(key in TransactionService.FINGERPRINT_COLUMNS for key in updates):
+                    cursor.execute(f"""
+                        SELECT {", ".join(TransactionService.FINGERPRINT_COLUMNS)}
+                        FROM transactions WHERE id = %s
+                        FOR UPDATE
+                    """, (transaction_id,))
+                    current = cursor.fetchone()
+                    if current:
+                        merged = {**current, **{
+                            key: value for key, value in updates.items()
+                            if key in TransactionService.FINGERPRINT_COLUMNS
+                        }}
+                        set_clauses.append("fingerprint = %s")
+                        params.append(TransactionService._free_fingerprint(cursor, merged, exclude_id=transaction_id))
+                
+                before = RollupService.fetch_keys(cursor, [transaction_id])
+                changed_days = [key[0] for key in before]
+                
+                if set_clauses:
+                    sql = f"UPDATE transactions SET {', '.join(set_clauses)} WHERE id = %s"
+                    params.append(transaction_id)
+                    cursor.execute(sql, params)
+                    
+                    # Si cambia alguna dimensión de los rollups, mover la fila de un grupo a otro
+                    if before and any(key in RollupService.COLUMNS for key in updates):
+                        after = RollupService.fetch_keys(cursor, [transaction_id])
+                        RollupService.apply(cursor, before, -1)
+                        RollupService.apply(cursor, after, 1)
+                        changed_days += [key[0] for key in after]
+                    DataVersionService.bump(cursor, *versions)
+                    conn.commit()
+                
+                # Actualizar tags si se proporcionan
+                if 'tags' in updates:
+                    TransactionService._replace_tags(cursor, transaction_id, updates['tags'] or [])
+                    DataVersionService.bump(cursor, "transactions", "tags")
+                    conn.commit()
+                    response_cache.invalidate("tags")
+                
+                response_cache.invalidate("stats", days=changed_days)
+                return True
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def backfill_fingerprints() -> Dict:
+        """
+        Calcula la huella de las transacciones importadas que no la tienen (anteriores a
+        la columna), una importación a la vez y con la misma numeración de movimientos
+        idénticos que bulk_create. Si la huella ya existe (el movimiento se guardó antes
+        desde otra cartola), la fila queda sin huella para no romper el índice único.
+        Las transacciones manuales anteriores a la columna quedan sin huella.
+
+        Returns:
+            {'updated': int, 'duplicates': int}
+        """
+        conn = get_db_connection()
+        if not conn:
+            raise Exception("No se pudo conectar a la base de datos")
+
+        updated = duplicates = 0
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT DISTINCT import_id FROM transactions
+                    WHERE fingerprint IS NULL AND import_id IS NOT NULL
+                    ORDER BY import_id
+                """)
+                import_ids = [row['import_id'] for row in cursor.fetchall()]
+                for import_id in import_ids:
+                    cursor.execute("""
+                        SELECT id, transaction_date, amount, description, account_id
+                        FROM transactions
+                        WHERE import_id = %s AND fingerprint IS NULL
+                        ORDER BY id
+                    """, (import_id,))
+                    candidates = []
+                    occurrences = {}
+                    for row in cursor.fetchall():
+                        args = (row['transaction_date'], row['amount'], row['description'], row['account_id'])
+                        base = transaction_fingerprint(*args)
+                        occurrence = occurrences.get(base, 0)
+                        occurrences[base] = occurrence + 1
+                        candidates.append((row['id'], (transaction_fingerprint(*args, occurrence),), None))
+
+                    unique = TransactionService._skip_duplicates(cursor, candidates)
+                    cursor.executemany(
+                        "UPDATE transactions SET fingerprint = %s WHERE id = %s",
+                        [(params[-1], transaction_id) for transaction_id, params, _ in unique]
+                    )
+                    conn.commit()
+                    updated += len(unique)
+                    duplicates += len(candidates) - len(unique)
+                return {'updated': updated, 'duplicates': duplicates}
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def recategorize(
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        include_auto: bool = True,
+        dry_run: bool = False,
+        chunk_size: int = 1000
+    ) -> Dict:
+        """
+        Re-categoriza en bloque con el categorizador automático.
+
+        Nunca toca las categorías asignadas a mano: evalúa las transacciones sin categoría
+        y, con include_auto, las categorizadas automáticamente. Recorre por id en bloques
+        (una transacción de base de datos por bloque) y actualiza los rollups de las filas
+        que cambian.
+
+        Returns:
+            {'evaluated': int, 'updated': int, 'unchanged': int, 'dry_run': bool}
+        """
+        from categorizer import get_categorizer
+
+        categorizer = get_categorizer()
+        conn = get_db_connection()
+        if not conn:
+            raise Exception("No se pudo conectar a la base de datos")
+
+        sources = "t.category_id IS NULL" + (" OR t.category_source = 'auto'" if include_auto else "")
+        conditions = [f"({sources})", "t.id > %s"]
+        params: list = []
+        if start_date:
+            conditions.append("t.transaction_date >= %s")
+            params.append(start_date)
+        if end_date:
+            conditions.append("t.transaction_date <= %s")
+            params.append(end_date)
+        sql = f"""
+            SELECT t.id, t.description, t.merchant, t.category_id
+            FROM transactions t
+            WHERE {" AND ".join(conditions)}
+            ORDER BY t.id
+            LIMIT %s
+        """
+
+        evaluated = updated = 0
+        changed_days = set()
+        last_id = 0
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT id FROM categories")
+                category_ids = {row['id'] for row in cursor.fetchall()}
+                while True:
+                    cursor.execute(sql, [last_id, *params, chunk_size])
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    last_id = rows[-1]['id']
+                    evaluated += len(rows)
+
+                    predictions = categorizer.predict(
+                        ((row['description'], row['merchant']) for row in rows), category_ids
+                    )
+                    changes = [
+                        (category_id, 'auto' if category_id else None, row['id'])
+                        for row, category_id in zip(rows, predictions)
+                        if category_id != row['category_id']
+                    ]
+                    if not changes or dry_run:
+                        updated += len(changes)
+                        continue
+
+                    ids = [transaction_id for _, _, transaction_id in changes]
+                    before = RollupService.fetch_keys(cursor, ids)
+                    cursor.executemany(
+                        "UPDATE transactions SET category_id = %s, category_source = %s WHERE id = %s",
+                        changes
+                    )
+                    after = RollupService.fetch_keys(cursor, ids)
+                    RollupService.apply(cursor, before, -1)
+                    RollupService.apply(cursor, after, 1)
+                    DataVersionService.bump(cursor, "transactions")
+                    conn.commit()
+                    updated += len(changes)
+                    changed_days.update(key[0] for key in before)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        if changed_days:
+            response_cache.invalidate("stats", days=changed_days)
+        return {'evaluated': evaluated, 'updated': updated, 'unchanged': evaluated - updated, 'dry_run': dry_run}
+    
+    @staticmethod
+    def delete_transaction(transaction_id: int) -> bool:
+        """Elimina una transacción"""
+        conn = get_db_connection()
+        if not conn:
+            return False
+        
+        try:
+            with conn.cursor() as cursor:
+                # Verificar que la transacción existe
+                keys = RollupService.fetch_keys(cursor, [transaction_id])
+                if not keys:
+                    return False
+                
+                # Eliminar la transacción (las relaciones con tags se eliminan automáticamente por CASCADE)
+                cursor.execute("DELETE FROM transactions WHERE id = %s", (transaction_id,))
+                RollupService.apply(cursor, keys, -1)
+                DataVersionService.bump(cursor, "transactions")
+                conn.commit()
+                response_cache.invalidate("stats", days=[key[0] for key in keys])
+                return True
+        finally:
+            conn.close()
+
+class RollupService:
+    """
+    Rollups diarios de transacciones (tabla daily_rollups).
+
+    Cada fila acumula suma y cantidad por fecha × categoría × comercio × método de pago × cuenta.
+    Se mantienen en la misma transacción de base de datos que cada escritura sobre
+    transactions, de modo que las estadísticas leen días en lugar de filas.
+    Los valores NULL se guardan como 0 / '' porque forman parte de la clave primaria.
+    """
+    
+    # Columnas de transactions que determinan el grupo de una fila
+    COLUMNS = ('transaction_date', 'category_id', 'merchant', 'payment_method', 'account_id', 'amount')
+    
+    _UPSERT_SQL = """
+        INSERT INTO daily_rollups (rollup_date, category_id, merchant, payment_method, account_id, total, tx_count)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE total = total + VALUES(total), tx_count = tx_count + VALUES(tx_count)
+    """
+    
+    @staticmethod
+    def key_of(tx: dict) -> tuple:
+        """(fecha, categoría, comercio, método de pago, cuenta, monto) de una transacción en dict"""
+        return tuple(tx.get(column) for column in RollupService.COLUMNS)
+    
+    @staticmethod
+    def key_of_params(params: tuple) -> tuple:
+        """Lo mismo que key_of, a partir de los parámetros de TransactionService._INSERT_SQL"""
+        return (params[2], params[6], params[4], params[7], params[0], params[5])
+    
+    @staticmethod
+    def fetch_keys(cursor, transaction_ids: List[int]) -> List[tuple]:
+        """Lee (y bloquea) las dimensiones actuales de las transacciones indicadas"""
+        if not transaction_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(transaction_ids))
+        cursor.execute(f"""
+            SELECT {", ".join(RollupService.COLUMNS)}
+            FROM transactions WHERE id IN ({placeholders})
+            FOR UPDATE
+        """, list(transaction_ids))
+        return [RollupService.key_of(row) for row in cursor.fetchall()]
+    
+    @staticmethod
+    def apply(cursor, keys: List[tuple], sign: int):
+        """
+        Suma (sign=1) o resta (sign=-1) transacciones a sus rollups.
+        Las filas se agrupan en Python y se escriben con un solo INSERT ... ON DUPLICATE KEY UPDATE.
+        """
+        groups = {}
+        for transaction_date, category_id, merchant, payment_method, account_id, amount in keys:
+            if isinstance(transaction_date, str):
+                transaction_date = date.fromisoformat(transaction_date[:10])
+            group = (transaction_date, category_id or 0, (merchant or '')[:255], payment_method or '', account_id or 0)
+            total, count = groups.get(group, (Decimal(0), 0))
+            groups[group] = (total + Decimal(str(amount or 0)), count + 1)
+        if not groups:
+            return
+        
+        cursor.executemany(RollupService._UPSERT_SQL, [
+            (*group, sign * total, sign * count) for group, (total, count) in groups.items()
+        ])
+        BudgetService.apply(cursor, groups, sign)
+        if sign < 0:
+            # Quitar grupos que quedaron vacíos
+            dates = sorted({group[0] for group in groups})
+            placeholders = ", ".join(["%s"] * len(dates))
+            cursor.execute(
+                f"DELETE FROM daily_rollups WHERE rollup_date IN ({placeholders}) AND tx_count <= 0",
+                dates
+            )
+    
+    @staticmethod
+    def rebuild(start_date: Optional[date] = None, end_date: Optional[date] = None, conn=None) -> int:
+        """
+        Recalcula los rollups desde transactions (todo o un rango de fechas).
+        Si se pasa conn, se usa esa conexión (el llamador la cierra).
+
+        Returns:
+            Cantidad de filas de rollup generadas
+        """
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db_connection()
+        if not conn:
+            raise Exception("No se pudo conectar a la base de datos")
+        
+        try:
+            with conn.cursor() as cursor:
+                conditions = []
+                params = []
+                if start_date:
+                    conditions.append("{column} >= %s")
+                    params.append(start_date)
+                if end_date:
+                    conditions.append("{column} <= %s")
+                    params.append(end_date)
+                where = "WHERE " + " AND ".join(conditions) if conditions else ""
+                
+                cursor.execute(f"DELETE FROM daily_rollups {where.format(column='rollup_date')}", params)
+                cursor.execute(f"""
+                    INSERT INTO daily_rollups
+                    (rollup_date, category_id, merchant, payment_method, account_id, total, tx_count)
+                    SELECT transaction_date, COALESCE(category_id, 0), COALESCE(merchant, ''),
+                           COALESCE(payment_method, ''), COALESCE(account_id, 0), SUM(amount), COUNT(*)
+                    FROM transactions
+                    {where.format(column='transaction_date')}
+                    GROUP BY transaction_date, COALESCE(category_id, 0), COALESCE(merchant, ''),
+                             COALESCE(payment_method, ''), COALESCE(account_id, 0)
+                """, params)
+                rows = cursor.rowcount
+                conn.commit()
+                response_cache.invalidate("stats")
+                return rows
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if own_conn:
+                conn.close()
+    
+    @staticmethod
+    def reassign_category(cursor, category_id: int):
+        """Mueve los rollups de una categoría eliminada a 'sin categoría' (como ON DELETE SET NULL)"""
+        cursor.execute("""
+            INSERT INTO daily_rollups (rollup_date, category_id, merchant, payment_method, account_id, total, tx_count)
+            SELECT rollup_date, 0, merchant, payment_method, account_id, total, tx_count
+            FROM daily_rollups WHERE category_id = %s
+            ON DUPLICATE KEY UPDATE total = daily_rollups.total + VALUES(total),
+                                    tx_count = daily_rollups.tx_count + VALUES(tx_count)
+        """, (category_id,))
+        cursor.execute("DELETE FROM daily_rollups WHERE category_id = %s", (category_id,))
+
+
+class BudgetService:
+    """
+    Presupuestos por categoría (o para todo el gasto) y período (tabla budgets).
+
+    El consumo de cada presupuesto se acumula por período en budget_usage desde
+    RollupService.apply, en la misma transacción que cada escritura sobre transactions
+    (crear, editar, eliminar, importar, re-categorizar). Consultar el estado es leer un
+    contador por presupuesto, y las alertas se generan al escribir, cuando un contador
+    cruza el umbral de aviso o el límite por primera vez en su período.
+    """
+    
+    # Períodos: nombre -> expresión SQL del primer día del período que contiene r.rollup_date
+    PERIODS = {
+        'weekly': "r.rollup_date - INTERVAL WEEKDAY(r.rollup_date) DAY",
+        'monthly': "r.rollup_date - INTERVAL (DAYOFMONTH(r.rollup_date) - 1) DAY",
+        'yearly': "r.rollup_date - INTERVAL (DAYOFYEAR(r.rollup_date) - 1) DAY",
+    }
+    # Niveles de alerta (budget_usage.alert_level guarda el más alto ya notificado en el período)
+    LEVELS = {0: 'ok', 1: 'warning', 2: 'over'}
+    
+    _UPSERT_SQL = """
+        INSERT INTO budget_usage (budget_id, period_start, spent, tx_count)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE spent = spent + VALUES(spent), tx_count = tx_count + VALUES(tx_count)
+    """
+    
+    @staticmethod
+    def period_start(day: date, period: str) -> date:
+        """Primer día del período que contiene day (igual que PERIODS en SQL)"""
+        if period == 'weekly':
+            return day - timedelta(days=day.weekday())
+        if period == 'monthly':
+            return day.replace(day=1)
+        return day.replace(month=1, day=1)
+    
+    @staticmethod
+    def _level(spent, budget: Dict) -> int:
+        """Nivel de alerta que corresponde a un consumo"""
+        limit = Decimal(str(budget['amount_limit']))
+        if spent > limit:
+            return 2
+        if spent >= limit * Decimal(str(budget['alert_threshold'])) / 100:
+            return 1
+        return 0
+    
+    @staticmethod
+    def _fetch_budgets(cursor, category_ids=None) -> List[Dict]:
+        """Presupuestos que aplican a las categorías indicadas (todos si category_ids es None)"""
+        sql = "SELECT id, category_id, period, amount_limit, alert_threshold FROM budgets"
+        if category_ids is None:
+            cursor.execute(sql)
+        else:
+            conditions = ["category_id IS NULL"]
+            if category_ids:
+                conditions.append(f"category_id IN ({', '.join(['%s'] * len(category_ids))})")
+            cursor.execute(f"{sql} WHERE {' OR '.join(conditions)}", list(category_ids))
+        return list(cursor.fetchall())
+    
+    @staticmethod
+    def apply(cursor, groups: Dict[tuple, tuple], sign: int) -> List[Dict]:
+        """
+        Suma (sign=1) o resta (sign=-1) a los contadores de los presupuestos afectados.
+        groups: {(fecha, categoría, comercio, método de pago, cuenta): (total, cantidad)},
+        como los agrupa RollupService.apply.
+
+        Returns:
+            Alertas generadas por esta escritura
+        """
+        spent = {}
+        for (transaction_date, category_id, *_), (total, count) in groups.items():
+            current_total, current_count = spent.get((category_id, transaction_date), (Decimal(0), 0))
+            spent[(category_id, transaction_date)] = (current_total + total, current_count + count)
+        if not spent:
+            return []
+        budgets = BudgetService._fetch_budgets(cursor, sorted({c for c, _ in spent if c}))
+        if not budgets:
+            return []
+        
+        deltas = {}
+        for (category_id, transaction_date), (total, count) in spent.items():
+            for budget in budgets:
+                if budget['category_id'] is None or budget['category_id'] == category_id:
+                    key = (budget['id'], BudgetService.period_start(transaction_date, budget['period']))
+                    current_total, current_count = deltas.get(key, (Decimal(0), 0))
+                    deltas[key] = (current_total + total, current_count + count)
+        if not deltas:
+            return []
+        cursor.executemany(BudgetService._UPSERT_SQL, [
+            (*key, sign * total, sign * count) for key, (total, count) in deltas.items()
+        ])
+        if sign < 0:
+            # Restar consumo nunca genera alertas
+            return []
+        return BudgetService._raise_alerts(cursor, {budget['id']: budget for budget in budgets}, list(deltas))
+    
+    @staticmethod
+    def _raise_alerts(cursor, budgets: Dict[int, Dict], keys: List[tuple]) -> List[Dict]:
+        """Registra una alerta por cada contador que subió de nivel (una vez por nivel y período)"""
+        placeholders = ", ".join(["(%s, %s)"] * len(keys))
+        cursor.execute(f"""
+            SELECT budget_id, period_start, spent, alert_level FROM budget_usage
+            WHERE (budget_id, period_start) IN ({placeholders})
+            FOR UPDATE
+        """, [value for key in keys for value in key])
+        alerts = []
+        for row in cursor.fetchall():
+            budget = budgets[row['budget_id']]
+            level = BudgetService._level(row['spent'], budget)
+            if level > row['alert_level']:
+                alerts.append({
+                    'budget_id': row['budget_id'],
+                    'period_start': row['period_start'],
+                    'level': level,
+                    'spent': row['spent'],
+                    'amount_limit': budget['amount_limit'],
+                })
+        if alerts:
+            cursor.executemany(
+                "UPDATE budget_usage SET alert_level = %s WHERE budget_id = %s AND period_start = %s",
+                [(a['level'], a['budget_id'], a['period_start']) for a in alerts]
+            )
+            cursor.executemany("""
+                INSERT INTO budget_alerts (budget_id, period_start, level, spent, amount_limit)
+                VALUES (%s, %s, %s, %s, %s)
+            """, [(a['budget_id'], a['period_start'], BudgetService.LEVELS[a['level']], a['spent'], a['amount_limit'])
+                  for a in alerts])
+            logger.info(f"{len(alerts)} alertas de presupuesto generadas")
+        return alerts
+    
+    @staticmethod
+    def rebuild(budget_id: Optional[int] = None, conn=None) -> int:
+        """
+        Recalcula los contadores desde daily_rollups (de un presupuesto o de todos).
+        Los niveles de alerta quedan en el nivel actual de cada período, sin generar alertas.
+        Si se pasa conn, se usa esa conexión y no se hace commit (el llamador lo hace).
+
+        Returns:
+            Cantidad de contadores generados
+        """
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db_connection()
+        if not conn:
+            raise Exception("No se pudo conectar a la base de datos")
+        
+        try:
+            with conn.cursor() as cursor:
+                budgets = BudgetService._fetch_budgets(cursor)
+                if budget_id is not None:
+                    budgets = [budget for budget in budgets if budget['id'] == budget_id]
+                    cursor.execute("DELETE FROM budget_usage WHERE budget_id = %s", (budget_id,))
+                else:
+                    cursor.execute("DELETE FROM budget_usage")
                 
+                rows = 0
+                for budget in budgets:
+                    start = BudgetService.PERIODS[budget['period']]
+                    category_filter = "WHERE r.category_id = %s" if budget['category_id'] else ""
+                    cursor.execute(f"""
+                        INSERT INTO budget_usage (budget_id, period_start, spent, tx_count)
+                        SELECT %s, {start}, SUM(r.total), SUM(r.tx_count)
+                        FROM daily_rollups r
+                        {category_filter}
+                        GROUP BY {start}
+                    """, [budget['id']] + ([budget['category_id']] if budget['category_id'] else []))
+                    rows += cursor.rowcount
+                    limit = Decimal(str(budget['amount_limit']))
+                    cursor.execute("""
+                        UPDATE budget_usage
+                        SET alert_level = CASE WHEN spent > %s THEN 2 WHEN spent >= %s THEN 1 ELSE 0 END
+                        WHERE budget_id = %s
+                    """, (limit, limit * Decimal(str(budget['alert_threshold'])) / 100, budget['id']))
+                if own_conn:
+                    conn.commit()
+                return rows
+        except Exception:
+            if own_conn:
+                conn.rollback()
+            raise
+        finally:
+            if own_conn:
+                conn.close()
+    
+    @staticmethod
+    def get_all() -> List[Dict]:
+        """Obtiene todos los presupuestos"""
+        conn = get_db_connection()
+        if not conn:
+            return []
+        
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT b.*, c.name AS category_name
+                    FROM budgets b
+                    LEFT JOIN categories c ON b.category_id = c.id
+                    ORDER BY c.name, b.period
+                """)
+                return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def create(
+        category_id: Optional[int],
+        period: str,
+        amount_limit: float,
+        alert_threshold: float = 80
+    ) -> int:
+        """
+        Crea un presupuesto (category_id None: todo el gasto) y calcula su consumo
+        con las transacciones ya guardadas.
+        """
+        if period not in BudgetService.PERIODS:
+            raise ValueError(f"Período inválido: {period}")
+        if amount_limit <= 0:
+            raise ValueError("El monto del presupuesto debe ser mayor que 0")
+        conn = get_db_connection()
+        if not conn:
+            raise Exception("No se pudo conectar a la base de datos")
+        
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT id FROM budgets WHERE category_id <=> %s AND period = %s FOR UPDATE",
+                    (category_id, period)
+                )
+                if cursor.fetchone():
+                    raise ValueError("Ya existe un presupuesto para esa categoría y período")
+                cursor.execute("""
+                    INSERT INTO budgets (category_id, period, amount_limit, alert_threshold)
+                    VALUES (%s, %s, %s, %s)
+                """, (category_id, period, amount_limit, alert_threshold))
+                budget_id = cursor.lastrowid
+                BudgetService.rebuild(budget_id, conn=conn)
                 conn.commit()
-                return transaction_id
+                return budget_id
+        except Exception:
+            conn.rollback()
+            raise
         finally:
             conn.close()
     
     @staticmethod
-    def _add_tags_to_transaction(cursor, transaction_id: int, tags: List[str]):
-        """Agrega etiquetas a una transacción"""
-        for tag_name in tags:
-            # Obtener o crear el tag
-            cursor.execute("SELECT id FROM tags WHERE name = %s", (tag_name,))
-            tag = cursor.fetchone()
-            if not tag:
-                cursor.execute("INSERT INTO tags (name) VALUES (%s)", (tag_name,))
-                tag_id = cursor.lastrowid
-            else:
-                tag_id = tag['id']
-            
-            # Relacionar transacción con tag
-            cursor.execute(
-                "INSERT IGNORE INTO transaction_tags (transaction_id, tag_id) VALUES (%s, %s)",
-                (transaction_id, tag_id)
-            )
+    def update(budget_id: int, amount_limit: Optional[float] = None, alert_threshold: Optional[float] = None) -> bool:
+        """Cambia el monto o el umbral de aviso; los niveles de alerta se recalculan con los nuevos valores"""
+        if amount_limit is not None and amount_limit <= 0:
+            raise ValueError("El monto del presupuesto debe ser mayor que 0")
+        updates = {'amount_limit': amount_limit, 'alert_threshold': alert_threshold}
+        updates = {column: value for column, value in updates.items() if value is not None}
+        if not updates:
+            return False
+        conn = get_db_connection()
+        if not conn:
+            return False
+        
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE budgets SET {', '.join(f'{column} = %s' for column in updates)} WHERE id = %s",
+                    [*updates.values(), budget_id]
+                )
+                cursor.execute("SELECT id FROM budgets WHERE id = %s", (budget_id,))
+                if not cursor.fetchone():
+                    return False
+                BudgetService.rebuild(budget_id, conn=conn)
+                conn.commit()
+                return True
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
     
     @staticmethod
-    def get_transactions(
-        category_id: Optional[int] = None,
-        payment_method: Optional[str] = None,
-        start_date: Optional[date] = None,
-        end_date: Optional[date] = None,
-        limit: int = 1000,
-        offset: int = 0
-    ) -> List[Dict]:
-        """Obtiene transacciones con filtros opcionales"""
+    def delete(budget_id: int) -> bool:
+        """Elimina un presupuesto (sus contadores y alertas se eliminan por CASCADE)"""
         conn = get_db_connection()
         if not conn:
-            return []
+            return False
         
         try:
             with conn.cursor() as cursor:
-                conditions = []
-                params = []
-                
-                if category_id:
-                    conditions.append("t.category_id = %s")
-                    params.append(category_id)
-                
-                if payment_method:
-                    conditions.append("t.payment_method = %s")
-                    params.append(payment_method)
-                
-                if start_date:
-                    conditions.append("t.transaction_date >= %s")
-                    params.append(start_date)
-                
-                if end_date:
-                    conditions.append("t.transaction_date <= %s")
-                    params.append(end_date)
-                
-                where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
-                
-                sql = f"""
-                    SELECT 
-                        t.id, t.account_id, t.transaction_date, t.description, 
-                        t.merchant, t.amount, t.category_id, t.payment_method,
-                        t.created_at, t.updated_at,
-                        c.name as category_name,
-                        GROUP_CONCAT(tg.name) as tags
-                    FROM transactions t
-                    LEFT JOIN categories c ON t.category_id = c.id
-                    LEFT JOIN transaction_tags tt ON t.id = tt.transaction_id
-                    LEFT JOIN tags tg ON tt.tag_id = tg.id
-                    {where_clause}
-                    GROUP BY t.id, t.account_id, t.transaction_date, t.description, 
-                             t.merchant, t.amount, t.category_id, t.payment_method,
-                             t.created_at, t.updated_at, c.name
-                    ORDER BY t.transaction_date DESC, t.id DESC
-                    LIMIT %s OFFSET %s
-                """
-                params.extend([limit, offset])
-                
-                cursor.execute(sql, params)
-                results = cursor.fetchall()
-                
-                # Procesar resultados
-                transactions = []
-                for row in results:
-                    transaction = dict(row)
-                    # Convertir tags de string a lista
-                    if transaction.get('tags'):
-                        transaction['tags'] = [t.strip() for t in transaction['tags'].split(',') if t.strip()]
-                    else:
-                        transaction['tags'] = []
-                    # Asegurar que todos los campos requeridos estén presentes
-                    if 'created_at' not in transaction:
-                        transaction['created_at'] = datetime.now()
-                    if 'updated_at' not in transaction:
-                        transaction['updated_at'] = datetime.now()
-                    transactions.append(transaction)
-                
-                return transactions
+                cursor.execute("DELETE FROM budgets WHERE id = %s", (budget_id,))
+                deleted = cursor.rowcount > 0
+                conn.commit()
+                return deleted
         finally:
             conn.close()
     
     @staticmethod
-    def update_transaction(transaction_id: int, updates: dict) -> bool:
-        """Actualiza una transacción"""
+    def get_status(on: Optional[date] = None) -> List[Dict]:
+        """
+        Consumo de cada presupuesto en el período que contiene on (hoy por defecto):
+        una lectura por clave primaria de budget_usage por presupuesto.
+        """
+        on = on or date.today()
         conn = get_db_connection()
         if not conn:
-            return False
+            return []
         
         try:
             with conn.cursor() as cursor:
-                set_clauses = []
-                params = []
-                
-                for key, value in updates.items():
-                    if key != 'tags':
-                        set_clauses.append(f"{key} = %s")
-                        params.append(value)
-                
-                if set_clauses:
-                    sql = f"UPDATE transactions SET {', '.join(set_clauses)} WHERE id = %s"
-                    params.append(transaction_id)
-                    cursor.execute(sql, params)
-                    conn.commit()
-                
-                # Actualizar tags si se proporcionan
-                if 'tags' in updates:
-                    # Eliminar tags existentes
-                    cursor.execute("DELETE FROM transaction_tags WHERE transaction_id = %s", (transaction_id,))
-                    # Agregar nuevos tags
-                    TransactionService._add_tags_to_transaction(cursor, transaction_id, updates['tags'])
-                    conn.commit()
+                cursor.execute("""
+                    SELECT b.id, b.category_id, c.name AS category_name, b.period, b.amount_limit, b.alert_threshold
+                    FROM budgets b
+                    LEFT JOIN categories c ON b.category_id = c.id
+                    ORDER BY c.name, b.period
+                """)
+                budgets = cursor.fetchall()
+                if not budgets:
+                    return []
+                keys = [(budget['id'], BudgetService.period_start(on, budget['period'])) for budget in budgets]
+                placeholders = ", ".join(["(%s, %s)"] * len(keys))
+                cursor.execute(f"""
+                    SELECT budget_id, period_start, spent, tx_count FROM budget_usage
+                    WHERE (budget_id, period_start) IN ({placeholders})
+                """, [value for key in keys for value in key])
+                usage = {(row['budget_id'], row['period_start']): row for row in cursor.fetchall()}
                 
-                return True
+                status = []
+                for budget, key in zip(budgets, keys):
+                    row = usage.get(key, {'spent': Decimal(0), 'tx_count': 0})
+                    limit = float(budget['amount_limit'])
+                    spent = float(row['spent'])
+                    status.append({
+                        'budget_id': budget['id'],
+                        'category_id': budget['category_id'],
+                        'category_name': budget['category_name'],
+                        'period': budget['period'],
+                        'period_start': key[1],
+                        'amount_limit': limit,
+                        'spent': spent,
+                        'remaining': round(limit - spent, 2),
+                        'used_pct': round(spent / limit * 100, 1) if limit else None,
+                        'transactions': int(row['tx_count']),
+                        'status': BudgetService.LEVELS[BudgetService._level(row['spent'], budget)],
+                    })
+                return status
         finally:
             conn.close()
     
     @staticmethod
-    def delete_transaction(transaction_id: int) -> bool:
-        """Elimina una transacción"""
+    def get_alerts(limit: int = 50, budget_id: Optional[int] = None) -> List[Dict]:
+        """Alertas generadas al escribir, de la más reciente a la más antigua"""
         conn = get_db_connection()
         if not conn:
-            return False
+            return []
         
         try:
             with conn.cursor() as cursor:
-                # Verificar que la transacción existe
-                cursor.execute("SELECT id FROM transactions WHERE id = %s", (transaction_id,))
-                if not cursor.fetchone():
-                    return False
-                
-                # Eliminar la transacción (las relaciones con tags se eliminan automáticamente por CASCADE)
-                cursor.execute("DELETE FROM transactions WHERE id = %s", (transaction_id,))
-                conn.commit()
-                return True
+                where = "WHERE a.budget_id = %s" if budget_id is not None else ""
+                cursor.execute(f"""
+                    SELECT a.id, a.budget_id, c.name AS category_name, b.period, a.period_start,
+                           a.level, a.spent, a.amount_limit, a.created_at
+                    FROM budget_alerts a
+                    JOIN budgets b ON a.budget_id = b.id
+                    LEFT JOIN categories c ON b.category_id = c.id
+                    {where}
+                    ORDER BY a.id DESC
+                    LIMIT %s
+                """, ([budget_id] if budget_id is not None else []) + [limit])
+                return [dict(row) for row in cursor.fetchall()]
         finally:
             conn.close()
 
+
 class StatsService:
     """Servicio para calcular estadísticas"""
     
+    # Dimensiones de desglose: nombre -> (columna de la consulta, etiqueta para vacíos, máximo de entradas)
+    # Una etiqueta None excluye las filas sin valor en esa dimensión.
+    DIMENSIONS = {
+        'category': ('category_name', 'Sin categoría', 10),
+        'merchant': ('merchant', None, 10),
+        'payment_method': ('payment_method', None, None),
+        'account': ('account_name', 'Sin cuenta', None),
+        'tag': ('tag_name', None, None),
+    }
+    DEFAULT_DIMENSIONS = ('category', 'merchant', 'payment_method')
+    
     @staticmethod
     def get_stats(
         start_date: Optional[date] = None,
-        end_date: Optional[date] = None
+        end_date: Optional[date] = None,
+        dimensions: Optional[List[str]] = None
     ) -> Dict:
-        """Calcula estadísticas de transacciones"""
+        """
+        Calcula estadísticas de transacciones a partir de los rollups diarios.
+
+        Todos los desgloses salen de una sola consulta: los rollups del rango se agrupan
+        por todas sus dimensiones a la vez y se reparten en una pasada en Python.
+        Los tags (que no están en los rollups) se agregan en la misma consulta con UNION ALL.
+
+        dimensions: desgloses extra además de los por defecto ('account', 'tag'); cada uno
+        se retorna como by_<dimensión>.
+        """
+        requested = list(StatsService.DEFAULT_DIMENSIONS)
+        for dimension in dimensions or []:
+            if dimension not in StatsService.DIMENSIONS:
+                raise ValueError(f"Dimensión desconocida: {dimension}")
+            if dimension not in requested:
+                requested.append(dimension)
+        
         conn = get_db_connection()
         if not conn:
             return {}
@@ -220,83 +1624,220 @@ class StatsService:
                 params = []
                 
                 if start_date:
-                    conditions.append("transaction_date >= %s")
+                    conditions.append("{column} >= %s")
                     params.append(start_date)
                 
                 if end_date:
-                    conditions.append("transaction_date <= %s")
+                    conditions.append("{column} <= %s")
                     params.append(end_date)
                 
                 where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
                 
-                # Total
-                cursor.execute(f"SELECT SUM(amount) as total, COUNT(*) as count FROM transactions {where_clause}", params)
-                total_row = cursor.fetchone()
-                total = float(total_row['total'] or 0)
-                total_transactions = total_row['count'] or 0
-                
-                # Por categoría
-                cursor.execute(f"""
-                    SELECT c.name, SUM(t.amount) as total
-                    FROM transactions t
-                    LEFT JOIN categories c ON t.category_id = c.id
-                    {where_clause}
-                    GROUP BY c.id, c.name
-                    ORDER BY total DESC
-                    LIMIT 10
-                """, params)
-                by_category = {row['name'] or 'Sin categoría': float(row['total'] or 0) for row in cursor.fetchall()}
+                sql = f"""
+                    SELECT 'rollup' AS source, c.name AS category_name, r.merchant, r.payment_method,
+                           a.name AS account_name, NULL AS tag_name,
+                           SUM(r.total) AS total, SUM(r.tx_count) AS count
+                    FROM daily_rollups r
+                    LEFT JOIN categories c ON r.category_id = c.id
+                    LEFT JOIN accounts a ON r.account_id = a.id
+                    {where_clause.format(column='r.rollup_date')}
+                    GROUP BY r.category_id, c.name, r.merchant, r.payment_method, r.account_id, a.name
+                """
+                query_params = list(params)
+                if 'tag' in requested:
+                    sql += f"""
+                    UNION ALL
+                    SELECT 'tag', NULL, NULL, NULL, NULL, tg.name, SUM(t.amount), COUNT(*)
+                    FROM transaction_tags tt
+                    JOIN transactions t ON t.id = tt.transaction_id
+                    JOIN tags tg ON tg.id = tt.tag_id
+                    {where_clause.format(column='t.transaction_date')}
+                    GROUP BY tg.id, tg.name
+                    """
+                    query_params += params
                 
-                # Por comercio
-                merchant_where = where_clause + (" AND merchant IS NOT NULL" if where_clause else "WHERE merchant IS NOT NULL")
-                cursor.execute(f"""
-                    SELECT merchant, SUM(amount) as total
-                    FROM transactions
-                    {merchant_where}
-                    GROUP BY merchant
-                    ORDER BY total DESC
-                    LIMIT 10
-                """, params)
-                by_merchant = {row['merchant']: float(row['total'] or 0) for row in cursor.fetchall()}
+                cursor.execute(sql, query_params)
                 
-                # Por método de pago
-                payment_where = where_clause + (" AND payment_method IS NOT NULL" if where_clause else "WHERE payment_method IS NOT NULL")
-                cursor.execute(f"""
-                    SELECT payment_method, SUM(amount) as total
-                    FROM transactions
-                    {payment_where}
-                    GROUP BY payment_method
-                """, params)
-                by_payment_method = {row['payment_method'] or 'unknown': float(row['total'] or 0) for row in cursor.fetchall()}
+                # Una pasada: total y todos los desgloses
+                total = 0.0
+                total_transactions = 0
+                breakdowns = {dimension: {} for dimension in requested}
+                for row in cursor.fetchall():
+                    amount = float(row['total'] or 0)
+                    if row['source'] == 'rollup':
+                        total += amount
+                        total_transactions += int(row['count'] or 0)
+                    for dimension in requested:
+                        column, empty_label, _ = StatsService.DIMENSIONS[dimension]
+                        if (dimension == 'tag') != (row['source'] == 'tag'):
+                            continue
+                        label = row[column] or empty_label
+                        if label is None:
+                            continue
+                        breakdown = breakdowns[dimension]
+                        breakdown[label] = breakdown.get(label, 0.0) + amount
                 
-                # Top categorías
-                top_categories = [
-                    {'name': name, 'amount': amount}
-                    for name, amount in sorted(by_category.items(), key=lambda x: x[1], reverse=True)[:5]
-                ]
+                # Ordenar cada desglose de mayor a menor (una sola vez) y recortar
+                for dimension, breakdown in breakdowns.items():
+                    limit = StatsService.DIMENSIONS[dimension][2]
+                    ordered = sorted(breakdown.items(), key=lambda x: x[1], reverse=True)
+                    breakdowns[dimension] = dict(ordered[:limit] if limit else ordered)
                 
-                # Top comercios
-                top_merchants = [
-                    {'name': name, 'amount': amount}
-                    for name, amount in sorted(by_merchant.items(), key=lambda x: x[1], reverse=True)[:5]
-                ]
+                by_category = breakdowns['category']
+                by_merchant = breakdowns['merchant']
+                by_payment_method = breakdowns['payment_method']
                 
                 # Uso de crédito
                 credit_total = by_payment_method.get('credit', 0)
                 credit_usage = (credit_total / total * 100) if total > 0 else 0
                 
-                return {
+                stats = {
                     'total': total,
                     'total_transactions': total_transactions,
-                    'by_category': by_category,
-                    'by_merchant': by_merchant,
-                    'by_payment_method': by_payment_method,
-                    'top_categories': top_categories,
-                    'top_merchants': top_merchants,
+                    'top_categories': [{'name': n, 'amount': a} for n, a in list(by_category.items())[:5]],
+                    'top_merchants': [{'name': n, 'amount': a} for n, a in list(by_merchant.items())[:5]],
                     'credit_usage': round(credit_usage, 1)
                 }
+                for dimension, breakdown in breakdowns.items():
+                    stats[f'by_{dimension}'] = breakdown
+                return stats
+        finally:
+            conn.close()
+    
+    # Períodos de la serie de tiempo: nombre -> expresión SQL del primer día del período
+    BUCKETS = {
+        'day': "r.rollup_date",
+        'week': "r.rollup_date - INTERVAL WEEKDAY(r.rollup_date) DAY",
+        'month': "r.rollup_date - INTERVAL (DAYOFMONTH(r.rollup_date) - 1) DAY",
+    }
+    # Series por las que se puede separar: nombre -> (expresión SQL, etiqueta para vacíos)
+    SPLITS = {
+        'category': ("c.name", 'Sin categoría'),
+        'merchant': ("NULLIF(r.merchant, '')", 'Sin comercio'),
+    }
+    OTHER_SERIES = 'Otros'
+    
+    @staticmethod
+    def _bucket_start(day: date, bucket: str) -> date:
+        """Primer día del período que contiene day (igual que BUCKETS en SQL)"""
+        if bucket == 'week':
+            return day - timedelta(days=day.weekday())
+        if bucket == 'month':
+            return day.replace(day=1)
+        return day
+    
+    @staticmethod
+    def _next_bucket(day: date, bucket: str) -> date:
+        if bucket == 'week':
+            return day + timedelta(days=7)
+        if bucket == 'month':
+            return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return day + timedelta(days=1)
+    
+    @staticmethod
+    def get_timeseries(
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        bucket: str = 'month',
+        split_by: Optional[str] = None,
+        limit: int = 10
+    ) -> Dict:
+        """
+        Suma y cantidad de transacciones por día, semana (desde el lunes) o mes, a partir
+        de los rollups diarios, opcionalmente separadas por categoría o comercio.
+
+        El resultado es columnar: 'periods' trae el primer día de cada período (sin huecos)
+        y 'totals'/'counts' los valores alineados con él. Con split_by, 'series' trae las
+        limit series de mayor monto y el resto sumado en 'Otros'.
+        """
+        if bucket not in StatsService.BUCKETS:
+            raise ValueError(f"Período desconocido: {bucket}")
+        if split_by is not None and split_by not in StatsService.SPLITS:
+            raise ValueError(f"Separación desconocida: {split_by}")
+        
+        conn = get_db_connection()
+        if not conn:
+            return {}
+        
+        try:
+            with conn.cursor() as cursor:
+                conditions = []
+                params = []
+                if start_date:
+                    conditions.append("r.rollup_date >= %s")
+                    params.append(start_date)
+                if end_date:
+                    conditions.append("r.rollup_date <= %s")
+                    params.append(end_date)
+                where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+                
+                split_column = StatsService.SPLITS[split_by][0] if split_by else "NULL"
+                cursor.execute(f"""
+                    SELECT {StatsService.BUCKETS[bucket]} AS period, {split_column} AS series,
+                           SUM(r.total) AS total, SUM(r.tx_count) AS count
+                    FROM daily_rollups r
+                    LEFT JOIN categories c ON r.category_id = c.id
+                    {where_clause}
+                    GROUP BY period, series
+                """, params)
+                rows = cursor.fetchall()
         finally:
             conn.close()
+        
+        # Períodos continuos desde el primero hasta el último del rango (o de los datos)
+        found = [row['period'] for row in rows]
+        first = start_date or (min(found) if found else None)
+        last = end_date or (max(found) if found else None)
+        periods = []
+        if first and last:
+            current = StatsService._bucket_start(first, bucket)
+            while current <= last:
+                periods.append(current)
+                current = StatsService._next_bucket(current, bucket)
+        position = {period: i for i, period in enumerate(periods)}
+        
+        totals = [0.0] * len(periods)
+        counts = [0] * len(periods)
+        by_series: Dict[str, Tuple[List[float], List[int]]] = {}
+        for row in rows:
+            i = position[row['period']]
+            amount = float(row['total'] or 0)
+            count = int(row['count'] or 0)
+            totals[i] += amount
+            counts[i] += count
+            if split_by:
+                label = row['series'] or StatsService.SPLITS[split_by][1]
+                series_totals, series_counts = by_series.setdefault(label, ([0.0] * len(periods), [0] * len(periods)))
+                series_totals[i] += amount
+                series_counts[i] += count
+        
+        result = {
+            'bucket': bucket,
+            'periods': [period.isoformat() for period in periods],
+            'totals': [round(value, 2) for value in totals],
+            'counts': counts,
+        }
+        if split_by:
+            ranked = sorted(by_series.items(), key=lambda item: sum(item[1][0]), reverse=True)
+            series = [
+                {'name': name, 'totals': [round(v, 2) for v in values], 'counts': series_counts}
+                for name, (values, series_counts) in ranked[:limit]
+            ]
+            if len(ranked) > limit:
+                other_totals = [0.0] * len(periods)
+                other_counts = [0] * len(periods)
+                for _, (values, series_counts) in ranked[limit:]:
+                    for i in range(len(periods)):
+                        other_totals[i] += values[i]
+                        other_counts[i] += series_counts[i]
+                series.append({
+                    'name': StatsService.OTHER_SERIES,
+                    'totals': [round(v, 2) for v in other_totals],
+                    'counts': other_counts,
+                })
+            result['split_by'] = split_by
+            result['series'] = series
+        return result
 
 class CategoryService:
     """Servicio para operaciones con categorías"""
@@ -328,8 +1869,11 @@ class CategoryService:
                     "INSERT INTO categories (name, description) VALUES (%s, %s)",
                     (name, description)
                 )
+                category_id = cursor.lastrowid
+                DataVersionService.bump(cursor, "categories")
                 conn.commit()
-                return cursor.lastrowid
+                response_cache.invalidate("categories")
+                return category_id
         finally:
             conn.close()
     
@@ -357,7 +1901,10 @@ class CategoryService:
                     params.append(category_id)
                     sql = f"UPDATE categories SET {', '.join(updates)} WHERE id = %s"
                     cursor.execute(sql, params)
+                    DataVersionService.bump(cursor, "categories")
                     conn.commit()
+                    # Las estadísticas muestran el nombre de la categoría
+                    response_cache.invalidate("categories", "stats")
                     return True
                 return False
         finally:
@@ -373,8 +1920,16 @@ class CategoryService:
         try:
             with conn.cursor() as cursor:
                 cursor.execute("DELETE FROM categories WHERE id = %s", (category_id,))
+                deleted = cursor.rowcount > 0
+                if deleted:
+                    RollupService.reassign_category(cursor, category_id)
+                    # Las transacciones de la categoría quedan sin categoría (ON DELETE SET NULL);
+                    # "categorizations" hace que el categorizador se re-entrene sin ella
+                    DataVersionService.bump(cursor, "categories", "transactions", "categorizations")
                 conn.commit()
-                return cursor.rowcount > 0
+                if deleted:
+                    response_cache.invalidate("categories", "stats")
+                return deleted
         finally:
             conn.close()
 
@@ -404,12 +1959,17 @@ class TagService:
         
         try:
             with conn.cursor() as cursor:
-                cursor.execute("INSERT IGNORE INTO tags (name) VALUES (%s)", (name,))
-                conn.commit()
-                # Obtener el ID
-                cursor.execute("SELECT id FROM tags WHERE name = %s", (name,))
-                tag = cursor.fetchone()
-                return tag['id'] if tag else None
+                # Si ya existe, LAST_INSERT_ID(id) deja su ID en lastrowid: una sola consulta
+                cursor.execute(
+                    "INSERT INTO tags (name) VALUES (%s) ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)",
+                    (name,)
+                )
+                tag_id = cursor.lastrowid
+                if cursor.rowcount == 1:
+                    DataVersionService.bump(cursor, "tags")
+                    conn.commit()
+                    response_cache.invalidate("tags")
+                return tag_id or None
         finally:
             conn.close()
     
@@ -423,8 +1983,182 @@ class TagService:
         try:
             with conn.cursor() as cursor:
                 cursor.execute("DELETE FROM tags WHERE id = %s", (tag_id,))
+                deleted = cursor.rowcount > 0
+                if deleted:
+                    # tag_deletions invalida los cachés de IDs de tags de todos los procesos
+                    DataVersionService.bump(cursor, "tags", "transactions", "tag_deletions")
+                conn.commit()
+                if deleted:
+                    tag_id_cache.clear()
+                    # Los desgloses por tag de las estadísticas también cambian
+                    response_cache.invalidate("tags", "stats")
+                return deleted
+        finally:
+            conn.close()
+
+
+class ImportService:
+    """Servicio para el registro de imports (también actúa como tabla de jobs)"""
+
+    @staticmethod
+    def create(
+        filename: str,
+        file_path: Optional[str],
+        import_type: str = "pdf",
+        status: str = "pending",
+        content_hash: Optional[str] = None
+    ) -> int:
+        """Registra un import y retorna su ID"""
+        conn = get_db_connection()
+        if not conn:
+            raise Exception("No se pudo conectar a la base de datos")
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO imports (filename, file_path, status, import_type, content_hash)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (filename, file_path, status, import_type, content_hash))
+                import_id = cursor.lastrowid
+                DataVersionService.bump(cursor, "imports")
+                conn.commit()
+                return import_id
+        finally:
+            conn.close()
+
+    @staticmethod
+    def update(import_id: int, **fields) -> bool:
+        """Actualiza columnas de un import (status, progress, transactions_count, error_message...)"""
+        allowed = {
+            'status', 'progress', 'transactions_count', 'duplicates_count', 'error_message', 'file_path', 'account_id'
+        }
+        set_clauses = []
+        params = []
+        for key, value in fields.items():
+            if key not in allowed:
+                raise ValueError(f"Campo de import no permitido: {key}")
+            set_clauses.append(f"{key} = %s")
+            params.append(value)
+        if not set_clauses:
+            return False
+
+        conn = get_db_connection()
+        if not conn:
+            return False
+
+        try:
+            with conn.cursor() as cursor:
+                params.append(import_id)
+                cursor.execute(f"UPDATE imports SET {', '.join(set_clauses)} WHERE id = %s", params)
+                updated = cursor.rowcount > 0
+                if updated:
+                    DataVersionService.bump(cursor, "imports")
                 conn.commit()
-                return cursor.rowcount > 0
+                return updated
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get(import_id: int) -> Optional[Dict]:
+        """Obtiene un import por ID"""
+        conn = get_db_connection()
+        if not conn:
+            return None
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id, filename, file_path, import_type, status, progress, content_hash,
+                           transactions_count, duplicates_count, imported_at, updated_at, error_message
+                    FROM imports
+                    WHERE id = %s
+                """, (import_id,))
+                row = cursor.fetchone()
+                return dict(row) if row else None
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_by_status(status: str) -> List[Dict]:
+        """Obtiene los imports en un estado dado, del más antiguo al más nuevo"""
+        conn = get_db_connection()
+        if not conn:
+            return []
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT id, filename, file_path, import_type, content_hash FROM imports WHERE status = %s ORDER BY id",
+                    (status,)
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def find_by_hash(content_hash: str, statuses=("pending", "processing", "completed")) -> Optional[Dict]:
+        """Busca un import previo del mismo archivo (mismo hash de contenido)"""
+        conn = get_db_connection()
+        if not conn:
+            return None
+
+        try:
+            with conn.cursor() as cursor:
+                placeholders = ", ".join(["%s"] * len(statuses))
+                cursor.execute(f"""
+                    SELECT id, filename, status, transactions_count, imported_at
+                    FROM imports
+                    WHERE content_hash = %s AND status IN ({placeholders})
+                    ORDER BY id DESC
+                    LIMIT 1
+                """, (content_hash, *statuses))
+                row = cursor.fetchone()
+                return dict(row) if row else None
+        finally:
+            conn.close()
+
+
+class ParseCacheService:
+    """Caché persistente de cartolas parseadas, por hash de contenido y versión del parser"""
+
+    @staticmethod
+    def get(content_hash: str, parser_version: str) -> Optional[List[Dict]]:
+        """Retorna las transacciones cacheadas o None si no hay entrada"""
+        conn = get_db_connection()
+        if not conn:
+            return None
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT transactions FROM parse_cache WHERE content_hash = %s AND parser_version = %s",
+                    (content_hash, parser_version)
+                )
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                transactions = json.loads(row['transactions'])
+                for tx in transactions:
+                    tx['transaction_date'] = date.fromisoformat(tx['transaction_date'])
+                return transactions
         finally:
             conn.close()
 
+    @staticmethod
+    def put(content_hash: str, parser_version: str, transactions: List[Dict]) -> None:
+        """Guarda (o reemplaza) el resultado del parsing de un archivo"""
+        conn = get_db_connection()
+        if not conn:
+            return
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO parse_cache (content_hash, parser_version, transactions, transactions_count)
+                    VALUES (%s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE transactions = VALUES(transactions),
+                                            transactions_count = VALUES(transactions_count)
+                """, (content_hash, parser_version, json.dumps(transactions, default=str), len(transactions)))
+                conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,74 @@
+"""Pruebas del pool de conexiones (con conexiones simuladas, sin MySQL)"""
+import database
+from database import ConnectionPool
+
+
+class FakeServer:
+    """Datos compartidos entre conexiones (lo que otros procesos ya confirmaron)"""
+
+    def __init__(self):
+        self.version = 1
+
+
+class FakeConnection:
+    """
+    Conexión con snapshot de REPEATABLE READ: la primera lectura de una transacción
+    fija los datos que ve hasta commit/rollback. Como en PyMySQL, server_status no
+    se actualiza tras un SELECT.
+    """
+
+    def __init__(self, server: FakeServer):
+        self.server = server
+        self.open = True
+        self.server_status = 0
+        self.snapshot = None
+        self.rollbacks = 0
+
+    def read_version(self) -> int:
+        if self.snapshot is None:
+            self.snapshot = self.server.version
+        return self.snapshot
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.snapshot = None
+
+    def commit(self):
+        self.snapshot = None
+
+    def ping(self, reconnect=False):
+        return True
+
+    def close(self):
+        self.open = False
+
+
+def test_reader_does_not_leak_snapshot_to_next_borrower(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(database, "_connect", lambda: FakeConnection(server))
+    pool = ConnectionPool(max_size=1)
+
+    first = pool.acquire()
+    assert first.read_version() == 1
+    first.close()
+
+    # Otro proceso escribe entre las dos lecturas
+    server.version = 2
+
+    second = pool.acquire()
+    assert second._raw is first._raw  # misma conexión física reutilizada
+    assert second.read_version() == 2
+    second.close()
+
+
+def test_release_rolls_back_every_time(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(database, "_connect", lambda: FakeConnection(server))
+    pool = ConnectionPool(max_size=1)
+
+    for _ in range(3):
+        conn = pool.acquire()
+        conn.read_version()
+        conn.close()
+    assert conn._raw.rollbacks == 3
+    assert pool.metrics()["connections_created"] == 1
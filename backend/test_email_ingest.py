@@ -0,0 +1,92 @@
+"""Pruebas de la extracción de adjuntos de correos (con los correos de data-samples/emails)"""
+import email
+import hashlib
+import mailbox
+import shutil
+from email import policy
+from pathlib import Path
+
+import email_ingest
+from email_ingest import iter_mailbox_attachments
+
+EMAILS_DIR = Path(__file__).resolve().parent.parent / "data-samples" / "emails"
+
+# SHA-256 de cada PDF adjunto de los correos de ejemplo
+EXPECTED_HASHES = {
+    "CartolaCuentaCorrienteNacionalMensual.pdf": "3ce1db164d4b2c9ec2e71bd5870ec07a882de94f3f303c184fd41d1393e2c389",
+    "Linea de credito mensual.pdf": "2eb0e026c3ca90d7fb4d07217ad421aea7af742e4c491b8047dd0f51d443900d",
+    "EECCTarjetaVisa.pdf": "afe78e70979b308bef4ea340ee8ebf3bb40d59b9d6f3b48febeb74ffc132566f",
+    "ECBF_CC_202510_01-984-118087-4.pdf": "2b72549af9f143e7566396ed1b75bea12de728bc0f80a42d2450fc5be884abda",
+}
+
+
+def decoded_pdfs() -> dict:
+    """PDFs adjuntos según el parser completo de la librería estándar, por nombre"""
+    pdfs = {}
+    for eml in sorted(EMAILS_DIR.glob("*.eml")):
+        with open(eml, "rb") as handle:
+            message = email.message_from_binary_file(handle, policy=policy.default)
+        for part in message.walk():
+            if part.get_content_type() == "application/pdf" or (part.get_filename() or "").lower().endswith(".pdf"):
+                pdfs[part.get_filename()] = part.get_payload(decode=True)
+    return pdfs
+
+
+def read_all(path, **kwargs) -> list:
+    """Extrae los adjuntos y retorna (nombre, bytes, hash, tamaño), eliminando los temporales"""
+    result = []
+    for attachment in iter_mailbox_attachments(path, **kwargs):
+        try:
+            data = attachment.data.read_bytes() if isinstance(attachment.data, Path) else attachment.data
+            result.append((attachment.filename, data, attachment.content_hash, attachment.size))
+        finally:
+            attachment.discard()
+    return result
+
+
+def check_attachments(attachments: list):
+    expected = decoded_pdfs()
+    assert sorted(name for name, *_ in attachments) == sorted(EXPECTED_HASHES)
+    for name, data, content_hash, size in attachments:
+        assert data == expected[name]
+        assert size == len(data)
+        assert content_hash == hashlib.sha256(data).hexdigest() == EXPECTED_HASHES[name]
+
+
+def test_directory_dedupes_by_content_hash(tmp_path):
+    for eml in EMAILS_DIR.glob("*.eml"):
+        shutil.copy(eml, tmp_path / eml.name)
+    # El mismo correo reenviado: su PDF no debe aparecer dos veces
+    shutil.copy(EMAILS_DIR / "Cartola Cuenta Corriente.eml", tmp_path / "Reenviado.eml")
+
+    attachments = read_all(tmp_path)
+    assert len(attachments) == 4
+    check_attachments(attachments)
+
+
+def test_mbox_matches_stdlib_and_dedupes(tmp_path):
+    path = tmp_path / "bandeja.mbox"
+    box = mailbox.mbox(str(path))
+    for _ in range(2):
+        for eml in sorted(EMAILS_DIR.glob("*.eml")):
+            box.add(eml.read_bytes())
+    box.flush()
+    box.close()
+
+    attachments = read_all(path)
+    assert len(attachments) == 4
+    check_attachments(attachments)
+
+
+def test_large_attachments_spill_to_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(email_ingest, "MEMORY_ATTACHMENT_BYTES", 64 * 1024)
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir()
+
+    attachments = []
+    for attachment in iter_mailbox_attachments(EMAILS_DIR, spill_dir=str(spill_dir)):
+        assert isinstance(attachment.data, Path)
+        attachments.append((attachment.filename, attachment.data.read_bytes(), attachment.content_hash, attachment.size))
+        attachment.discard()
+    check_attachments(attachments)
+    assert list(spill_dir.iterdir()) == []
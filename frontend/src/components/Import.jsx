@@ -7,6 +7,7 @@ const API_BASE_URL = 'http://localhost:8000';
 export default function Import() {
   const [selectedFile, setSelectedFile] = useState(null);
   const [uploading, setUploading] = useState(false);
+  const [importProgress, setImportProgress] = useState(0);
   const [importResult, setImportResult] = useState(null);
   const [importHistory, setImportHistory] = useState([]);
   const [loadingHistory, setLoadingHistory] = useState(false);
@@ -29,6 +30,7 @@ export default function Import() {
     }
 
     setUploading(true);
+    setImportProgress(0);
     setImportResult(null);
 
     const formData = new FormData();
@@ -43,21 +45,32 @@ export default function Import() {
       const data = await response.json();
 
       if (response.ok) {
-        setImportResult({
-          success: true,
-          message: data.message || 'Archivo importado exitosamente',
-          transactionsImported: data.transactions_imported || 0,
-        });
         setSelectedFile(null);
         // Limpiar input
         const fileInput = document.getElementById('pdf-file-input');
         if (fileInput) fileInput.value = '';
+        loadImportHistory();
+
+        // La importación corre en segundo plano: consultar su estado hasta que termine
+        const job = await waitForImport(data.import_id);
+        if (job.status === 'completed') {
+          setImportResult({
+            success: true,
+            message: 'Archivo importado exitosamente',
+            transactionsImported: job.transactions_count || 0,
+          });
+        } else {
+          setImportResult({
+            success: false,
+            message: job.error_message || 'Error al importar el archivo',
+          });
+        }
         // Recargar historial
         loadImportHistory();
       } else {
         setImportResult({
           success: false,
-          message: data.detail || 'Error al importar el archivo',
+          message: data.detail?.message || data.detail || 'Error al importar el archivo',
         });
       }
     } catch (error) {
@@ -70,6 +83,22 @@ export default function Import() {
     }
   };
 
+  const waitForImport = async (importId) => {
+    // Polling del job hasta que llegue a un estado final
+    while (true) {
+      const response = await fetch(`${API_BASE_URL}/api/import/${importId}`);
+      const job = await response.json();
+      if (!response.ok) {
+        return { status: 'failed', error_message: job.detail };
+      }
+      if (job.status === 'completed' || job.status === 'failed') {
+        return job;
+      }
+      setImportProgress(job.progress || 0);
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  };
+
   const loadImportHistory = async () => {
     setLoadingHistory(true);
     try {
@@ -124,7 +153,7 @@ export default function Import() {
             disabled={!selectedFile || uploading}
             className="upload-button"
           >
-            {uploading ? 'Importando...' : 'Importar PDF'}
+            {uploading ? `Importando... ${importProgress}%` : 'Importar PDF'}
           </button>
         </div>
 